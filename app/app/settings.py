@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -77,17 +79,40 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
+# Connections stay open for CONN_MAX_AGE seconds across requests, and with
+# HEALTH_CHECKS a reused connection is tested before its first use in each
+# request. DB_POOL=1 instead shares a pool of connections between the
+# threads of each process, for threaded servers, handing them back at the
+# end of each request. Connecting gives up after connect_timeout seconds,
+# so that readiness probes fail fast while the database is unreachable.
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'HEALTH_CHECKS': os.environ.get('DB_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        },
     }
 }
 
+if os.environ.get('DB_POOL', '0') == '1':
+    DATABASES['default'].update(
+        ENGINE='core.db.backends.postgresql_pool',
+        CONN_MAX_AGE=0
+    )
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -132,3 +157,100 @@ STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Token authentication cache
+# Token lookups are kept in a bounded in-process LRU. SHARED_CACHE names a
+# cache alias from CACHES, shared by every process, in which tokens are
+# registered so that deleting one or deactivating its user takes effect in
+# every process at once. It is off by default, and stays off without a
+# shared cache, since other processes would keep accepting the token for up
+# to TTL seconds, unless ALLOW_LOCAL declares that a single process serves
+# requests.
+
+TOKEN_AUTH_CACHE = {
+    'ENABLED': os.environ.get('TOKEN_AUTH_CACHE_ENABLED', '0') == '1',
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 300)),
+    'SHARED_CACHE': os.environ.get('TOKEN_AUTH_SHARED_CACHE'),
+    'ALLOW_LOCAL': os.environ.get('TOKEN_AUTH_CACHE_ALLOW_LOCAL', '0') == '1',
+}
+
+
+# Recipe image processing
+# MODE is 'thread' to process uploads in a pool of threads inside the web
+# process, or 'command' to leave them to the process_images command. In
+# thread mode the command must still run, as the worker service of
+# docker-compose.yml does: it picks up the uploads the pool refused when
+# full, and those claimed more than CLAIM_TIMEOUT seconds ago by a worker
+# that died.
+
+RECIPE_IMAGE_PROCESSING = {
+    'MODE': os.environ.get('RECIPE_IMAGE_PROCESSING_MODE', 'thread'),
+    'WORKERS': int(os.environ.get('RECIPE_IMAGE_WORKERS', 2)),
+    'QUEUE_SIZE': int(os.environ.get('RECIPE_IMAGE_QUEUE_SIZE', 100)),
+    'CLAIM_TIMEOUT': int(os.environ.get('RECIPE_IMAGE_CLAIM_TIMEOUT', 600)),
+}
+
+
+# Response cache
+# List responses are cached per user in the CACHES alias named by ALIAS and
+# dropped whenever the user's recipes, tags or ingredients change. Entries
+# are refreshed by a single request EARLY_REFRESH seconds before expiring.
+# It is off by default, and stays off unless ALIAS names a backend shared by
+# every process, such as memcached or Redis, since a process-local cache
+# would keep serving lists that another process has invalidated. Tests and
+# single-process servers can set ALLOW_LOCAL to use a local cache anyway.
+
+RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('RESPONSE_CACHE_ENABLED', '0') == '1',
+    'ALIAS': os.environ.get('RESPONSE_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+    'EARLY_REFRESH': int(os.environ.get('RESPONSE_CACHE_EARLY_REFRESH', 30)),
+}
+
+
+# Health checks
+# /readyz probes the database at most once every CACHE_TIMEOUT seconds per
+# process, and /healthz only reports that the process is up.
+
+HEALTH_CHECK = {
+    'CACHE_TIMEOUT': float(os.environ.get('HEALTH_CHECK_CACHE_TIMEOUT', 2)),
+}
+
+
+# Request metrics
+# Latency, SQL queries and response sizes are recorded per route and served
+# at /metrics, to requests bearing TOKEN or coming from ALLOWED_IPS, a list
+# of addresses or networks. With several worker processes, set as WORKERS
+# from WEB_CONCURRENCY, MULTIPROCESS_DIR is required: it names a directory,
+# emptied on deploy, where each process writes its values every
+# FLUSH_INTERVAL seconds for /metrics to sum.
+
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', '1') == '1',
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR'),
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 5)),
+    'WORKERS': int(os.environ.get('WEB_CONCURRENCY', 1)),
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'ALLOWED_IPS': [
+        network for network in
+        os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if network
+    ],
+}
+
+
+# Request profiling
+# Once enabled, staff users can profile a request by sending X-Profile:
+# cprofile|sample or ?profile=cprofile|sample. Profiles are stored in
+# DIRECTORY, which only keeps the MAX_PROFILES newest, and served at
+# /api/profiles/<id>/. Sampling profilers take a stack every SAMPLE_INTERVAL
+# seconds. Streamed content, such as the export, is not profiled.
+
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', '0') == '1',
+    'DIRECTORY': os.environ.get('PROFILING_DIRECTORY', '/vol/web/profiles'),
+    'SAMPLE_INTERVAL': float(os.environ.get('PROFILING_SAMPLE_INTERVAL',
+                                            0.001)),
+    'MAX_PROFILES': int(os.environ.get('PROFILING_MAX_PROFILES', 100)),
+}
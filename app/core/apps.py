@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        """Connects the signal handlers and registers the system checks \
+            of the app."""
+        from core import checks, signals  # noqa: F401
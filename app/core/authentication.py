@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from core.response_cache import LOCAL_BACKENDS
+
+
+def _config():
+    """Returns the TOKEN_AUTH_CACHE setting, with defaults."""
+    config = {
+        'ENABLED': False,
+        'MAX_SIZE': 10000,
+        'TTL': 300,
+        'SHARED_CACHE': None,
+        'ALLOW_LOCAL': False,
+    }
+    config.update(getattr(settings, 'TOKEN_AUTH_CACHE', {}))
+    return config
+
+
+def is_shared():
+    """Returns whether SHARED_CACHE names a backend shared between \
+        processes, so that invalidations in one process reach the others."""
+    alias = _config()['SHARED_CACHE']
+    if alias is None:
+        return False
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend is not None and backend not in LOCAL_BACKENDS
+
+
+def is_refused():
+    """Returns whether token caching is enabled without a shared cache nor \
+        ALLOW_LOCAL, in which case it stays off: other processes would keep \
+        accepting tokens deleted or users deactivated in another one."""
+    config = _config()
+    return config['ENABLED'] and not config['ALLOW_LOCAL'] and \
+        not is_shared()
+
+
+def is_enabled():
+    """Returns whether token lookups are cached."""
+    return _config()['ENABLED'] and not is_refused()
+
+
+def _snapshot(instance):
+    """Returns the field values of a model instance, to rebuild copies of \
+        it from."""
+    if instance is None:
+        return None
+    return (
+        type(instance),
+        instance._state.db,
+        tuple(getattr(instance, field.attname)
+              for field in instance._meta.concrete_fields),
+    )
+
+
+def _restore(snapshot):
+    """Returns a new model instance built from a snapshot."""
+    if snapshot is None:
+        return None
+    model, db, values = snapshot
+    return model.from_db(
+        db,
+        [field.attname for field in model._meta.concrete_fields],
+        values
+    )
+
+
+class TokenCache:
+    """Bounded LRU of token keys to authenticated (user, token) pairs.
+
+    Entries hold the field values of the user and token, and every lookup
+    builds new instances from them, so that changes a request makes to its
+    user are never seen by other requests.
+
+    Entries expire after `ttl` seconds. Invalidations are only seen at once
+    by the process making them, unless a shared cache alias is set: every
+    token is then also registered there, so that invalidating it from any
+    process makes the local entries of every other process stale at once.
+    """
+
+    def __init__(self, max_size=10000, ttl=300, shared_cache=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        """Returns the shared cache backend, if any is configured."""
+        if self.shared_cache is None:
+            return None
+        return caches[self.shared_cache]
+
+    def _shared_key(self, key):
+        """Returns the shared cache key for a token key."""
+        return f'authtoken:{key}'
+
+    def get(self, key):
+        """Returns the cached (user, token) pair for a key, if still valid."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user_id, user, token, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+
+        shared = self.shared
+        if shared is not None and \
+                shared.get(self._shared_key(key)) != user_id:
+            self.delete(key)
+            return None
+
+        user = _restore(user)
+        token = _restore(token)
+        if token is not None:
+            token.user = user
+        return user, token
+
+    def set(self, key, user, token):
+        """Caches the (user, token) pair authenticated by a key."""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+
+        shared = self.shared
+        if shared is not None:
+            shared.set(self._shared_key(key), user.pk, self.ttl)
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (user.pk, _snapshot(user), _snapshot(token),
+                                  time.monotonic() + self.ttl)
+            self._user_keys.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        """Drops a token key from the cache."""
+        shared = self.shared
+        if shared is not None:
+            shared.delete(self._shared_key(key))
+
+        with self._lock:
+            self._remove(key)
+
+    def delete_user(self, user_id, keys=()):
+        """Drops every cached token belonging to a user."""
+        with self._lock:
+            keys = set(keys) | self._user_keys.get(user_id, set())
+            for key in keys:
+                self._remove(key)
+
+        shared = self.shared
+        if shared is not None:
+            shared.delete_many([self._shared_key(key) for key in keys])
+
+    def clear(self):
+        """Drops every locally cached token."""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, key):
+        """Removes a key from the local cache. The lock must be held."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        user_id = entry[0]
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+
+def _build_token_cache():
+    """Builds the token cache from the TOKEN_AUTH_CACHE setting."""
+    config = _config()
+    return TokenCache(
+        max_size=config['MAX_SIZE'],
+        ttl=config['TTL'],
+        shared_cache=config['SHARED_CACHE']
+    )
+
+
+token_cache = _build_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches token lookups.
+
+    A drop-in replacement for `TokenAuthentication`: the token and user
+    join only runs on cache misses. Entries are invalidated by the signal
+    handlers in `core.signals` when tokens are deleted or users change.
+    Tokens are looked up every time unless the cache is enabled.
+    """
+    cache = token_cache
+
+    def authenticate_credentials(self, key):
+        """Returns the user and token for a key, from cache when possible."""
+        if not is_enabled():
+            return super().authenticate_credentials(key)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        self.cache.set(key, user, token)
+
+        return user, token
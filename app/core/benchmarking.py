@@ -0,0 +1,15 @@
+import time
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark data."""
+
+
+def best_time(function, repeat):
+    """Returns the shortest duration of a number of calls."""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return min(durations)
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from core import authentication, metrics, response_cache
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    """Reports a response cache enabled on a backend local to the process."""
+    if not response_cache.is_refused():
+        return []
+    return [Error(
+        'RESPONSE_CACHE is enabled, but its cache "{}" is not shared '
+        'between processes.'.format(
+            getattr(settings, 'RESPONSE_CACHE', {}).get('ALIAS', 'default')
+        ),
+        hint='Point RESPONSE_CACHE ALIAS at a shared backend such as '
+             'memcached or Redis, or set RESPONSE_CACHE_ENABLED=0.',
+        id='core.E001',
+    )]
+
+
+@register()
+def check_metrics(app_configs, **kwargs):
+    """Reports several worker processes recording metrics that /metrics \
+        cannot sum."""
+    if not metrics.lacks_multiprocess_dir():
+        return []
+    return [Error(
+        'METRICS is enabled for several worker processes without a '
+        'multiprocess directory.',
+        hint='Set METRICS_MULTIPROCESS_DIR to a directory shared by the '
+             'worker processes, or set METRICS_ENABLED=0.',
+        id='core.E002',
+    )]
+
+
+@register()
+def check_token_cache(app_configs, **kwargs):
+    """Reports a token cache that could only be invalidated in the process \
+        making the change."""
+    if not authentication.is_refused():
+        return []
+    return [Error(
+        'TOKEN_AUTH_CACHE is enabled without a SHARED_CACHE shared between '
+        'processes.',
+        hint='Set TOKEN_AUTH_SHARED_CACHE to a cache alias backed by '
+             'memcached or Redis, set TOKEN_AUTH_CACHE_ALLOW_LOCAL=1 when '
+             'running a single process, or set '
+             'TOKEN_AUTH_CACHE_ENABLED=0.',
+        id='core.E003',
+    )]
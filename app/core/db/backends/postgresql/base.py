@@ -0,0 +1,36 @@
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend testing a persistent connection before reusing it.
+
+    With `HEALTH_CHECKS` in the database settings, a connection kept open
+    across requests by `CONN_MAX_AGE` is tested on its first use in each
+    request, and replaced when the server dropped it in the meantime instead
+    of failing the request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('HEALTH_CHECKS', False)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Called when requests start and finish.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None and self.health_check_enabled and
+                not self.health_check_done and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
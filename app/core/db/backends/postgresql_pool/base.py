@@ -0,0 +1,82 @@
+from django.db.backends.postgresql.base import Database
+from psycopg2 import extensions
+
+from core.db import pool
+from core.db.backends.postgresql import base
+
+
+def _reset(connection):
+    """Rolls back what a released connection left open, returning whether \
+        it can be reused."""
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def _check(connection):
+    """Returns whether an idle connection still works."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return _reset(connection)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend borrowing connections from a pool shared by the \
+        threads of the process.
+
+    Closing a connection hands it back to the pool, so CONN_MAX_AGE should
+    be 0 for connections to return at the end of each request. The pool is
+    configured by `POOL` in the database settings, with MAX_SIZE, TIMEOUT
+    (seconds to wait for a connection when all are in use), MAX_IDLE and
+    MAX_LIFETIME, and tests idle connections before reuse with
+    `HEALTH_CHECKS`.
+    """
+
+    def get_pool(self, conn_params):
+        """Returns the pool of the connection parameters, creating it the \
+            first time."""
+        options = self.settings_dict.get('POOL', {})
+        key = (self.alias, repr(sorted(conn_params.items())))
+
+        def create():
+            return pool.ConnectionPool(
+                lambda: Database.connect(**conn_params),
+                lambda connection: connection.close(),
+                reset=_reset,
+                check=_check if self.health_check_enabled else None,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+                max_idle=options.get('MAX_IDLE', 300),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+                name=f'{self.alias}:{self.settings_dict["NAME"]}'
+            )
+
+        return pool.get_pool(key, create)
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.acquire()
+        except pool.PoolTimeout as exc:
+            raise Database.OperationalError(str(exc)) from exc
+
+        # As in the parent backend, the isolation level must be known before
+        # autocommit is set.
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
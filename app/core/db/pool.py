@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection is handed back to a full pool in time."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of at most `max_size` database connections.
+
+    Connections are opened by `connect` when no idle one is left, and
+    handed back with `release`, which runs `reset` on them and keeps them
+    only when it returns True. Idle connections are reused newest first, so
+    that the ones left over after a burst sit idle for `max_idle` seconds and
+    get closed. Connections older than `max_lifetime` seconds are closed when
+    released, and `check`, when given, tests an idle connection before it is
+    handed out again.
+    """
+
+    def __init__(self, connect, close, reset=None, check=None, max_size=10,
+                 timeout=5, max_idle=300, max_lifetime=3600, name=''):
+        self.connect = connect
+        self.close_connection = close
+        self.reset = reset
+        self.check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.name = name
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            'opened': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'exhausted': 0,
+            'timeouts': 0,
+            'checkout_time': 0.0,
+            'max_checkout_time': 0.0,
+        }
+
+    def acquire(self):
+        """Returns a connection, waiting up to `timeout` seconds for one \
+            to be released when the pool is full."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        exhausted = False
+        while True:
+            stale = []
+            with self._condition:
+                connection = None
+                while connection is None:
+                    if self._closed:
+                        raise PoolTimeout(f'Pool {self.name} is closed.')
+                    connection = self._take_idle(stale)
+                    if connection is not None or self._size < self.max_size:
+                        break
+                    exhausted = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['exhausted'] += 1
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection of pool {self.name} was released '
+                            f'within {self.timeout} seconds.'
+                        )
+                    self._condition.wait(remaining)
+                if connection is None:
+                    self._size += 1
+            self._close_all(stale)
+
+            if connection is None:
+                connection = self._open()
+            elif self.check is not None and not self._passes(self.check,
+                                                             connection):
+                self._discard(connection)
+                continue
+
+            self._record_checkout(time.monotonic() - started, exhausted)
+            return connection
+
+    def release(self, connection):
+        """Hands a connection back to the pool."""
+        reusable = self.reset is None or self._passes(self.reset, connection)
+        now = time.monotonic()
+        with self._condition:
+            opened_at = self._opened_at.get(id(connection), now)
+            if (reusable and not self._closed and
+                    now - opened_at < self.max_lifetime):
+                self._idle.append((connection, now))
+                self._condition.notify()
+                return
+        self._discard(connection)
+
+    def close(self):
+        """Closes the idle connections, and the others once released."""
+        with self._condition:
+            self._closed = True
+            stale = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(stale)
+            for connection in stale:
+                self._opened_at.pop(id(connection), None)
+            self._condition.notify_all()
+        self._close_all(stale)
+
+    def stats(self):
+        """Returns the size and usage counters of the pool."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                max_size=self.max_size,
+            )
+        stats['mean_checkout_time'] = (
+            stats['checkout_time'] / stats['checkouts']
+            if stats['checkouts'] else 0.0
+        )
+        return stats
+
+    def _take_idle(self, stale):
+        """Returns the most recently released idle connection, moving the \
+            ones idle for too long to `stale`. Called with the lock held."""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] >= self.max_idle:
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            self._opened_at.pop(id(connection), None)
+            stale.append(connection)
+        if self._idle:
+            return self._idle.pop()[0]
+        return None
+
+    def _open(self):
+        """Opens a connection, in a slot of the pool already reserved."""
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._opened_at[id(connection)] = time.monotonic()
+            self._stats['opened'] += 1
+        return connection
+
+    def _discard(self, connection):
+        """Closes a connection and frees its slot in the pool."""
+        with self._condition:
+            self._size -= 1
+            self._opened_at.pop(id(connection), None)
+            self._condition.notify()
+        self._close_all([connection])
+
+    def _close_all(self, connections):
+        """Closes connections removed from the pool."""
+        for connection in connections:
+            try:
+                self.close_connection(connection)
+            except Exception:
+                pass
+        if connections:
+            with self._condition:
+                self._stats['closed'] += len(connections)
+
+    def _passes(self, test, connection):
+        """Returns whether a reset or check succeeds on a connection."""
+        try:
+            return bool(test(connection))
+        except Exception:
+            return False
+
+    def _record_checkout(self, duration, exhausted):
+        """Counts a checkout and how long it took."""
+        with self._condition:
+            self._stats['checkouts'] += 1
+            self._stats['exhausted'] += exhausted
+            self._stats['checkout_time'] += duration
+            self._stats['max_checkout_time'] = max(
+                self._stats['max_checkout_time'], duration
+            )
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, create):
+    """Returns the pool registered under a key, creating it with `create` \
+        the first time."""
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = create()
+        return _pools[key]
+
+
+def stats():
+    """Returns the stats of every pool of the process, by pool name."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
@@ -0,0 +1,76 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+def check_database(alias='default'):
+    """Connects to a database and runs a trivial query on it, raising \
+        OperationalError when it is unavailable."""
+    connection = connections[alias]
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def backoff_delays(initial, maximum):
+    """Yields delays doubling from `initial` up to `maximum`, each drawn \
+        at random below its bound so that waiting processes spread out."""
+    delay = initial
+    while True:
+        yield random.uniform(0, delay)
+        delay = min(delay * 2, maximum)
+
+
+_readiness = {'checked_at': None, 'result': None, 'probing': False}
+_readiness_lock = threading.Lock()
+_probed = threading.Condition(_readiness_lock)
+
+
+def readiness(alias='default'):
+    """Returns whether a database is ready to serve requests, and why not \
+        when it is not.
+
+    The result is kept for HEALTH_CHECK['CACHE_TIMEOUT'] seconds, so that
+    frequent probes from an orchestrator add no load on the database. Once
+    it expires, a single caller probes the database again, without holding
+    the lock, while the others get the previous result, or wait for the
+    probe when there is none yet.
+    """
+    timeout = getattr(settings, 'HEALTH_CHECK', {}).get('CACHE_TIMEOUT', 2)
+    with _readiness_lock:
+        while True:
+            checked_at = _readiness['checked_at']
+            if checked_at is not None and \
+                    time.monotonic() - checked_at < timeout:
+                return _readiness['result']
+            if not _readiness['probing']:
+                break
+            if _readiness['result'] is not None:
+                return _readiness['result']
+            _probed.wait()
+        _readiness['probing'] = True
+
+    result = None
+    try:
+        try:
+            check_database(alias)
+            result = (True, '')
+        except DatabaseError as exc:
+            result = (False, str(exc).strip() or type(exc).__name__)
+    finally:
+        with _readiness_lock:
+            _readiness['probing'] = False
+            if result is not None:
+                _readiness.update(checked_at=time.monotonic(), result=result)
+            _probed.notify_all()
+    return result
+
+
+def reset_readiness():
+    """Forgets the cached readiness of the database."""
+    with _readiness_lock:
+        _readiness.update(checked_at=None, result=None)
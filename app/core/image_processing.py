@@ -0,0 +1,199 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from core import images
+from core.models import Recipe, CollectionVersion
+
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = 'staging/recipe/'
+
+# Images are processed by a pool of threads inside the web process.
+MODE_THREAD = 'thread'
+# Images are processed by the `process_images` management command.
+MODE_COMMAND = 'command'
+# Images are processed during the request. Meant for tests.
+MODE_SYNC = 'sync'
+
+
+def _config():
+    """Returns the RECIPE_IMAGE_PROCESSING setting, with defaults."""
+    config = {'MODE': MODE_THREAD, 'WORKERS': 2, 'QUEUE_SIZE': 100,
+              'CLAIM_TIMEOUT': 600}
+    config.update(getattr(settings, 'RECIPE_IMAGE_PROCESSING', {}))
+    return config
+
+
+class BoundedWorkerPool:
+    """Thread pool that refuses work beyond a fixed number of queued tasks.
+
+    Refused work stays pending in the database, as does the work of a
+    process that stopped before finishing it. It is only picked up by the
+    `process_images` command, which must therefore also run in thread mode,
+    for instance as a periodic job with `--once`.
+    """
+
+    def __init__(self, workers, queue_size):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='recipe-image'
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args):
+        """Schedules a call, returning whether the pool accepted it."""
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _future: self._slots.release())
+        return True
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the in-process worker pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = _config()
+            _pool = BoundedWorkerPool(config['WORKERS'], config['QUEUE_SIZE'])
+        return _pool
+
+
+def stage_image(recipe, file):
+    """Stores an uploaded file in the staging area and marks the recipe \
+        image as pending processing."""
+    extension = os.path.splitext(file.name)[1].lower()
+    path = default_storage.save(f'{STAGING_DIR}{uuid.uuid4()}{extension}',
+                                file)
+
+    # A previously staged file is left to the worker processing it, which
+    # deletes it once done, as it may still be reading it.
+    recipe.image_staging = path
+    recipe.image_status = Recipe.IMAGE_PENDING
+    recipe.save(update_fields=['image_staging', 'image_status', 'updated_at'])
+
+
+def enqueue(recipe_id):
+    """Schedules processing of the staged image of a recipe."""
+    mode = _config()['MODE']
+    if mode == MODE_SYNC:
+        process_recipe_image(recipe_id)
+    elif mode == MODE_THREAD:
+        transaction.on_commit(
+            lambda: get_pool().submit(_process_in_thread, recipe_id)
+        )
+
+
+def _process_in_thread(recipe_id):
+    """Processes an image from a worker thread, which owns its own \
+        database connection."""
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Processing image of recipe %s failed', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def _claimable():
+    """Returns the filter of recipes whose image awaits processing: \
+        pending, or claimed by a worker longer ago than the claim timeout, \
+        which is taken to have died."""
+    stale = timezone.now() - timedelta(seconds=_config()['CLAIM_TIMEOUT'])
+    return Q(image_status=Recipe.IMAGE_PENDING) | Q(
+        Q(image_claimed_at__lt=stale) | Q(image_claimed_at__isnull=True),
+        image_status=Recipe.IMAGE_PROCESSING
+    )
+
+
+def process_recipe_image(recipe_id):
+    """Validates a staged image, stores it with its renditions and marks \
+        it ready, or failed when it cannot be decoded. Returns the status."""
+    claimed = Recipe.objects.filter(_claimable(), pk=recipe_id).update(
+        image_status=Recipe.IMAGE_PROCESSING,
+        image_claimed_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    recipe = Recipe.objects.only(
+        'id', 'user', 'image', 'image_staging'
+    ).get(pk=recipe_id)
+    staged = recipe.image_staging
+    previous = recipe.image.name if recipe.image else None
+
+    try:
+        with default_storage.open(staged, 'rb') as file:
+            Image.open(file).verify()
+            file.seek(0)
+            original = images.strip_metadata(file, os.path.basename(staged))
+        recipe.image.save(original.name, original, save=False)
+        images.generate_renditions(recipe.image)
+    except Exception:
+        logger.warning('Invalid image for recipe %s', recipe_id,
+                       exc_info=True)
+        status = Recipe.IMAGE_FAILED
+        if recipe.image and recipe.image.name != previous:
+            images.delete_renditions(recipe.image.storage, recipe.image.name)
+            recipe.image.storage.delete(recipe.image.name)
+        _finish(recipe, staged, image_status=status)
+    else:
+        status = Recipe.IMAGE_READY
+        finished = _finish(
+            recipe,
+            staged,
+            image=recipe.image.name,
+            image_status=status
+        )
+        # Deletes whichever image is no longer referenced by the recipe:
+        # the one replaced, or the one just stored when superseded by
+        # another upload.
+        unused = previous if finished else recipe.image.name
+        if unused:
+            images.delete_renditions(recipe.image.storage, unused)
+            recipe.image.storage.delete(unused)
+
+    if default_storage.exists(staged):
+        default_storage.delete(staged)
+
+    return status
+
+
+def _finish(recipe, staged, **fields):
+    """Records the outcome of processing, unless another image was \
+        uploaded to the recipe in the meantime. Returns whether it was \
+        recorded."""
+    updated = Recipe.objects.filter(pk=recipe.pk, image_staging=staged).update(
+        image_staging='',
+        image_claimed_at=None,
+        updated_at=timezone.now(),
+        **fields
+    )
+    if updated:
+        CollectionVersion.objects.bump(recipe.user_id, 'recipes')
+    return bool(updated)
+
+
+def pending_recipe_ids(limit):
+    """Returns the ids of recipes with images waiting to be processed, \
+        including those whose processing was abandoned."""
+    return list(Recipe.objects.filter(_claimable()).order_by(
+        'id'
+    ).values_list('id', flat=True)[:limit])
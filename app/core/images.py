@@ -0,0 +1,146 @@
+import os
+from collections import OrderedDict
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+
+# Renditions generated for every recipe image, as bounding boxes in pixels,
+# from the largest to the smallest.
+RENDITIONS = OrderedDict([
+    ('large', (1200, 1200)),
+    ('medium', (600, 600)),
+    ('thumb', (150, 150)),
+])
+
+JPEG_QUALITY = 85
+
+# Formats originals are kept in when re-encoded, with the quality of those
+# that are lossy. Originals in other formats are stored as JPEG.
+ORIGINAL_FORMATS = {'JPEG': 95, 'PNG': None, 'GIF': None, 'WEBP': 95}
+
+EXIF_ORIENTATION = 0x0112
+
+# Transposition that brings an image to its upright position, by the value
+# of its EXIF orientation tag.
+ORIENTATION_TRANSPOSES = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+def rendition_path(name, rendition):
+    """Returns the storage path of a rendition of an image."""
+    base, _extension = os.path.splitext(name)
+    return f'{base}_{rendition}.jpg'
+
+
+def rendition_urls(image_field):
+    """Returns the URL of each rendition of an image, by rendition name."""
+    if not image_field:
+        return None
+
+    storage = image_field.storage
+    return OrderedDict(
+        (rendition, storage.url(rendition_path(image_field.name, rendition)))
+        for rendition in reversed(RENDITIONS)
+    )
+
+
+def _orientation(image):
+    """Returns the EXIF orientation of an image, if any."""
+    try:
+        exif = image._getexif() or {}
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError,
+            SyntaxError):
+        return None
+    return exif.get(EXIF_ORIENTATION)
+
+
+def _open_upright(file):
+    """Decodes an image no larger than needed for the largest rendition, \
+        rotated upright and converted to RGB."""
+    image = Image.open(file)
+    orientation = _orientation(image)
+
+    # Lets the JPEG decoder scale down by up to 8x while decoding, which is
+    # far cheaper than decoding the full image and resizing it afterwards.
+    image.draft('RGB', max(RENDITIONS.values()))
+    image.load()
+
+    if orientation in ORIENTATION_TRANSPOSES:
+        image = image.transpose(ORIENTATION_TRANSPOSES[orientation])
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    return image
+
+
+def strip_metadata(file, name):
+    """Returns an uploaded image re-encoded upright without its metadata, \
+        such as the location and camera in its EXIF data, as a file named \
+        after `name` with the extension of its format."""
+    image = Image.open(file)
+    image_format = image.format
+    orientation = _orientation(image)
+    options = {key: image.info[key] for key in ('icc_profile', 'transparency')
+               if key in image.info}
+    image.load()
+
+    if orientation in ORIENTATION_TRANSPOSES:
+        image = image.transpose(ORIENTATION_TRANSPOSES[orientation])
+
+    if image_format not in ORIGINAL_FORMATS or image_format not in Image.SAVE:
+        image_format = 'JPEG'
+        options.pop('transparency', None)
+        if image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+    if ORIGINAL_FORMATS[image_format] is not None:
+        options['quality'] = ORIGINAL_FORMATS[image_format]
+
+    content = BytesIO()
+    image.save(content, format=image_format, **options)
+    base, extension = os.path.splitext(name)
+    if Image.EXTENSION.get(extension.lower()) != image_format:
+        extension = '.jpg' if image_format == 'JPEG' else \
+            f'.{image_format.lower()}'
+    return ContentFile(content.getvalue(), name=f'{base}{extension}')
+
+
+def generate_renditions(image_field):
+    """Generates and stores every rendition of an image, re-encoded as \
+        JPEG without metadata. Returns the stored paths by rendition name."""
+    storage = image_field.storage
+    with storage.open(image_field.name, 'rb') as file:
+        image = _open_upright(file)
+
+    paths = OrderedDict()
+    for rendition, size in RENDITIONS.items():
+        # Each rendition is resized from the previous one, so the work
+        # shrinks along with the sizes.
+        image.thumbnail(size, Image.LANCZOS)
+        content = BytesIO()
+        image.save(content, format='JPEG', quality=JPEG_QUALITY,
+                   optimize=True, progressive=True)
+
+        path = rendition_path(image_field.name, rendition)
+        if storage.exists(path):
+            storage.delete(path)
+        paths[rendition] = storage.save(path, ContentFile(content.getvalue()))
+
+    return paths
+
+
+def delete_renditions(storage, name):
+    """Deletes every stored rendition of an image."""
+    for rendition in RENDITIONS:
+        path = rendition_path(name, rendition)
+        if storage.exists(path):
+            storage.delete(path)
@@ -0,0 +1,355 @@
+import csv
+import io
+import json
+import os
+from collections import Counter, OrderedDict, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+from core import search, usage
+from core.models import Tag, Ingredient, Recipe, CollectionVersion
+
+
+RECORD_TYPES = ('user', 'tag', 'ingredient', 'recipe')
+
+# Separates the tag and ingredient names of a recipe within a CSV cell.
+CSV_NAME_SEPARATOR = ';'
+
+
+class RecordError(ValueError):
+    """Raised for an input record that cannot be imported."""
+
+
+def detect_format(path):
+    """Returns the format of an input file from its extension."""
+    return 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'ndjson'
+
+
+def read_records(file, file_format):
+    """Yields the records of an input file one at a time, as dicts.
+
+    Blank CSV cells are left out, and tag and ingredient names are split,
+    so that CSV records look like their NDJSON counterparts.
+    """
+    if file_format == 'csv':
+        for row in csv.DictReader(file):
+            record = {key: value for key, value in row.items() if value}
+            for field in ('tags', 'ingredients'):
+                if field in record:
+                    record[field] = record[field].split(CSV_NAME_SEPARATOR)
+            yield record
+        return
+
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            record = {
+                'type': None,
+                'error': f'invalid record on line {number}'
+            }
+        yield record
+
+
+def copy_rows(table, columns, rows):
+    """Loads rows into a table with COPY (PostgreSQL only)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([r'\N' if value is None else value for value in row])
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(table)} '
+            f'({", ".join(quote(column) for column in columns)}) '
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+
+
+class RecipeImporter:
+    """Imports batches of user, tag, ingredient and recipe records.
+
+    Users are referred to by email, and tags and ingredients by name. Both
+    are resolved through in-memory maps, filled from the database the first
+    time a user is seen, so that each batch only queries for new objects.
+    Records without a type are recipes, and records without a user belong
+    to `default_user`.
+    """
+
+    def __init__(self, batch_size=1000, use_copy=False, default_user=None):
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.default_user = default_user
+        self.counts = Counter()
+        self.errors = []
+        self._user_ids = {}
+        self._names = {'tags': {}, 'ingredients': {}}
+
+    def import_batch(self, records):
+        """Imports a batch of records. Records that cannot be imported are \
+            skipped and reported in `errors`."""
+        groups = defaultdict(list)
+        for record in records:
+            record_type = record.get('type', 'recipe')
+            if record_type not in RECORD_TYPES:
+                self._error(record, record.get('error') or
+                            f'unknown type {record_type!r}')
+                continue
+            groups[record_type].append(record)
+
+        self._import_users(groups['user'])
+        self._load_user_ids(groups['tag'] + groups['ingredient'] +
+                            groups['recipe'])
+
+        changed = defaultdict(set)
+        for relation, model in (('tags', Tag), ('ingredients', Ingredient)):
+            by_user = defaultdict(list)
+            for record in groups[model._meta.model_name]:
+                try:
+                    user_id = self._user_id(record)
+                    by_user[user_id].append(self._name(record))
+                except RecordError as exc:
+                    self._error(record, exc)
+            for user_id, names in by_user.items():
+                self._resolve(relation, model, user_id, names)
+                changed[user_id].add(relation)
+                self.counts[model._meta.model_name] += len(names)
+
+        recipe_ids = self._import_recipes(groups['recipe'], changed)
+
+        search.update_search_vectors(recipe_ids)
+        for user_id, collections in changed.items():
+            CollectionVersion.objects.bump(user_id, *collections)
+
+    def _error(self, record, message):
+        """Records why a record was skipped."""
+        self.counts['error'] += 1
+        self.errors.append(f'{message}: {json.dumps(record, default=str)}')
+
+    def _import_users(self, records):
+        """Creates the users that do not exist yet."""
+        User = get_user_model()
+        users = OrderedDict()
+        for record in records:
+            email = User.objects.normalize_email(record.get('email', ''))
+            if not email:
+                self._error(record, 'missing email')
+                continue
+            users[email] = record.get('name', '')
+
+        self._load_user_ids(users)
+        new = [email for email in users if email not in self._user_ids]
+        if new:
+            User.objects.bulk_create(
+                [User(email=email, name=users[email],
+                      password=make_password(None)) for email in new],
+                batch_size=self.batch_size
+            )
+            self._load_user_ids(new)
+            CollectionVersion.objects.bulk_create(
+                [CollectionVersion(user_id=self._user_ids[email])
+                 for email in new],
+                batch_size=self.batch_size
+            )
+        self.counts['user'] += len(users)
+
+    def _load_user_ids(self, records_or_emails):
+        """Looks up the ids of the users not seen so far."""
+        User = get_user_model()
+        emails = set()
+        for item in records_or_emails:
+            if isinstance(item, dict):
+                item = item.get('user') or self.default_user
+            if item:
+                emails.add(User.objects.normalize_email(item))
+        emails.difference_update(self._user_ids)
+        if emails:
+            self._user_ids.update(User.objects.filter(
+                email__in=emails
+            ).values_list('email', 'id'))
+
+    def _user_id(self, record):
+        """Returns the id of the user owning a record."""
+        email = record.get('user') or self.default_user
+        if not email:
+            raise RecordError('missing user')
+        email = get_user_model().objects.normalize_email(email)
+        if email not in self._user_ids:
+            raise RecordError(f'unknown user {email}')
+        return self._user_ids[email]
+
+    def _name(self, record):
+        """Returns the name of a tag or ingredient record."""
+        name = str(record.get('name', '')).strip()
+        if not name or len(name) > 255:
+            raise RecordError('invalid name')
+        return name
+
+    def _resolve(self, relation, model, user_id, names):
+        """Returns the ids of the user's tags or ingredients with the given \
+            names, creating the missing ones."""
+        known = self._names[relation].get(user_id)
+        if known is None:
+            known = self._names[relation][user_id] = {
+                name.lower(): pk for pk, name in model.objects.filter(
+                    user_id=user_id
+                ).values_list('id', 'name')
+            }
+
+        missing = [name for name in names if name.lower() not in known]
+        if missing:
+            for obj in model.objects.get_or_create_names(
+                get_user_model()(pk=user_id),
+                missing
+            ):
+                known[obj.name.lower()] = obj.pk
+
+        return [known[name.lower()] for name in names]
+
+    def _recipe(self, record):
+        """Returns an unsaved recipe built from a record."""
+        title = str(record.get('title', '')).strip()
+        if not title or len(title) > 255:
+            raise RecordError('invalid title')
+        try:
+            time_minutes = int(record['time_minutes'])
+            price = Decimal(str(record['price'])).quantize(Decimal('0.01'))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise RecordError('invalid time_minutes or price')
+        if price.copy_abs() >= 1000:
+            raise RecordError('invalid time_minutes or price')
+
+        return Recipe(
+            user_id=self._user_id(record),
+            title=title,
+            time_minutes=time_minutes,
+            price=price,
+            link=str(record.get('link', ''))[:255]
+        )
+
+    def _import_recipes(self, records, changed):
+        """Inserts recipes with their tags and ingredients, returning the \
+            ids of the new recipes."""
+        recipes = []
+        relations = []
+        for record in records:
+            try:
+                recipe = self._recipe(record)
+                names = {}
+                for relation in ('tags', 'ingredients'):
+                    names[relation] = [
+                        str(name).strip() for name in
+                        record.get(relation) or [] if str(name).strip()
+                    ]
+                    if any(len(name) > 255 for name in names[relation]):
+                        raise RecordError(f'invalid {relation}')
+            except RecordError as exc:
+                self._error(record, exc)
+                continue
+            recipes.append(recipe)
+            relations.append(names)
+
+        if not recipes:
+            return []
+
+        through_ids = {}
+        for relation, model in (('tags', Tag), ('ingredients', Ingredient)):
+            by_user = defaultdict(list)
+            for recipe, names in zip(recipes, relations):
+                by_user[recipe.user_id].extend(names[relation])
+            for user_id, names in by_user.items():
+                if names:
+                    self._resolve(relation, model, user_id, names)
+                    changed[user_id].add(relation)
+            through_ids[relation] = [
+                [self._names[relation][recipe.user_id][name.lower()]
+                 for name in names[relation]]
+                for recipe, names in zip(recipes, relations)
+            ]
+
+        if self.use_copy:
+            self._copy_recipes(recipes)
+        else:
+            self._insert_recipes(recipes)
+
+        for relation in ('tags', 'ingredients'):
+            rows = [
+                (recipe.id, pk)
+                for recipe, ids in zip(recipes, through_ids[relation])
+                for pk in OrderedDict.fromkeys(ids)
+            ]
+            if self.use_copy:
+                self._copy_relations(relation, rows)
+            else:
+                self._insert_relations(relation, rows)
+            usage.adjust(relation, Counter(pk for _recipe_id, pk in rows))
+
+        for recipe in recipes:
+            changed[recipe.user_id].add('recipes')
+        self.counts['recipe'] += len(recipes)
+        return [recipe.id for recipe in recipes]
+
+    def _insert_recipes(self, recipes):
+        """Inserts recipes in batches, setting their ids."""
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+            return
+
+        # Backends that cannot return the inserted ids need a save each.
+        for recipe in recipes:
+            recipe.save()
+
+    def _insert_relations(self, relation, rows):
+        """Inserts the tag or ingredient rows of recipes in batches."""
+        field = Recipe._meta.get_field(relation)
+        through = field.remote_field.through
+        column = field.m2m_reverse_name()
+        through.objects.bulk_create(
+            [through(recipe_id=recipe_id, **{column: pk})
+             for recipe_id, pk in rows],
+            batch_size=self.batch_size
+        )
+
+    def _copy_recipes(self, recipes):
+        """Loads recipes with COPY, reserving their ids from the sequence \
+            beforehand as COPY cannot return them."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)",
+                [Recipe._meta.db_table, len(recipes)]
+            )
+            for recipe, (pk, ) in zip(recipes, cursor.fetchall()):
+                recipe.id = pk
+
+        fields = [field for field in Recipe._meta.concrete_fields
+                  if field.name != 'search_vector']
+        copy_rows(
+            Recipe._meta.db_table,
+            [field.column for field in fields],
+            (
+                [field.get_db_prep_save(field.pre_save(recipe, True),
+                                        connection)
+                 for field in fields]
+                for recipe in recipes
+            )
+        )
+
+    def _copy_relations(self, relation, rows):
+        """Loads the tag or ingredient rows of recipes with COPY."""
+        field = Recipe._meta.get_field(relation)
+        copy_rows(
+            field.m2m_db_table(),
+            [field.m2m_column_name(), field.m2m_reverse_name()],
+            rows
+        )
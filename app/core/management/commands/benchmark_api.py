@@ -0,0 +1,471 @@
+import io
+import itertools
+import json
+import math
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.client import HTTPConnection
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from core import seeding
+from core.authentication import CachedTokenAuthentication, TokenCache
+from core.metrics import QueryTimer
+from core.models import Tag, Ingredient, Recipe
+
+
+EMAIL_DOMAIN = 'benchmark.invalid'
+PASSWORD = 'benchmark-password'
+JSON = 'application/json'
+
+TRANSPORTS = ('client', 'http')
+
+# URL namespaces whose every route is benchmarked.
+NAMESPACES = ('user', 'recipe')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    """Django command to benchmark every endpoint of the API."""
+    help = 'Seeds a throwaway database and times each API route through ' \
+           'the test client and over HTTP, writing the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Number of recipes of the benchmark user.'
+        )
+        parser.add_argument(
+            '--relations', type=int, default=3,
+            help='Number of tags and of ingredients of each recipe.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Number of timed requests to each route.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Number of untimed requests to each route beforehand.'
+        )
+        parser.add_argument(
+            '--transports', nargs='+', choices=TRANSPORTS,
+            default=list(TRANSPORTS),
+            help='Ways of sending requests: in-process through the test '
+                 'client, or over HTTP to a local server.'
+        )
+        parser.add_argument(
+            '--routes', nargs='+', default=[],
+            help='Only benchmarks the scenarios whose name contains one of '
+                 'these.'
+        )
+        parser.add_argument(
+            '--output', default='benchmark-api.json',
+            help='File to write the results to as JSON.'
+        )
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Serves repeated requests from the response and token '
+                 'caches, which are bypassed by default so that each '
+                 'request pays the full cost of its route.'
+        )
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help='Uses the configured database instead of a throwaway test '
+                 'database, deleting the benchmark data afterwards.'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['recipes'], options['relations'],
+               options['requests']) < 1 or options['warmup'] < 0:
+            raise CommandError('Sizes and counts must be positive.')
+
+        old_name = None
+        if not options['current_db']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        ALLOWED_HOSTS=settings.ALLOWED_HOSTS + [
+                            'testserver', '127.0.0.1'
+                        ],
+                        MEDIA_ROOT=media_root,
+                        RECIPE_IMAGE_PROCESSING={'MODE': 'command'},
+                        RESPONSE_CACHE={
+                            'ENABLED': options['cached'],
+                            'ALLOW_LOCAL': True,
+                        }
+                    ):
+                results = self._run_with_caches(options)
+        finally:
+            if old_name is None:
+                self._delete_data()
+            else:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'commit': self._commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key] for key in (
+                    'recipes', 'relations', 'requests', 'warmup',
+                    'transports', 'cached'
+                )
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(f'Results written to {options["output"]}.')
+
+    def _run_with_caches(self, options):
+        """Runs the benchmark, bypassing the token cache unless asked to \
+            cache."""
+        if options['cached']:
+            return self._run(options)
+
+        cache = CachedTokenAuthentication.cache
+        CachedTokenAuthentication.cache = TokenCache(max_size=0)
+        try:
+            return self._run(options)
+        finally:
+            CachedTokenAuthentication.cache = cache
+
+    def _run(self, options):
+        """Seeds the data and benchmarks every scenario, returning the \
+            results."""
+        User = get_user_model()
+        if User.objects.filter(
+            email__endswith=f'@{EMAIL_DOMAIN}'
+        ).exists():
+            raise CommandError('Benchmark data already exists.')
+
+        started = time.perf_counter()
+        user = seeding.seed_recipes(
+            f'user@{EMAIL_DOMAIN}', options['recipes'], options['relations']
+        )
+        user.set_password(PASSWORD)
+        user.save()
+        self.stdout.write(
+            f'Seeded {options["recipes"]} recipes in '
+            f'{time.perf_counter() - started:.1f} s.'
+        )
+
+        scenarios = self._scenarios(user)
+        self._check_coverage(scenarios)
+        if options['routes']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if any(route in scenario[0] for route in options['routes'])
+            ]
+
+        self.numbers = itertools.count()
+        token = Token.objects.create(user=user).key
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'}
+        results = []
+        if 'client' in options['transports']:
+            results += self._benchmark(
+                'client', self._client_sender(headers), scenarios, options
+            )
+        if 'http' in options['transports']:
+            server, queries = self._start_server()
+            try:
+                results += self._benchmark(
+                    'http',
+                    self._http_sender(server.server_port, headers, queries),
+                    scenarios,
+                    options
+                )
+            finally:
+                server.shutdown()
+                server.server_close()
+        return results
+
+    def _scenarios(self, user):
+        """Returns the requests benchmarked, as tuples of a name, a \
+            method, a path and a function returning the content type and \
+            body of the request of a given number."""
+        tag_ids = list(Tag.objects.filter(user=user).order_by(
+            'id'
+        ).values_list('id', flat=True)[:3])
+        ingredient_ids = list(Ingredient.objects.filter(user=user).order_by(
+            'id'
+        ).values_list('id', flat=True)[:3])
+        recipe_id = Recipe.objects.filter(user=user).order_by(
+            'id'
+        ).values_list('id', flat=True).first()
+        ids = ','.join(str(pk) for pk in tag_ids)
+
+        def body(function):
+            def encode(number):
+                return JSON, json.dumps(function(number)).encode()
+            return encode
+
+        def recipe(number):
+            return {'title': f'benchmark {number}', 'time_minutes': 10,
+                    'price': '5.00', 'tags': tag_ids,
+                    'ingredients': ingredient_ids}
+
+        def image(number):
+            file = io.BytesIO()
+            Image.new('RGB', (64, 64)).save(file, format='JPEG')
+            file.seek(0)
+            file.name = f'benchmark-{number}.jpg'
+            return MULTIPART_CONTENT, encode_multipart(
+                BOUNDARY, {'image': file}
+            )
+
+        detail = reverse('recipe:recipe-detail', args=[recipe_id])
+        upload = reverse('recipe:recipe-upload-image', args=[recipe_id])
+        scenarios = [
+            ('user:create', 'POST', reverse('user:create'), body(
+                lambda number: {'email': f'new{number}@{EMAIL_DOMAIN}',
+                                'password': PASSWORD, 'name': 'new'}
+            )),
+            ('user:token', 'POST', reverse('user:token'), body(
+                lambda number: {'email': user.email, 'password': PASSWORD}
+            )),
+            ('user:me', 'GET', reverse('user:me'), None),
+            ('user:me', 'PATCH', reverse('user:me'), body(
+                lambda number: {'name': f'user {number}'}
+            )),
+            ('recipe:api-root', 'GET', reverse('recipe:api-root'), None),
+        ]
+        for model in ('tag', 'ingredient'):
+            url = reverse(f'recipe:{model}-list')
+            scenarios += [
+                (f'recipe:{model}-list', 'GET', url, None),
+                (f'recipe:{model}-list?assigned_only', 'GET',
+                 f'{url}?assigned_only=1', None),
+                (f'recipe:{model}-list?ordering=usage', 'GET',
+                 f'{url}?ordering=usage', None),
+                (f'recipe:{model}-list', 'POST', url, body(
+                    lambda number, model=model: {
+                        'name': f'benchmark {model} {number}'
+                    }
+                )),
+                (f'recipe:{model}-bulk', 'POST',
+                 reverse(f'recipe:{model}-bulk'), body(
+                     lambda number, model=model: {'names': [
+                         f'benchmark {model} {number} {index}'
+                         for index in range(10)
+                     ]}
+                 )),
+            ]
+
+        url = reverse('recipe:recipe-list')
+        scenarios += [
+            ('recipe:recipe-list', 'GET', url, None),
+            ('recipe:recipe-list?tags', 'GET', f'{url}?tags={ids}', None),
+            ('recipe:recipe-list?tags&match=all', 'GET',
+             f'{url}?tags={ids}&match=all', None),
+            ('recipe:recipe-list?search', 'GET', f'{url}?search=recipe',
+             None),
+            ('recipe:recipe-list', 'POST', url, body(recipe)),
+            ('recipe:recipe-bulk', 'POST', reverse('recipe:recipe-bulk'),
+             body(lambda number: [recipe(f'{number} {index}')
+                                  for index in range(10)])),
+            ('recipe:recipe-export', 'GET', reverse('recipe:recipe-export'),
+             None),
+            ('recipe:recipe-detail', 'GET', detail, None),
+            ('recipe:recipe-detail', 'PATCH', detail, body(
+                lambda number: {'title': f'recipe {number}'}
+            )),
+            ('recipe:recipe-upload-image', 'POST', upload, image),
+        ]
+        return scenarios
+
+    def _check_coverage(self, scenarios):
+        """Warns about the routes of the benchmarked namespaces that no \
+            scenario requests."""
+        covered = {name.split('?')[0] for name, *_ in scenarios}
+        resolver = get_resolver()
+        for namespace in NAMESPACES:
+            prefix, sub_resolver = resolver.namespace_dict[namespace]
+            for route in sub_resolver.reverse_dict:
+                if isinstance(route, str) and \
+                        f'{namespace}:{route}' not in covered:
+                    self.stdout.write(self.style.WARNING(
+                        f'No scenario for {namespace}:{route}.'
+                    ))
+
+    def _client_sender(self, headers):
+        """Returns a function sending a request through the test client, \
+            returning its status and its number of queries."""
+        client = Client()
+
+        def send(method, path, content_type, body):
+            timer = QueryTimer()
+            with timer.capture():
+                response = client.generic(
+                    method, path, body or b'', content_type or JSON,
+                    **headers
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return response.status_code, timer.count
+        return send
+
+    def _start_server(self):
+        """Starts a local server of the API in a thread, returning the \
+            server and the list it appends the number of queries of each \
+            request to."""
+        handler = WSGIHandler()
+        queries = []
+
+        def application(environ, start_response):
+            # Streamed content is read here, so that its queries count.
+            timer = QueryTimer()
+            with timer.capture():
+                result = handler(environ, start_response)
+                try:
+                    content = b''.join(result)
+                finally:
+                    result.close()
+            queries.append(timer.count)
+            return [content]
+
+        server = make_server('127.0.0.1', 0, application,
+                             handler_class=QuietRequestHandler)
+
+        def serve():
+            try:
+                server.serve_forever()
+            finally:
+                connections.close_all()
+
+        threading.Thread(target=serve, daemon=True).start()
+        return server, queries
+
+    def _http_sender(self, port, headers, queries):
+        """Returns a function sending a request over HTTP, returning its \
+            status and its number of queries."""
+        http_headers = {'Authorization': headers['HTTP_AUTHORIZATION']}
+
+        def send(method, path, content_type, body):
+            client = HTTPConnection('127.0.0.1', port)
+            request_headers = dict(http_headers)
+            if content_type:
+                request_headers['Content-Type'] = content_type
+            try:
+                client.request(method, path, body, request_headers)
+                response = client.getresponse()
+                response.read()
+            finally:
+                client.close()
+            return response.status, queries[-1]
+        return send
+
+    def _benchmark(self, transport, send, scenarios, options):
+        """Times every scenario with a way of sending requests, returning \
+            and showing the results."""
+        results = []
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{transport:<48} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"queries":>7} {"peak KiB":>9}'
+        ))
+        for name, method, path, body in scenarios:
+            def request():
+                content_type, data = body(next(self.numbers)) if body else \
+                    (None, None)
+                started = time.perf_counter()
+                status, queries = send(method, path, content_type, data)
+                return status, queries, time.perf_counter() - started
+
+            for _ in range(options['warmup']):
+                request()
+
+            durations = []
+            query_counts = []
+            statuses = set()
+            for _ in range(options['requests']):
+                status, queries, duration = request()
+                durations.append(duration)
+                query_counts.append(queries)
+                statuses.add(status)
+
+            tracemalloc.start()
+            try:
+                request()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            durations.sort()
+            result = {
+                'name': name,
+                'method': method,
+                'path': path,
+                'transport': transport,
+                'statuses': sorted(statuses),
+                'requests': len(durations),
+                'throughput': len(durations) / sum(durations),
+                'latency': {
+                    'mean': sum(durations) / len(durations),
+                    'p50': self._percentile(durations, 50),
+                    'p95': self._percentile(durations, 95),
+                    'p99': self._percentile(durations, 99),
+                    'max': durations[-1],
+                },
+                'queries': sum(query_counts) / len(query_counts),
+                'peak_memory': peak,
+            }
+            results.append(result)
+
+            latency = result['latency']
+            line = (
+                f'{method + " " + name:<48} {result["throughput"]:8.1f} '
+                f'{latency["p50"] * 1000:8.2f} {latency["p95"] * 1000:8.2f} '
+                f'{latency["p99"] * 1000:8.2f} {result["queries"]:7.1f} '
+                f'{peak / 1024:9.1f}'
+            )
+            if any(status >= 400 for status in statuses):
+                line = self.style.WARNING(
+                    f'{line} (status {", ".join(map(str, sorted(statuses)))})'
+                )
+            self.stdout.write(line)
+        return results
+
+    def _percentile(self, values, percent):
+        """Returns the nearest-rank percentile of sorted values."""
+        return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+    def _delete_data(self):
+        """Deletes the users created by the benchmark, with their data."""
+        get_user_model().objects.filter(
+            email__endswith=f'@{EMAIL_DOMAIN}'
+        ).delete()
+
+    def _commit(self):
+        """Returns the git commit of the code benchmarked, when known."""
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True
+            ).stdout.decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
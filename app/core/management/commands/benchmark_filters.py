@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core import seeding
+from core.benchmarking import Rollback, best_time
+from core.models import Recipe
+from recipe import views
+
+
+class Command(BaseCommand):
+    """Django command to compare ways of filtering recipes by tags."""
+    help = 'Times filtering recipes by tags with joins and with the ' \
+           'subqueries of the API, on data that is discarded afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Number of recipes of the user.'
+        )
+        parser.add_argument(
+            '--tags-per-recipe', type=int, default=20,
+            help='Number of tags of each recipe.'
+        )
+        parser.add_argument(
+            '--filter-tags', type=int, default=5,
+            help='Number of tags filtered by.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of runs of each query, of which the best is kept.'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['recipes'], options['tags_per_recipe'],
+               options['filter_tags'], options['repeat']) < 1:
+            raise CommandError('Every option must be positive.')
+
+        try:
+            with transaction.atomic():
+                user = seeding.seed_recipes(
+                    'benchmark@benchmark.invalid',
+                    options['recipes'],
+                    options['tags_per_recipe']
+                )
+                self._compare(user, options['filter_tags'],
+                              options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _compare(self, user, filter_tags, repeat):
+        """Times each way of filtering by a number of tags."""
+        tag_ids = list(user.tag_set.order_by('id').values_list(
+            'id', flat=True
+        )[:filter_tags])
+        joined = Recipe.objects.filter(user=user, tags__id__in=tag_ids)
+
+        cases = [
+            ('join (any)', joined),
+            ('join + distinct (any)', joined.distinct()),
+            ('subquery (any)', self._api_queryset(user, tag_ids, 'any')),
+            ('subquery (all)', self._api_queryset(user, tag_ids, 'all')),
+        ]
+        for name, queryset in cases:
+            ids = list(queryset.values_list('id', flat=True))
+            duration = best_time(
+                lambda: list(queryset.values_list('id', flat=True)),
+                repeat
+            )
+            self.stdout.write(
+                f'{name:<24} {duration * 1000:9.1f} ms, {len(ids):>7} rows, '
+                f'{len(set(ids)):>7} recipes'
+            )
+
+    def _api_queryset(self, user, tag_ids, match):
+        """Returns the queryset the recipe list filters with."""
+        request = APIRequestFactory().get('/', {
+            'tags': ','.join(str(pk) for pk in tag_ids),
+            'match': match,
+        })
+        force_authenticate(request, user=user)
+        view = views.RecipeViewSet(action='list', format_kwarg=None,
+                                   kwargs={})
+        view.request = Request(request)
+        view.request.user = user
+        return view.get_queryset().order_by()
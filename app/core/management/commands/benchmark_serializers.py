@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from core import seeding
+from core.benchmarking import Rollback, best_time
+from core.models import Tag, Ingredient, Recipe
+from recipe import serializers
+
+
+class Command(BaseCommand):
+    """Django command to compare the recipe list serialization paths."""
+    help = 'Times serializing recipes from model instances and from ' \
+           'values() rows, on data that is discarded afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+            help='Numbers of recipes to serialize.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of runs of each path, of which the best is kept.'
+        )
+        parser.add_argument(
+            '--relations', type=int, default=3,
+            help='Number of tags and of ingredients of each recipe.'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['sizes']) < 1 or options['repeat'] < 1:
+            raise CommandError('--sizes and --repeat must be positive.')
+
+        try:
+            with transaction.atomic():
+                user = seeding.seed_recipes(
+                    'benchmark@benchmark.invalid',
+                    max(options['sizes']),
+                    options['relations']
+                )
+                for size in sorted(options['sizes']):
+                    self._compare(user, size, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _compare(self, user, size, repeat):
+        """Times both paths on a number of recipes, after checking that \
+            they render the same JSON."""
+        queryset = Recipe.objects.filter(user=user).order_by('-id')[:size]
+
+        def instances():
+            recipes = queryset.prefetch_related(
+                Prefetch('ingredients', queryset=Ingredient.objects.only(
+                    'id'
+                ).order_by('id')),
+                Prefetch('tags',
+                         queryset=Tag.objects.only('id').order_by('id'))
+            )
+            return JSONRenderer().render(
+                serializers.RecipeSerializer(recipes, many=True).data
+            )
+
+        def values():
+            rows = queryset.values(
+                *serializers.RecipeValuesSerializer.value_fields(
+                    serializers.RecipeSerializer
+                )
+            )
+            return JSONRenderer().render(serializers.RecipeValuesSerializer(
+                serializers.RecipeSerializer, rows, many=True
+            ).data)
+
+        if instances() != values():
+            raise CommandError(f'The outputs differ for {size} recipes.')
+
+        instances_time = best_time(instances, repeat)
+        values_time = best_time(values, repeat)
+        self.stdout.write(
+            f'{size:>7} recipes: instances {instances_time * 1000:9.1f} ms, '
+            f'values {values_time * 1000:9.1f} ms, '
+            f'{instances_time / values_time:.1f}x faster'
+        )
@@ -0,0 +1,149 @@
+import re
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.models import Tag, Ingredient, Recipe
+from recipe import views
+
+
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)$', re.MULTILINE),
+}
+
+
+class Command(BaseCommand):
+    """Django command to show the query plans of the API endpoints."""
+    help = 'Runs EXPLAIN on the queryset of each API endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of the user to run the queries as. Defaults to the '
+                 'user owning the most recipes.'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Runs the queries to show actual timings (PostgreSQL only).'
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Fails when any plan scans a whole table sequentially.'
+        )
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['user'])
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+
+        scans = []
+        for name, queryset in self._endpoint_querysets(user):
+            plan = queryset.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            self.stdout.write('')
+
+            tables = self._sequential_scans(plan)
+            if tables:
+                scans.append((name, tables))
+
+        if not scans:
+            self.stdout.write(self.style.SUCCESS('No sequential scans.'))
+            return
+
+        for name, tables in scans:
+            self.stdout.write(self.style.WARNING(
+                f'{name}: sequential scan on {", ".join(tables)}'
+            ))
+        if options['strict']:
+            raise CommandError('Sequential scans found.')
+
+    def _get_user(self, email):
+        """Returns the user to run queries as."""
+        users = get_user_model().objects.all()
+        if email:
+            user = users.filter(email=email).first()
+        else:
+            user = users.annotate(
+                recipes=Count('recipe')
+            ).order_by('-recipes').first()
+
+        if user is None:
+            raise CommandError('No user found, seed the database first.')
+
+        return user
+
+    def _sequential_scans(self, plan):
+        """Returns the tables scanned sequentially by a plan."""
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            return []
+        return sorted(set(pattern.findall(plan)))
+
+    def _view(self, viewset, action, user, **params):
+        """Returns a viewset set up as if handling a request."""
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=user)
+        view = viewset(action=action, format_kwarg=None, kwargs={})
+        view.request = Request(request)
+        view.request.user = user
+        return view
+
+    def _page(self, view):
+        """Returns the first page of a list view queryset."""
+        paginator = view.paginator
+        return view.get_queryset().order_by(
+            *paginator.get_ordering(view)
+        )[:paginator.page_size + 1]
+
+    def _endpoint_querysets(self, user):
+        """Yields the querysets run by each endpoint for a user."""
+        tag_ids = list(Tag.objects.filter(
+            user=user
+        ).values_list('id', flat=True)[:3])
+        ingredient_ids = list(Ingredient.objects.filter(
+            user=user
+        ).values_list('id', flat=True)[:3])
+        recipe_ids = list(Recipe.objects.filter(
+            user=user
+        ).values_list('id', flat=True)[:50])
+
+        for viewset, label in ((views.TagViewSet, 'tag'),
+                               (views.IngredientViewSet, 'ingredient')):
+            yield f'{label}-list', self._page(
+                self._view(viewset, 'list', user)
+            )
+            yield f'{label}-list?assigned_only=1', self._page(
+                self._view(viewset, 'list', user, assigned_only=1)
+            )
+            yield f'{label}-list?ordering=usage', self._page(
+                self._view(viewset, 'list', user, ordering='usage')
+            )
+
+        yield 'recipe-list', self._page(
+            self._view(views.RecipeViewSet, 'list', user)
+        )
+        yield 'recipe-list?tags', self._page(self._view(
+            views.RecipeViewSet, 'list', user,
+            tags=','.join(str(pk) for pk in tag_ids) or '0'
+        ))
+        yield 'recipe-list?ingredients', self._page(self._view(
+            views.RecipeViewSet, 'list', user,
+            ingredients=','.join(str(pk) for pk in ingredient_ids) or '0'
+        ))
+        yield 'recipe-list?search', self._page(self._view(
+            views.RecipeViewSet, 'list', user, search='recipe'
+        ))
+        for relation in ('tags', 'ingredients'):
+            through = getattr(Recipe, relation).through
+            column = Recipe._meta.get_field(relation).m2m_reverse_name()
+            yield f'recipe-list {relation}', through.objects.filter(
+                recipe_id__in=recipe_ids
+            ).order_by(column).values_list('recipe_id', column)
+        yield 'recipe-detail', self._view(
+            views.RecipeViewSet, 'retrieve', user
+        ).get_queryset().filter(pk=recipe_ids[0] if recipe_ids else 0)
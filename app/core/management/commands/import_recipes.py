@@ -0,0 +1,119 @@
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import importing
+
+
+class Command(BaseCommand):
+    """Django command to import users, tags, ingredients and recipes."""
+    help = 'Imports users, tags, ingredients and recipes from NDJSON or ' \
+           'CSV files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='+',
+            help='Files to import. Files ending in .csv are read as CSV, '
+                 'any other as NDJSON.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of records written per transaction.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the user owning records that name no user.'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Writes recipes with COPY (PostgreSQL only).'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the progress of the import. Running the '
+                 'same import again resumes after the last written batch.'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL.')
+
+        importer = importing.RecipeImporter(
+            batch_size=options['batch_size'],
+            use_copy=options['copy'],
+            default_user=options['user']
+        )
+        checkpoint = self._load_checkpoint(options['checkpoint'])
+        started = time.monotonic()
+        total = 0
+
+        for path in options['files']:
+            done = checkpoint.get(path, 0)
+            if done:
+                self.stdout.write(f'{path}: resuming after {done} records')
+
+            with open(path, newline='', encoding='utf-8') as file:
+                records = importing.read_records(
+                    file,
+                    importing.detect_format(path)
+                )
+                records = itertools.islice(records, done, None)
+                while True:
+                    batch = list(itertools.islice(records,
+                                                  options['batch_size']))
+                    if not batch:
+                        break
+
+                    with transaction.atomic():
+                        importer.import_batch(batch)
+
+                    done += len(batch)
+                    total += len(batch)
+                    checkpoint[path] = done
+                    self._save_checkpoint(options['checkpoint'], checkpoint)
+                    self.stdout.write(
+                        f'{path}: {done} records, '
+                        f'{self._rate(total, started):.0f} records/s'
+                    )
+
+        for error in importer.errors[:20]:
+            self.stderr.write(f'Skipped {error}')
+
+        counts = ', '.join(
+            f'{importer.counts[kind]} {kind}s'
+            for kind in importing.RECORD_TYPES + ('error', )
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total} records ({counts}) in '
+            f'{time.monotonic() - started:.1f}s, '
+            f'{self._rate(total, started):.0f} records/s.'
+        ))
+
+    def _rate(self, count, started):
+        """Returns the number of records imported per second."""
+        return count / max(time.monotonic() - started, 1e-6)
+
+    def _load_checkpoint(self, path):
+        """Returns the number of records already imported by input file."""
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except ValueError:
+            raise CommandError(f'Invalid checkpoint file {path}.')
+
+    def _save_checkpoint(self, path, checkpoint):
+        """Records the number of records imported by input file, replacing \
+            the file at once so that it is never left half written."""
+        if not path:
+            return
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core import image_processing
+
+
+class Command(BaseCommand):
+    """Django command to process staged recipe images."""
+    help = 'Processes recipe images waiting in the staging area.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Number of images processed concurrently.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of pending images fetched at a time.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait for new images when none are pending.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exits once no images are pending instead of waiting.'
+        )
+
+    def handle(self, *args, **options):
+        executor = None
+        process = image_processing.process_recipe_image
+        if options['workers'] > 1:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+            process = self._process_in_thread
+
+        try:
+            while True:
+                recipe_ids = image_processing.pending_recipe_ids(
+                    options['batch_size']
+                )
+                if not recipe_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                if executor is None:
+                    statuses = map(process, recipe_ids)
+                else:
+                    statuses = executor.map(process, recipe_ids)
+
+                for recipe_id, status in zip(recipe_ids, statuses):
+                    if status is not None:
+                        self.stdout.write(f'Recipe {recipe_id}: {status}')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS('No images pending.'))
+
+    def _process_in_thread(self, recipe_id):
+        """Processes the image of a recipe from a worker thread, which owns \
+            its own database connection."""
+        try:
+            return image_processing.process_recipe_image(recipe_id)
+        finally:
+            close_old_connections()
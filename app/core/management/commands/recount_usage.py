@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core import usage
+
+
+class Command(BaseCommand):
+    """Django command to repair the recipe counts of tags and ingredients."""
+    help = 'Recounts the recipes using each tag and ingredient, repairing ' \
+           'the counts that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of the user whose counts are checked. Defaults to '
+                 'every user.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Reports the drifted counts without repairing them.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of objects repaired per statement.'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user {options["user"]}.')
+
+        for relation, model in usage.COUNTED_MODELS.items():
+            queryset = model.objects.all()
+            if user is not None:
+                queryset = queryset.filter(user=user)
+
+            if options['dry_run']:
+                count = usage.drifted(relation, queryset).count()
+                self.stdout.write(f'{count} {relation} drifted.')
+            else:
+                count = usage.recount(relation, queryset,
+                                      options['batch_size'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'{count} {relation} repaired.'
+                ))
@@ -0,0 +1,98 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import seeding
+
+
+class Command(BaseCommand):
+    """Django command to generate a large synthetic dataset."""
+    help = 'Creates users with tags, ingredients and recipes linked by ' \
+           'Zipf-like popularity, the same for the same arguments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Number of users.'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Number of recipes of each user.'
+        )
+        parser.add_argument(
+            '--tags', type=int, default=200,
+            help='Number of tags of each user.'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=300,
+            help='Number of ingredients of each user.'
+        )
+        parser.add_argument(
+            '--tags-per-recipe', type=float, default=4,
+            help='Mean number of tags of a recipe.'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=float, default=8,
+            help='Mean number of ingredients of a recipe.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Exponent of the popularity of tags and ingredients by '
+                 'rank; 0 makes them equally popular.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of the random data.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of rows per insert statement.'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Writes recipe links with COPY (PostgreSQL only).'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['recipes'],
+               options['batch_size']) < 1 or \
+                min(options['tags'], options['ingredients'],
+                    options['tags_per_recipe'],
+                    options['ingredients_per_recipe'], options['skew']) < 0:
+            raise CommandError('Sizes must be positive.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL.')
+
+        started = time.monotonic()
+        totals = {'users': 0, 'recipes': 0, 'links': 0}
+
+        def progress(index, recipes, links):
+            totals['users'] += 1
+            totals['recipes'] += recipes
+            totals['links'] += links
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'user {index + 1}/{options["users"]}: {recipes} recipes, '
+                f'{links} links ({totals["links"] / elapsed:.0f} links/s)'
+            )
+
+        seeding.seed_dataset(
+            options['users'],
+            options['recipes'],
+            options['tags'],
+            options['ingredients'],
+            options['tags_per_recipe'],
+            options['ingredients_per_recipe'],
+            exponent=options['skew'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            use_copy=options['copy'],
+            progress=progress
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {totals["users"]} users, {totals["recipes"]} recipes '
+            f'and {totals["links"]} links in '
+            f'{time.monotonic() - started:.1f} s.'
+        ))
@@ -1,19 +1,50 @@
 import time
-from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from core import health
 
 
 class Command(BaseCommand):
     """Django command to pause execute until database is available."""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait for the database before failing.'
+        )
+        parser.add_argument(
+            '--initial-delay', type=float, default=0.1,
+            help='Upper bound of the first delay between attempts, doubled '
+                 'after each attempt.'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Upper bound of the delay between attempts.'
+        )
+        parser.add_argument(
+            '--database', default='default',
+            help='Alias of the database to wait for.'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delays = health.backoff_delays(options['initial_delay'],
+                                       options['max_delay'])
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                health.check_database(options['database'])
+                break
+            except OperationalError as exc:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]} '
+                        f'seconds: {exc}'
+                    )
+                delay = min(next(delays), remaining)
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:.2f} seconds...'
+                )
+                time.sleep(delay)
         self.stdout.write(self.style.SUCCESS('Database available.'))
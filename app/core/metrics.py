@@ -0,0 +1,454 @@
+import atexit
+import bisect
+import glob
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core.db import pool
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Name: (type, help, histogram buckets). Gauges hold the current value of
+# each process, summed over processes.
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Requests served, by route, method and status.', None
+    ),
+    'http_request_duration_seconds': (
+        'histogram', 'Time spent serving requests.', LATENCY_BUCKETS
+    ),
+    'http_response_size_bytes': (
+        'histogram', 'Size of response bodies.', SIZE_BUCKETS
+    ),
+    'db_queries_total': (
+        'counter', 'SQL queries run while serving requests.', None
+    ),
+    'db_query_duration_seconds_total': (
+        'counter', 'Time spent running SQL queries while serving requests.',
+        None
+    ),
+    'db_pool_connections': (
+        'gauge', 'Connections held by database pools, idle or in use.', None
+    ),
+    'db_pool_max_connections': (
+        'gauge', 'Most connections database pools may hold.', None
+    ),
+    'db_pool_connections_opened_total': (
+        'counter', 'Connections opened by database pools.', None
+    ),
+    'db_pool_connections_closed_total': (
+        'counter', 'Connections closed by database pools.', None
+    ),
+    'db_pool_checkouts_total': (
+        'counter', 'Connections handed out by database pools.', None
+    ),
+    'db_pool_exhausted_total': (
+        'counter', 'Checkouts that waited for a full pool.', None
+    ),
+    'db_pool_timeouts_total': (
+        'counter', 'Checkouts that gave up waiting for a full pool.', None
+    ),
+    'db_pool_checkout_seconds_total': (
+        'counter', 'Time spent waiting for pool connections.', None
+    ),
+}
+
+# Counters by the name of the pool stat they export.
+POOL_COUNTERS = {
+    'opened': 'db_pool_connections_opened_total',
+    'closed': 'db_pool_connections_closed_total',
+    'checkouts': 'db_pool_checkouts_total',
+    'exhausted': 'db_pool_exhausted_total',
+    'timeouts': 'db_pool_timeouts_total',
+    'checkout_time': 'db_pool_checkout_seconds_total',
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Methods recorded as themselves. Any other is recorded as 'other', so that
+# clients cannot add labels at will.
+METHODS = frozenset((
+    'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE',
+))
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    """Returns the METRICS setting, with defaults."""
+    config = {
+        'ENABLED': True,
+        'MULTIPROCESS_DIR': None,
+        'FLUSH_INTERVAL': 5,
+        'WORKERS': 1,
+        'TOKEN': None,
+        'ALLOWED_IPS': (),
+    }
+    config.update(getattr(settings, 'METRICS', {}))
+    return config
+
+
+def is_enabled():
+    """Returns whether requests are measured."""
+    return _config()['ENABLED']
+
+
+def lacks_multiprocess_dir():
+    """Returns whether several worker processes serve requests without a \
+        multiprocess directory, so that /metrics only shows the values of \
+        whichever process answers."""
+    config = _config()
+    return config['ENABLED'] and config['WORKERS'] > 1 and \
+        not config['MULTIPROCESS_DIR']
+
+
+def is_authorized(request):
+    """Returns whether a request may read the metrics: it must carry the \
+        bearer token, or come from an allowed address or network. Nothing \
+        is allowed when neither is configured."""
+    config = _config()
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if config['TOKEN'] and header.startswith('Bearer ') and \
+            hmac.compare_digest(header[len('Bearer '):], config['TOKEN']):
+        return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in config['ALLOWED_IPS'])
+
+
+class _Shard:
+    """Metric values recorded by a single thread."""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def merge(self, other):
+        """Adds the values of another shard to this one."""
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, value in other.gauges.copy().items():
+            self.gauges[key] = self.gauges.get(key, 0) + value
+        for key, values in other.histograms.copy().items():
+            mine = self.histograms.get(key)
+            if mine is None:
+                self.histograms[key] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    mine[index] += value
+
+
+class Registry:
+    """Counters and histograms of the process.
+
+    Each thread records into its own shard, so that recording takes no
+    lock. Shards are only summed when the metrics are collected, and the
+    shards of threads that ended are folded into a single one meanwhile.
+    With a multiprocess directory, each process also writes its values to
+    a file there every `flush_interval` seconds from a background thread,
+    and at exit, and collecting sums the files of every process. A process
+    killed loses at most its last interval.
+
+    `collectors` are functions returning a shard of values read from
+    elsewhere in the process when the values are taken.
+    """
+
+    def __init__(self, multiprocess_dir=None, flush_interval=5,
+                 collectors=()):
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        self.collectors = collectors
+        self.reset()
+
+    def reset(self):
+        """Forgets every value, as in a newly started process."""
+        # The locks are replaced too, as a forked process may inherit them
+        # held by a thread it does not have.
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._flusher = None
+        self._stopped = threading.Event()
+        self._file_name = f'{os.getpid()}-{uuid.uuid4().hex}.json'
+
+    def _shard(self):
+        """Returns the shard of the current thread."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._retire()
+                self._shards.append(
+                    (weakref.ref(threading.current_thread()), shard)
+                )
+            return shard
+
+    def _retire(self):
+        """Folds the shards of ended threads into one. Called with the lock \
+            held."""
+        live = []
+        for reference, shard in self._shards:
+            thread = reference()
+            if thread is None or not thread.is_alive():
+                self._retired.merge(shard)
+            else:
+                live.append((reference, shard))
+        self._shards = live
+
+    def inc(self, name, labels, value=1):
+        """Adds to a counter."""
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """Records a value in a histogram."""
+        histograms = self._shard().histograms
+        key = (name, labels)
+        buckets = METRICS[name][2]
+        values = histograms.get(key)
+        if values is None:
+            # A count per bucket, then +Inf, then the sum of the values.
+            values = histograms[key] = [0] * (len(buckets) + 2)
+        values[bisect.bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+    def snapshot(self):
+        """Returns the values of the process, summed over its threads."""
+        total = _Shard()
+        with self._lock:
+            self._retire()
+            total.merge(self._retired)
+            for _thread, shard in self._shards:
+                total.merge(shard)
+        for collector in self.collectors:
+            total.merge(collector())
+        return total
+
+    def flush(self, final=False):
+        """Writes the values of the process to its multiprocess file. \
+            The final flush of an exiting process leaves its gauges out, as \
+            what they measure goes away with it."""
+        if not self.multiprocess_dir:
+            return
+        with self._flush_lock:
+            snapshot = self.snapshot()
+            if final:
+                snapshot.gauges.clear()
+            path = os.path.join(self.multiprocess_dir, self._file_name)
+            with open(f'{path}.tmp', 'w') as file:
+                json.dump({
+                    'counters': [[name, labels, value] for (name, labels),
+                                 value in snapshot.counters.items()],
+                    'gauges': [[name, labels, value] for (name, labels),
+                               value in snapshot.gauges.items()],
+                    'histograms': [[name, labels, values] for (name, labels),
+                                   values in snapshot.histograms.items()],
+                }, file)
+            os.replace(f'{path}.tmp', path)
+
+    def start_flusher(self):
+        """Starts the thread writing the multiprocess file, once per \
+            process."""
+        if not self.multiprocess_dir or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_periodically,
+                name='metrics-flusher',
+                daemon=True
+            )
+            self._flusher.start()
+
+    def stop_flusher(self):
+        """Stops the thread writing the multiprocess file, if running."""
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+
+    def _flush_periodically(self):
+        """Writes the multiprocess file every flush interval until stopped."""
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('Could not write the metrics file')
+
+    def collect(self):
+        """Returns the values of every process."""
+        if not self.multiprocess_dir:
+            return self.snapshot()
+
+        self.flush()
+        total = _Shard()
+        for path in glob.glob(os.path.join(self.multiprocess_dir, '*.json')):
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            shard = _Shard()
+            for name, labels, value in data['counters']:
+                shard.counters[name, _labels(labels)] = value
+            for name, labels, value in data.get('gauges', ()):
+                shard.gauges[name, _labels(labels)] = value
+            for name, labels, values in data['histograms']:
+                shard.histograms[name, _labels(labels)] = values
+            total.merge(shard)
+        return total
+
+
+def _labels(pairs):
+    """Returns labels read back from JSON as a tuple of pairs."""
+    return tuple(tuple(pair) for pair in pairs)
+
+
+def _escape(value):
+    """Escapes a label value for the text format."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def _format_labels(labels):
+    """Returns labels in the text format."""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in labels
+    ) + '}'
+
+
+def _format_number(value):
+    """Returns a sample value in the text format."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value)
+
+
+def render(shard):
+    """Returns metric values in the Prometheus text format."""
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type in ('counter', 'gauge'):
+            values = shard.counters if metric_type == 'counter' else \
+                shard.gauges
+            for (key, labels), value in sorted(values.items()):
+                if key == name:
+                    lines.append(f'{name}{_format_labels(labels)} '
+                                 f'{_format_number(value)}')
+            continue
+
+        for (key, labels), values in sorted(shard.histograms.items()):
+            if key != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf', ), values):
+                cumulative += count
+                bucket_labels = labels + (('le', _format_number(bound)), )
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} '
+                         f'{_format_number(values[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} '
+                         f'{cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """Counts the SQL queries run, and the time they took, while capturing."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+    def capture(self):
+        """Returns a context manager timing the queries of every database \
+            connection of the thread."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+def record_request(route, method, status, duration, queries, size):
+    """Records the measures of a served request."""
+    if method not in METHODS:
+        method = 'other'
+    labels = (('route', route), ('method', method))
+    REGISTRY.inc('http_requests_total', labels + (('status', str(status)), ))
+    REGISTRY.observe('http_request_duration_seconds', labels, duration)
+    REGISTRY.inc('db_queries_total', labels, queries.count)
+    REGISTRY.inc('db_query_duration_seconds_total', labels, queries.duration)
+    if size is not None:
+        REGISTRY.observe('http_response_size_bytes', labels, size)
+    REGISTRY.start_flusher()
+
+
+def pool_values():
+    """Returns the stats of the database connection pools of the process."""
+    shard = _Shard()
+    for name, stats in pool.stats().items():
+        labels = (('pool', name), )
+        for stat, metric in POOL_COUNTERS.items():
+            shard.counters[metric, labels] = stats[stat]
+        for state in ('idle', 'in_use'):
+            shard.gauges['db_pool_connections',
+                         labels + (('state', state), )] = stats[state]
+        shard.gauges['db_pool_max_connections', labels] = stats['max_size']
+    return shard
+
+
+REGISTRY = Registry(_config()['MULTIPROCESS_DIR'], _config()['FLUSH_INTERVAL'],
+                    collectors=(pool_values, ))
+
+
+def _after_fork():
+    """Makes a worker process forked from a loaded app start from zero."""
+    REGISTRY.reset()
+    if is_enabled() and not REGISTRY.multiprocess_dir:
+        logger.warning(
+            'Metrics are recorded by forked worker processes without '
+            'METRICS_MULTIPROCESS_DIR: /metrics only shows the values of '
+            'the process answering it.'
+        )
+
+
+atexit.register(REGISTRY.flush, final=True)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,99 @@
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from core import metrics, profiling
+from core.authentication import CachedTokenAuthentication
+
+
+class MetricsMiddleware:
+    """Measures the latency, SQL queries and response size of requests, \
+        by resolved route.
+
+    Streaming responses are measured once their content has been sent, so
+    that the queries run while streaming are counted too.
+    """
+
+    def __init__(self, get_response):
+        if not metrics.is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        queries = metrics.QueryTimer()
+        with queries.capture():
+            response = self.get_response(request)
+
+        def record(size):
+            match = getattr(request, 'resolver_match', None)
+            metrics.record_request(
+                match.view_name if match else 'unmatched',
+                request.method,
+                response.status_code,
+                time.perf_counter() - started,
+                queries,
+                size
+            )
+
+        if response.streaming:
+            response.streaming_content = self._measure_stream(
+                response.streaming_content, queries, record
+            )
+        else:
+            record(len(response.content))
+        return response
+
+    def _measure_stream(self, content, queries, record):
+        """Yields the chunks of a streaming response, recording the request \
+            once they have all been sent."""
+        size = 0
+        try:
+            with queries.capture():
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            record(size)
+
+
+class ProfilingMiddleware:
+    """Profiles the requests of staff users asking for it with the \
+        X-Profile header or the profile query parameter, set to `cprofile` or
+        `sample`.
+
+    The profile is stored with the SQL the request ran, and its id returned
+    in the X-Profile-Id header of the response. Other requests only pay for
+    looking up the flag.
+    """
+    header = 'HTTP_X_PROFILE'
+    query_param = 'profile'
+
+    def __init__(self, get_response):
+        if not profiling.is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.META.get(self.header) or \
+            request.GET.get(self.query_param)
+        if mode not in profiling.MODES or not self._is_staff(request):
+            return self.get_response(request)
+
+        response, profile_id = profiling.profile(
+            mode, self.get_response, request
+        )
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def _is_staff(self, request):
+        """Returns whether a request comes from a staff user, logged in or \
+            authenticated by token."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        try:
+            result = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return result is not None and result[0].is_staff
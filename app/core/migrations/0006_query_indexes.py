@@ -0,0 +1,58 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+def create_recipe_covering_index(apps, schema_editor):
+    """Creates an index covering the recipe list columns, on PostgreSQL 11+
+    where INCLUDE is supported."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < 110000:
+        return
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_user_list_cov_idx ON core_recipe '
+        '(user_id, id DESC) INCLUDE (title, time_minutes, price, link)'
+    )
+
+
+def drop_recipe_covering_index(apps, schema_editor):
+    """Drops the recipe list covering index."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_recipe_user_list_cov_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_ingredient_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='core_recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_tag_user_name_idx'),
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX core_recipe_tags_tag_recipe_idx '
+             'ON core_recipe_tags (tag_id, recipe_id)'],
+            ['DROP INDEX core_recipe_tags_tag_recipe_idx']
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX core_recipe_ingredients_ingr_recipe_idx '
+             'ON core_recipe_ingredients (ingredient_id, recipe_id)'],
+            ['DROP INDEX core_recipe_ingredients_ingr_recipe_idx']
+        ),
+        migrations.RunPython(
+            create_recipe_covering_index,
+            drop_recipe_covering_index
+        ),
+    ]
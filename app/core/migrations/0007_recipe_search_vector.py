@@ -0,0 +1,62 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:07
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# A copy of core.search.UPDATE_SEARCH_VECTOR_SQL as of this migration, so
+# that later changes to the search do not change what it runs.
+FILL_SEARCH_VECTORS_SQL = """
+    UPDATE core_recipe SET search_vector =
+        setweight(to_tsvector('english', coalesce(core_recipe.title, '')),
+                  'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(core_tag.name, ' ')
+            FROM core_tag
+            INNER JOIN core_recipe_tags
+                ON core_recipe_tags.tag_id = core_tag.id
+            WHERE core_recipe_tags.recipe_id = core_recipe.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(core_ingredient.name, ' ')
+            FROM core_ingredient
+            INNER JOIN core_recipe_ingredients
+                ON core_recipe_ingredients.ingredient_id = core_ingredient.id
+            WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+        ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the GIN index on the search vector and fills it in for the
+    existing recipes, on PostgreSQL only."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_search_idx ON core_recipe '
+        'USING gin (search_vector)'
+    )
+    schema_editor.execute(FILL_SEARCH_VECTORS_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    """Drops the GIN index on the search vector."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_recipe_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
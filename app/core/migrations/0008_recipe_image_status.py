@@ -0,0 +1,38 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+from core.migrations._indexes import create_index
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    """Marks the images uploaded before background processing as ready."""
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.exclude(image__isnull=True).exclude(image='').update(
+        image_status='ready'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_staging',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=10),
+        ),
+        migrations.RunPython(
+            mark_existing_images_ready,
+            migrations.RunPython.noop
+        ),
+        create_index('core_recipe_image_pending_idx'),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:13
+
+from django.db import migrations
+
+from core.migrations._indexes import create_index
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merges tags and ingredients of a user whose names only differ by
+    case into the oldest one, moving their recipes over."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        column = f'{model_name.lower()}_id'
+
+        kept = {}
+        for pk, user_id, name in model.objects.order_by('id').values_list(
+                'id', 'user_id', 'name'):
+            keep = kept.setdefault((user_id, name.lower()), pk)
+            if keep == pk:
+                continue
+
+            recipe_ids = set(through.objects.filter(
+                **{column: keep}
+            ).values_list('recipe_id', flat=True))
+            through.objects.filter(**{column: pk}).exclude(
+                recipe_id__in=recipe_ids
+            ).update(**{column: keep})
+            model.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        create_index('core_tag_user_lower_name_uniq'),
+        create_index('core_ingredient_user_lower_name_uniq'),
+    ]
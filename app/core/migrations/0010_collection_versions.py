@@ -0,0 +1,61 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.migrations._indexes import restore_indexes
+
+
+def create_collection_versions(apps, schema_editor):
+    """Starts versioning the collections of existing users."""
+    User = apps.get_model('core', 'User')
+    CollectionVersion = apps.get_model('core', 'CollectionVersion')
+    CollectionVersion.objects.bulk_create(
+        CollectionVersion(user_id=user_id)
+        for user_id in User.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_unique_attribute_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipes', models.PositiveIntegerField(default=0)),
+                ('tags', models.PositiveIntegerField(default=0)),
+                ('ingredients', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        restore_indexes(
+            'core_recipe_image_pending_idx',
+            'core_tag_user_lower_name_uniq',
+            'core_ingredient_user_lower_name_uniq'
+        ),
+        migrations.RunPython(
+            create_collection_versions,
+            migrations.RunPython.noop
+        ),
+    ]
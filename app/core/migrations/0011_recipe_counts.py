@@ -0,0 +1,55 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:32
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.migrations._indexes import restore_indexes
+
+
+def count_recipes(apps, schema_editor):
+    """Counts the recipes using each existing tag and ingredient."""
+    for model_name, column in (('Tag', 'tag_id'),
+                               ('Ingredient', 'ingredient_id')):
+        model = apps.get_model('core', model_name)
+        through = apps.get_model('core', 'Recipe')._meta.get_field(
+            f'{model_name.lower()}s'
+        ).remote_field.through
+        model.objects.update(recipe_count=Coalesce(Subquery(
+            through.objects.filter(**{column: OuterRef('pk')}).order_by(
+            ).values(column).annotate(links=Count('*')).values('links'),
+            output_field=IntegerField()
+        ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_collection_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_ingredient_user_usage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_tag_user_usage_idx'),
+        ),
+        restore_indexes(
+            'core_tag_user_lower_name_uniq',
+            'core_ingredient_user_lower_name_uniq'
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.1.15 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+from core.migrations._indexes import create_index, restore_indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_claimed_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        restore_indexes('core_recipe_image_pending_idx'),
+        create_index('core_recipe_image_processing_idx'),
+    ]
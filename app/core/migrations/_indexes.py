@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+# Indexes created with raw SQL, which Django does not know about, by name:
+# (table, definition, unique). Backends without ALTER TABLE support, such
+# as SQLite, rebuild a table to alter it, dropping these indexes, so that
+# migrations altering their tables restore them afterwards. The migration
+# loader skips this module, as its name starts with an underscore.
+INDEXES = {
+    'core_recipe_image_pending_idx': (
+        'core_recipe', "(id) WHERE image_status = 'pending'", False
+    ),
+    'core_tag_user_lower_name_uniq': (
+        'core_tag', '(user_id, lower(name))', True
+    ),
+    'core_ingredient_user_lower_name_uniq': (
+        'core_ingredient', '(user_id, lower(name))', True
+    ),
+    'core_recipe_image_processing_idx': (
+        'core_recipe', "(image_claimed_at) WHERE image_status = 'processing'",
+        False
+    ),
+}
+
+
+def _create_sql(name, if_not_exists=False):
+    """Returns the SQL creating an index."""
+    table, definition, unique = INDEXES[name]
+    return ' '.join(filter(None, (
+        'CREATE',
+        'UNIQUE' if unique else '',
+        'INDEX',
+        'IF NOT EXISTS' if if_not_exists else '',
+        name,
+        f'ON {table} {definition}',
+    )))
+
+
+def create_index(name):
+    """Returns an operation creating an index, dropped when reversed."""
+    return migrations.RunSQL(
+        [_create_sql(name)],
+        [f'DROP INDEX IF EXISTS {name}']
+    )
+
+
+def restore_indexes(*names):
+    """Returns an operation creating the indexes missing after their \
+        tables were rebuilt."""
+    return migrations.RunSQL(
+        [_create_sql(name, if_not_exists=True) for name in names],
+        migrations.RunSQL.noop
+    )
@@ -1,9 +1,15 @@
 import uuid
 import os
-from django.db import models
+from collections import OrderedDict
+from django.db import models, connection
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
+from core import response_cache
 
 
 def recipe_image_file_path(instance, filename):
@@ -36,6 +42,76 @@ class UserManager(BaseUserManager):
         return user
 
 
+class RecipeAttributeManager(models.Manager):
+    """Manager for user owned recipe attributes, unique by name regardless \
+        of case."""
+
+    def filter_names(self, user, names):
+        """Returns the objects of the user named any of the given names, \
+            ignoring case."""
+        return self.annotate(lower_name=Lower('name')).filter(
+            user=user,
+            lower_name__in=[name.lower() for name in names]
+        )
+
+    def get_or_create_names(self, user, names):
+        """Returns the objects of the user with the given names, in the \
+            order given, creating the missing ones in a single statement. \
+            Names differing only by case resolve to the same object, once."""
+        unique = OrderedDict()
+        for name in names:
+            unique.setdefault(name.lower(), name)
+        if not unique:
+            return []
+
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        rows = ', '.join(['(%s, %s, %s, 0)'] * len(unique))
+        now = timezone.now()
+        params = [
+            value for name in unique.values()
+            for value in (name, user.pk, now)
+        ]
+        # The unique index on (user, lower(name)) makes concurrent callers
+        # skip names inserted by one another instead of duplicating them.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, user_id, updated_at, '
+                f'recipe_count) VALUES {rows} ON CONFLICT DO NOTHING',
+                params
+            )
+            created = cursor.rowcount
+
+        if created:
+            CollectionVersion.objects.bump(
+                user.pk,
+                CollectionVersion.collection_of(self.model)
+            )
+
+        objects = {
+            obj.name.lower(): obj
+            for obj in self.filter_names(user, unique.values())
+        }
+        return [objects[key] for key in unique if key in objects]
+
+
+class CollectionVersionManager(models.Manager):
+
+    def for_user(self, user):
+        """Returns the collection versions of a user, creating them if \
+            the user somehow has none."""
+        version, _ = self.get_or_create(user=user)
+        return version
+
+    def bump(self, user_id, *collections):
+        """Increments the versions of the given collections of a user, \
+            dropping the responses cached for them."""
+        self.filter(user_id=user_id).update(
+            updated_at=timezone.now(),
+            **{collection: F(collection) + 1 for collection in collections}
+        )
+        response_cache.invalidate(user_id)
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """Custom user model that supports that supports using email \
         instead of username."""
@@ -56,6 +132,19 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Number of recipes using the object, kept up to date by core.usage.
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    objects = RecipeAttributeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name', 'id'],
+                         name='core_tag_user_name_idx'),
+            models.Index(fields=['user', 'recipe_count', 'id'],
+                         name='core_tag_user_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -68,6 +157,19 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Number of recipes using the object, kept up to date by core.usage.
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    objects = RecipeAttributeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name', 'id'],
+                         name='core_ingredient_user_name_idx'),
+            models.Index(fields=['user', 'recipe_count', 'id'],
+                         name='core_ingredient_user_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -75,6 +177,17 @@ class Ingredient(models.Model):
 
 class Recipe(models.Model):
     """Recipe object."""
+    IMAGE_PENDING = 'pending'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -86,6 +199,48 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True
+    )
+    image_staging = models.CharField(max_length=255, blank=True)
+    image_claimed_at = models.DateTimeField(null=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='core_recipe_user_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class CollectionVersion(models.Model):
+    """Versions of the recipe, tag and ingredient collections of a user, \
+        incremented on every change to tell clients whether their copy is \
+        still current."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    recipes = models.PositiveIntegerField(default=0)
+    tags = models.PositiveIntegerField(default=0)
+    ingredients = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CollectionVersionManager()
+
+    @staticmethod
+    def collection_of(model):
+        """Returns the name of the collection the objects of a model are \
+            versioned in."""
+        return {
+            'recipe': 'recipes',
+            'tag': 'tags',
+            'ingredient': 'ingredients',
+        }[model._meta.model_name]
@@ -0,0 +1,299 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+MODES = ('cprofile', 'sample')
+
+# File name suffix of the artifact of each mode.
+ARTIFACT_SUFFIXES = {
+    'cprofile': '.pstats',
+    'sample': '.speedscope.json',
+}
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+SUMMARY_NAME = re.compile(r'^[0-9a-f]{32}\.json$')
+
+
+def _config():
+    """Returns the PROFILING setting, with defaults."""
+    config = {
+        'ENABLED': False,
+        'DIRECTORY': os.path.join(settings.BASE_DIR, 'profiles'),
+        'SAMPLE_INTERVAL': 0.001,
+        'TOP': 25,
+        'MAX_PROFILES': 100,
+    }
+    config.update(getattr(settings, 'PROFILING', {}))
+    return config
+
+
+def is_enabled():
+    """Returns whether staff can profile requests."""
+    return _config()['ENABLED']
+
+
+class QueryLog:
+    """Records the SQL queries run, and their durations, while capturing."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def summary(self, top):
+        """Returns the number and duration of the queries, and the \
+            statements that took longest in total."""
+        statements = defaultdict(lambda: [0, 0.0])
+        for sql, duration in self.queries:
+            statements[sql][0] += 1
+            statements[sql][1] += duration
+        slowest = sorted(statements.items(), key=lambda item: -item[1][1])
+        return {
+            'count': len(self.queries),
+            'time': sum(duration for _sql, duration in self.queries),
+            'top': [
+                {'sql': sql, 'count': count, 'time': duration}
+                for sql, (count, duration) in slowest[:top]
+            ],
+        }
+
+
+class CProfiler:
+    """Deterministic profiler recording every function call, saved as \
+        pstats."""
+
+    def __init__(self, config):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+    def summary(self, top):
+        """Returns the functions with the longest cumulative time."""
+        stats = pstats.Stats(self.profile).stats
+        slowest = sorted(stats.items(), key=lambda item: -item[1][3])
+        return [
+            {
+                'function': pstats.func_std_string(function),
+                'calls': calls,
+                'self_time': self_time,
+                'total_time': total_time,
+            }
+            for function, (_primitive, calls, self_time, total_time, _callers)
+            in slowest[:top]
+        ]
+
+
+class SamplingProfiler:
+    """Profiler taking the stack of the profiled thread from another \
+        thread at a fixed interval, saved in the speedscope format.
+
+    Its overhead does not grow with the number of calls, at the cost of
+    missing functions shorter than the interval.
+    """
+
+    def __init__(self, config):
+        self.interval = config['SAMPLE_INTERVAL']
+        self.frames = []
+        self.frame_ids = {}
+        self.samples = []
+        self.weights = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        target = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample, args=(target, ), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._duration = time.perf_counter() - self._started
+
+    def _sample(self, target):
+        """Records the stack of the target thread until stopped."""
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def _frame_id(self, code):
+        """Returns the index of the frame of a function in `frames`."""
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        frame_id = self.frame_ids.get(key)
+        if frame_id is None:
+            frame_id = self.frame_ids[key] = len(self.frames)
+            self.frames.append(
+                {'name': key[0], 'file': key[1], 'line': key[2]}
+            )
+        return frame_id
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump({
+                '$schema': SPEEDSCOPE_SCHEMA,
+                'shared': {'frames': self.frames},
+                'profiles': [{
+                    'type': 'sampled',
+                    'name': 'request',
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': self._duration,
+                    'samples': self.samples,
+                    'weights': self.weights,
+                }],
+            }, file)
+
+    def summary(self, top):
+        """Returns the functions seen in the most samples."""
+        total = Counter()
+        own = Counter()
+        for stack, weight in zip(self.samples, self.weights):
+            for frame_id in set(stack):
+                total[frame_id] += weight
+            if stack:
+                own[stack[-1]] += weight
+        return [
+            {
+                'function': '{file}:{line}({name})'.format(
+                    **self.frames[frame_id]
+                ),
+                'self_time': own[frame_id],
+                'total_time': total_time,
+            }
+            for frame_id, total_time in total.most_common(top)
+        ]
+
+
+PROFILERS = {
+    'cprofile': CProfiler,
+    'sample': SamplingProfiler,
+}
+
+
+def profile(mode, get_response, request):
+    """Serves a request under a profiler, capturing its SQL, and stores \
+        the profile. Returns the response and the id of the profile.
+
+    Only the MAX_PROFILES newest profiles are kept. The content of a
+    streaming response is produced after the profiler stops, so it is not
+    profiled, which the `streaming` flag of the summary tells.
+    """
+    config = _config()
+    profiler = PROFILERS[mode](config)
+    queries = QueryLog()
+    started = time.perf_counter()
+
+    with _capture(queries):
+        profiler.start()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.stop()
+    duration = time.perf_counter() - started
+
+    profile_id = uuid.uuid4().hex
+    os.makedirs(config['DIRECTORY'], exist_ok=True)
+    profiler.save(artifact_path(profile_id, mode))
+    with open(summary_path(profile_id), 'w') as file:
+        json.dump({
+            'id': profile_id,
+            'mode': mode,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'duration': duration,
+            'functions': profiler.summary(config['TOP']),
+            'queries': queries.summary(config['TOP']),
+        }, file, indent=2)
+    prune(config['MAX_PROFILES'])
+    return response, profile_id
+
+
+def prune(keep):
+    """Deletes every stored profile but the `keep` newest."""
+    directory = _config()['DIRECTORY']
+    profiles = []
+    for entry in os.scandir(directory):
+        if SUMMARY_NAME.match(entry.name):
+            try:
+                profiles.append((entry.stat().st_mtime, entry.name[:32]))
+            except FileNotFoundError:
+                continue
+    profiles.sort(reverse=True)
+
+    for _mtime, profile_id in profiles[keep:]:
+        paths = [summary_path(profile_id)] + [
+            artifact_path(profile_id, mode) for mode in MODES
+        ]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _capture(queries):
+    """Returns a context manager logging the queries of every database \
+        connection of the thread."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(queries))
+    return stack
+
+
+def summary_path(profile_id):
+    """Returns the path of the summary of a profile."""
+    return os.path.join(_config()['DIRECTORY'], f'{profile_id}.json')
+
+
+def artifact_path(profile_id, mode):
+    """Returns the path of the profiler output of a profile."""
+    return os.path.join(_config()['DIRECTORY'],
+                        f'{profile_id}{ARTIFACT_SUFFIXES[mode]}')
+
+
+def load_summary(profile_id):
+    """Returns the summary of a stored profile, or None when missing."""
+    try:
+        with open(summary_path(profile_id)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,159 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+
+def _config():
+    """Returns the RESPONSE_CACHE setting, with defaults."""
+    config = {
+        'ENABLED': False,
+        'ALIAS': 'default',
+        'ALLOW_LOCAL': False,
+        'TIMEOUT': 300,
+        'EARLY_REFRESH': 30,
+        'LOCK_TIMEOUT': 10,
+        'LOCK_WAIT': 2,
+    }
+    config.update(getattr(settings, 'RESPONSE_CACHE', {}))
+    return config
+
+
+# Backends whose entries are only seen by the process that wrote them.
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def is_shared():
+    """Returns whether the cache backend is shared between processes, so \
+        that an invalidation in one process is seen by the others."""
+    alias = _config()['ALIAS']
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend is not None and backend not in LOCAL_BACKENDS
+
+
+def is_refused():
+    """Returns whether caching is enabled on a cache local to the process \
+        without ALLOW_LOCAL, in which case it stays off: other processes \
+        would keep serving responses it has invalidated."""
+    config = _config()
+    return config['ENABLED'] and not config['ALLOW_LOCAL'] and \
+        not is_shared()
+
+
+def is_enabled():
+    """Returns whether responses are cached."""
+    return _config()['ENABLED'] and not is_refused()
+
+
+def _cache():
+    """Returns the cache backend responses are stored in."""
+    return caches[_config()['ALIAS']]
+
+
+def _generation_key(user_id):
+    """Returns the cache key of the generation of a user's responses."""
+    return f'responses:{user_id}:generation'
+
+
+def _new_generation():
+    """Returns a generation unlikely to have been used before, so that an \
+        evicted generation never brings back stale responses."""
+    return int(time.time() * 1000)
+
+
+def generation(user_id):
+    """Returns the current generation of a user's cached responses."""
+    cache = _cache()
+    key = _generation_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _new_generation(), None)
+        value = cache.get(key)
+    return value
+
+
+def _increment(user_id):
+    """Moves a user's cached responses to a new generation."""
+    cache = _cache()
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_generation(), None)
+
+
+def invalidate(user_id):
+    """Makes every cached response of a user stale.
+
+    Within a transaction the generation is moved again once it commits, so
+    that a response cached from the old data in the meantime is dropped too.
+    """
+    if not is_enabled():
+        return
+    _increment(user_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _increment(user_id))
+
+
+def make_key(user_id, *parts):
+    """Returns the cache key of a response of a user, built from the parts \
+        that identify it."""
+    digest = hashlib.md5(
+        '\n'.join(str(part) for part in parts).encode('utf-8')
+    ).hexdigest()
+    return f'responses:{user_id}:{generation(user_id)}:{digest}'
+
+
+def get_or_set(key, compute):
+    """Returns the value cached under a key, computing and caching it when \
+        missing. A None value from `compute` is returned but not cached.
+
+    Only one caller at a time computes a value: on a miss the others wait
+    for it to be cached, and once a value nears its expiry one caller
+    refreshes it while the others keep being served the current value.
+    """
+    config = _config()
+    cache = _cache()
+
+    entry = cache.get(key)
+    if entry is not None:
+        refresh_at, value = entry
+        if time.time() < refresh_at or not _lock(cache, key, config):
+            return value
+        return _compute(cache, key, compute, config)
+
+    if _lock(cache, key, config):
+        return _compute(cache, key, compute, config)
+
+    deadline = time.monotonic() + config['LOCK_WAIT']
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+
+    # The caller holding the lock is taking too long, or has failed.
+    return compute()
+
+
+def _lock(cache, key, config):
+    """Tries to become the caller computing the value of a key."""
+    return cache.add(f'{key}:lock', 1, config['LOCK_TIMEOUT'])
+
+
+def _compute(cache, key, compute, config):
+    """Computes and caches the value of a key, then releases its lock."""
+    try:
+        value = compute()
+        if value is not None:
+            timeout = config['TIMEOUT']
+            refresh_at = time.time() + timeout - config['EARLY_REFRESH']
+            cache.set(key, (refresh_at, value), timeout)
+        return value
+    finally:
+        cache.delete(f'{key}:lock')
@@ -0,0 +1,81 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, IntegerField, Q, Value
+from django.db.models.expressions import ExpressionWrapper
+from django.db.models.functions import Cast
+
+
+SEARCH_CONFIG = 'english'
+
+# Ranks are scaled to integers so they can be compared exactly when
+# paginating, instead of round tripping floats through the cursor.
+RANK_SCALE = 1000000
+
+UPDATE_SEARCH_VECTOR_SQL = """
+    UPDATE core_recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, coalesce(core_recipe.title, '')),
+                  'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_tag.name, ' ')
+            FROM core_tag
+            INNER JOIN core_recipe_tags
+                ON core_recipe_tags.tag_id = core_tag.id
+            WHERE core_recipe_tags.recipe_id = core_recipe.id
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_ingredient.name, ' ')
+            FROM core_ingredient
+            INNER JOIN core_recipe_ingredients
+                ON core_recipe_ingredients.ingredient_id = core_ingredient.id
+            WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+        ), '')), 'C')
+"""
+
+
+def is_supported():
+    """Returns whether the database supports full text search."""
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vectors(recipe_ids=None):
+    """Recomputes the search vector of the given recipes, or of every \
+        recipe when no ids are given, in a single statement."""
+    if not is_supported():
+        return
+
+    sql = UPDATE_SEARCH_VECTOR_SQL
+    params = {'config': SEARCH_CONFIG}
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        sql += ' WHERE core_recipe.id = ANY(%(ids)s)'
+        params['ids'] = recipe_ids
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def search_recipes(queryset, terms):
+    """Filters recipes matching the search terms on their title, tag or \
+        ingredient names, annotating a `rank` to order them by relevance.
+
+    Backends without full text search fall back to a case insensitive
+    substring match, with every match ranked the same.
+    """
+    if not is_supported():
+        return queryset.filter(
+            Q(title__icontains=terms) |
+            Q(tags__name__icontains=terms) |
+            Q(ingredients__name__icontains=terms)
+        ).annotate(rank=Value(0, output_field=IntegerField())).distinct()
+
+    query = SearchQuery(terms, config=SEARCH_CONFIG)
+    rank = ExpressionWrapper(
+        SearchRank(F('search_vector'), query) * RANK_SCALE,
+        output_field=FloatField()
+    )
+
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(rank, IntegerField())
+    )
@@ -0,0 +1,195 @@
+import heapq
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import AutoField
+from core import search, usage
+from core.importing import copy_rows
+from core.models import Tag, Ingredient, Recipe
+
+
+# Keeps each multi-row insert within the limits of every backend.
+INSERT_BATCH_SIZE = 500
+
+DATASET_EMAIL_DOMAIN = 'seed.invalid'
+
+TITLE_ADJECTIVES = ('Spicy', 'Creamy', 'Roasted', 'Crispy', 'Smoky', 'Fresh',
+                    'Slow-cooked', 'Grilled', 'Tangy', 'Hearty')
+TITLE_DISHES = ('soup', 'salad', 'curry', 'stew', 'pasta', 'risotto', 'pie',
+                'tacos', 'noodles', 'casserole', 'bowl', 'skewers')
+
+
+def seed_recipes(email, count, relations=3, names=None):
+    """Creates a user owning `count` recipes, each with `relations` tags \
+        and as many ingredients, out of `names` of each (ten times \
+        `relations` by default). Returns the user."""
+    names = max(names or relations * 10, relations)
+    user = get_user_model().objects.create_user(email, None)
+    tags = Tag.objects.get_or_create_names(
+        user, [f'tag {i}' for i in range(names)]
+    )
+    ingredients = Ingredient.objects.get_or_create_names(
+        user, [f'ingredient {i}' for i in range(names)]
+    )
+
+    Recipe.objects.bulk_create(
+        [Recipe(user=user, title=f'recipe {i}', time_minutes=i % 120,
+                price=i % 100, link=f'https://example.com/{i}')
+         for i in range(count)],
+        batch_size=INSERT_BATCH_SIZE
+    )
+    recipe_ids = Recipe.objects.filter(user=user).values_list(
+        'id', flat=True
+    )
+    for field, column, objects in (('tags', 'tag_id', tags),
+                                   ('ingredients', 'ingredient_id',
+                                    ingredients)):
+        through = getattr(Recipe, field).through
+        through.objects.bulk_create(
+            [through(recipe_id=pk, **{
+                column: objects[(pk + offset) % len(objects)].pk
+            }) for pk in recipe_ids for offset in range(relations)],
+            batch_size=INSERT_BATCH_SIZE
+        )
+        usage.recount(
+            field,
+            usage.COUNTED_MODELS[field].objects.filter(user=user)
+        )
+
+    return user
+
+
+def popularity(count, exponent):
+    """Returns weights giving the item of rank r a popularity proportional \
+        to 1 / r ** exponent, as in Zipf's law."""
+    return [1 / rank ** exponent for rank in range(1, count + 1)]
+
+
+def _pick(rng, ids, weights, mean):
+    """Returns distinct ids drawn by popularity, as many as an exponential \
+        draw around `mean`, so that a few recipes have many.
+
+    Ids are drawn without replacement by giving each a random key of
+    u ** (1 / weight) and keeping the largest keys (Efraimidis and
+    Spirakis), so that no draw is lost to a duplicate.
+    """
+    if not ids or mean <= 0:
+        return set()
+    count = min(len(ids), int(rng.expovariate(1 / mean) + 0.5))
+    keys = [rng.random() ** (1 / weight) for weight in weights]
+    return {pk for _key, pk in heapq.nlargest(count, zip(keys, ids))}
+
+
+def seed_dataset(users, recipes, tags, ingredients, tags_per_recipe,
+                 ingredients_per_recipe, exponent=1.1, seed=0,
+                 batch_size=5000, use_copy=False, progress=None):
+    """Creates users, each with `recipes` recipes linked to their `tags` \
+        tags and `ingredients` ingredients by Zipf-like popularity.
+
+    The data only depends on the arguments: each user is generated from its
+    own random state derived from `seed`, in a transaction of its own, and
+    users that already exist are skipped so that an interrupted run can be
+    resumed. `progress`, when given, is called after each user with its
+    index and the number of recipes and links created.
+    """
+    tag_weights = popularity(tags, exponent)
+    ingredient_weights = popularity(ingredients, exponent)
+    existing = set(get_user_model().objects.filter(
+        email__endswith=f'@{DATASET_EMAIL_DOMAIN}'
+    ).values_list('email', flat=True))
+
+    for index in range(users):
+        email = f'user{index}@{DATASET_EMAIL_DOMAIN}'
+        if email in existing:
+            continue
+        rng = random.Random(f'{seed}:{index}')
+        with transaction.atomic():
+            links = _seed_user(
+                rng, index, email, recipes,
+                (('tags', Tag, tags, tag_weights, tags_per_recipe),
+                 ('ingredients', Ingredient, ingredients, ingredient_weights,
+                  ingredients_per_recipe)),
+                batch_size, use_copy
+            )
+        if progress is not None:
+            progress(index, recipes, links)
+
+
+def _seed_user(rng, index, email, recipes, relations, batch_size, use_copy):
+    """Creates a user of the dataset with its data, returning the number \
+        of links between its recipes and tags or ingredients."""
+    user = get_user_model().objects.create_user(email, None)
+
+    related_ids = {}
+    for relation, model, count, _weights, _mean in relations:
+        prefix = model._meta.verbose_name
+        names = [f'{prefix} {rank}' for rank in range(count)]
+        _bulk_create(model, [model(user=user, name=name) for name in names],
+                     batch_size)
+        by_name = dict(model.objects.filter(user=user).values_list(
+            'name', 'id'
+        ))
+        related_ids[relation] = [by_name[name] for name in names]
+
+    _bulk_create(Recipe, [Recipe(
+        user=user,
+        title=f'{rng.choice(TITLE_ADJECTIVES)} '
+              f'{rng.choice(TITLE_DISHES)} {number}',
+        time_minutes=rng.randint(5, 180),
+        price=Decimal(rng.randint(100, 5000)) / 100,
+        link=f'https://example.com/{index}/{number}'
+    ) for number in range(recipes)], batch_size)
+    recipe_ids = list(Recipe.objects.filter(user=user).order_by(
+        'id'
+    ).values_list('id', flat=True))
+
+    links = 0
+    for relation, model, _count, weights, mean in relations:
+        ids = related_ids[relation]
+        rows = [(recipe_id, pk) for recipe_id in recipe_ids
+                for pk in sorted(_pick(rng, ids, weights, mean))]
+        _insert_links(relation, rows, batch_size, use_copy)
+        usage.recount(relation, model.objects.filter(user=user))
+        links += len(rows)
+
+    search.update_search_vectors(recipe_ids)
+    return links
+
+
+def _insert_links(relation, rows, batch_size, use_copy):
+    """Inserts links between recipes and tags or ingredients.
+
+    Rows are written with plain multi-row INSERT statements, as building a
+    model instance per link would take most of the time.
+    """
+    field = Recipe._meta.get_field(relation)
+    table = field.m2m_db_table()
+    columns = [field.m2m_column_name(), field.m2m_reverse_name()]
+    if use_copy:
+        copy_rows(table, columns, rows)
+        return
+
+    max_params = connection.features.max_query_params
+    if max_params:
+        batch_size = min(batch_size, max_params // len(columns))
+    quote = connection.ops.quote_name
+    insert = f'INSERT INTO {quote(table)} ' \
+             f'({", ".join(quote(column) for column in columns)}) VALUES '
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                insert + ', '.join(['(%s, %s)'] * len(batch)),
+                [value for row in batch for value in row]
+            )
+
+
+def _bulk_create(model, objs, batch_size):
+    """Inserts objects in batches of at most `batch_size`, or fewer when \
+        the backend limits the parameters of a statement."""
+    fields = [field for field in model._meta.concrete_fields
+              if not isinstance(field, AutoField)]
+    limit = connection.ops.bulk_batch_size(fields, objs)
+    model.objects.bulk_create(objs, batch_size=max(min(batch_size, limit), 1))
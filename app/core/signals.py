@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+                                     pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core import response_cache, search, usage
+from core.authentication import token_cache
+from core.models import Tag, Ingredient, Recipe, CollectionVersion
+
+
+@receiver((post_save, post_delete), sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Drops a token from the authentication cache when it changes."""
+    token_cache.delete(instance.key)
+
+
+@receiver((post_save, post_delete), sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Drops the tokens of a user from the authentication cache, so that \
+        changes such as deactivation take effect on the next request."""
+    keys = ()
+    if token_cache.shared_cache is not None:
+        keys = Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True
+        )
+    token_cache.delete_user(instance.pk, keys)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_collection_version(sender, instance, created, raw=False,
+                              **kwargs):
+    """Starts versioning the collections of a new user."""
+    if created and not raw:
+        CollectionVersion.objects.create(user=instance)
+        response_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, update_fields=None,
+                                **kwargs):
+    """Refreshes the search vector of a recipe when its title changes."""
+    if update_fields is not None and 'title' not in update_fields:
+        return
+    search.update_search_vectors([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_search_vectors_on_m2m(sender, instance, action, reverse, model,
+                                 pk_set, **kwargs):
+    """Refreshes the search vectors of recipes whose tags or ingredients \
+        changed, from either side of the relation."""
+    if not search.is_supported():
+        return
+
+    if action == 'pre_clear' and reverse:
+        instance._search_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        search.update_search_vectors([instance.pk])
+    elif action == 'post_clear':
+        search.update_search_vectors(
+            getattr(instance, '_search_recipe_ids', [])
+        )
+    else:
+        search.update_search_vectors(pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_search_recipes(sender, instance, **kwargs):
+    """Remembers the recipes using a tag or ingredient being deleted."""
+    if not search.is_supported():
+        return
+    instance._search_recipe_ids = list(
+        instance.recipe_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_search_vectors_on_rename(sender, instance, created=False,
+                                    **kwargs):
+    """Refreshes the search vectors of recipes using a tag or ingredient \
+        that was renamed or deleted."""
+    if created or not search.is_supported():
+        return
+
+    recipe_ids = getattr(instance, '_search_recipe_ids', None)
+    if recipe_ids is None:
+        recipe_ids = instance.recipe_set.values_list('pk', flat=True)
+    search.update_search_vectors(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_collection_version(sender, instance, **kwargs):
+    """Marks the collection of a changed object as modified."""
+    CollectionVersion.objects.bump(
+        instance.user_id,
+        CollectionVersion.collection_of(sender)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_recipes_version_on_m2m(sender, instance, action, **kwargs):
+    """Marks the recipes of a user as modified when their tags or \
+        ingredients change, from either side of the relation."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        CollectionVersion.objects.bump(instance.user_id, 'recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts_on_m2m(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Keeps the recipe counts of tags and ingredients in step with the \
+        links added or removed, from either side of the relation."""
+    relation = 'tags' if sender is Recipe.tags.through else 'ingredients'
+
+    if action == 'post_add':
+        if reverse:
+            usage.adjust(relation, {instance.pk: len(pk_set)})
+        else:
+            usage.adjust(relation, dict.fromkeys(pk_set, 1))
+    elif action in ('pre_remove', 'pre_clear'):
+        # Removals may name links that do not exist, so the existing ones
+        # are counted before they go.
+        if reverse:
+            removed = usage.links(relation, pk_set, [instance.pk])
+        else:
+            removed = usage.links(relation, [instance.pk], pk_set)
+        if not hasattr(instance, '_usage_removed'):
+            instance._usage_removed = {}
+        instance._usage_removed[relation] = removed
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_usage_removed', {}).pop(relation, {})
+        usage.adjust(relation, {pk: -count for pk, count in removed.items()})
+
+
+@receiver(pre_delete, sender=Recipe)
+def collect_recipe_links(sender, instance, **kwargs):
+    """Remembers the tags and ingredients of a recipe being deleted, as \
+        its links are deleted along with it without m2m signals."""
+    instance._usage_removed = {
+        relation: usage.links(relation, [instance.pk])
+        for relation in usage.COUNTED_MODELS
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def update_recipe_counts_on_delete(sender, instance, **kwargs):
+    """Stops counting a deleted recipe for its tags and ingredients."""
+    for relation, removed in getattr(instance, '_usage_removed', {}).items():
+        usage.adjust(relation, {pk: -count for pk, count in removed.items()})
@@ -0,0 +1,229 @@
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from unittest.mock import patch
+
+from django.db import connections
+from django.urls import Resolver404
+from rest_framework.test import APIClient
+
+from recipe.pagination import RecipePagination
+
+
+# Wall time budgets are multiplied by this factor, to allow for slow
+# machines such as shared CI runners.
+TIME_FACTOR = float(os.environ.get('BUDGET_TIME_FACTOR', 1))
+
+# Budgets hold for a user with up to this many recipes, each with three
+# tags and three ingredients, for pages of the default size and for bulk
+# requests of up to BULK_SIZE items.
+DATA_SIZE = 500
+BULK_SIZE = 10
+
+# Rows fetched for a page: one more than its size, to find the next page.
+PAGE_ROWS = RecipePagination.page_size + 1
+
+
+class Budget:
+    """Most SQL queries, rows fetched and seconds a request can take."""
+
+    def __init__(self, queries, rows, seconds):
+        self.queries = queries
+        self.rows = rows
+        self.seconds = seconds
+
+
+# Budgets by method and route name. Creating users and tokens hashes a
+# password, which takes most of their time.
+BUDGETS = {
+    ('POST', 'user:create'): Budget(queries=3, rows=1, seconds=1),
+    ('POST', 'user:token'): Budget(queries=5, rows=2, seconds=1),
+    ('GET', 'user:me'): Budget(queries=1, rows=1, seconds=0.5),
+    ('PUT', 'user:me'): Budget(queries=3, rows=1, seconds=1),
+    ('PATCH', 'user:me'): Budget(queries=3, rows=1, seconds=1),
+    ('GET', 'recipe:api-root'): Budget(queries=0, rows=0, seconds=0.5),
+    ('GET', 'recipe:tag-list'): Budget(queries=2, rows=PAGE_ROWS,
+                                       seconds=0.5),
+    ('POST', 'recipe:tag-list'): Budget(queries=3, rows=1, seconds=0.5),
+    ('POST', 'recipe:tag-bulk'): Budget(queries=3, rows=BULK_SIZE,
+                                        seconds=0.5),
+    ('GET', 'recipe:ingredient-list'): Budget(queries=2, rows=PAGE_ROWS,
+                                              seconds=0.5),
+    ('POST', 'recipe:ingredient-list'): Budget(queries=3, rows=1,
+                                               seconds=0.5),
+    ('POST', 'recipe:ingredient-bulk'): Budget(queries=3, rows=BULK_SIZE,
+                                               seconds=0.5),
+    # A page of recipes fetches the page, then its tags and ingredients.
+    ('GET', 'recipe:recipe-list'): Budget(queries=4, rows=PAGE_ROWS * 7,
+                                          seconds=0.5),
+    ('POST', 'recipe:recipe-list'): Budget(queries=20, rows=12, seconds=1),
+    ('POST', 'recipe:recipe-bulk'): Budget(queries=32, rows=BULK_SIZE * 8,
+                                           seconds=1),
+    ('GET', 'recipe:recipe-export'): Budget(queries=4, rows=DATA_SIZE * 7,
+                                            seconds=2),
+    ('GET', 'recipe:recipe-detail'): Budget(queries=4, rows=8, seconds=0.5),
+    ('PUT', 'recipe:recipe-detail'): Budget(queries=33, rows=30, seconds=1),
+    ('PATCH', 'recipe:recipe-detail'): Budget(queries=18, rows=20,
+                                              seconds=1),
+    ('DELETE', 'recipe:recipe-detail'): Budget(queries=13, rows=13,
+                                               seconds=1),
+    ('POST', 'recipe:recipe-upload-image'): Budget(queries=8, rows=3,
+                                                   seconds=1),
+}
+
+
+class QueryLog(list):
+    """Queries run, as dicts of their SQL, duration and rows fetched."""
+
+    def rows(self):
+        """Returns the number of rows fetched by every query."""
+        return sum(query['rows'] for query in self)
+
+    def format(self):
+        """Returns the queries as numbered lines."""
+        return '\n'.join(
+            f'  {number}. [{query["time"] * 1000:.1f} ms, '
+            f'{query["rows"]} rows] {query["sql"]}'
+            for number, query in enumerate(self, 1)
+        )
+
+
+class RowCountingCursor:
+    """Cursor logging each query it runs with the number of rows fetched \
+        from its results.
+
+    Wraps the cursor wrapper of a connection, so that the queries still
+    show in `assertNumQueries` and `connection.queries`.
+    """
+
+    def __init__(self, cursor, log):
+        self.cursor = cursor
+        self.log = log
+        self.query = None
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        for row in self.cursor:
+            self._fetched(1)
+            yield row
+
+    def execute(self, sql, params=None):
+        return self._run(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._run(self.cursor.executemany, sql, param_list)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self._fetched(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self._fetched(len(rows))
+        return rows
+
+    def _run(self, method, sql, params):
+        """Runs and logs a query."""
+        started = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self.query = {
+                'sql': self.cursor.db.ops.last_executed_query(
+                    self.cursor.cursor, sql, params
+                ),
+                'time': time.perf_counter() - started,
+                'rows': 0,
+            }
+            self.log.append(self.query)
+
+    def _fetched(self, rows):
+        """Counts rows fetched from the results of the last query."""
+        if self.query is not None:
+            self.query['rows'] += rows
+
+
+@contextmanager
+def count_rows(log):
+    """Logs the queries of every connection, with the rows they fetch."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            for name in ('cursor', 'chunked_cursor'):
+                create = getattr(connection, name)
+                stack.enter_context(patch.object(
+                    connection, name,
+                    lambda create=create: RowCountingCursor(create(), log)
+                ))
+        yield log
+
+
+class BudgetAPIClient(APIClient):
+    """API client failing every request that exceeds the budget of its \
+        route, listing the queries it ran.
+
+    Streaming responses are read before they are returned, so that the
+    queries run while streaming count. Requests to routes without a budget
+    are not checked. Wall time is only checked with `check_time`, which
+    the dedicated performance tests set, so that a slow machine cannot
+    fail functional tests.
+    """
+    budgets = BUDGETS
+    check_time = False
+
+    def request(self, **kwargs):
+        log = QueryLog()
+        with count_rows(log):
+            started = time.perf_counter()
+            response = super().request(**kwargs)
+            if response.streaming:
+                response.streaming_content = list(
+                    response.streaming_content
+                )
+            elapsed = time.perf_counter() - started
+
+        budget = self.get_budget(response)
+        if budget is not None:
+            self.check_budget(response, budget, log, elapsed)
+        return response
+
+    def get_budget(self, response):
+        """Returns the budget of the route of a request, if any."""
+        try:
+            route = response.resolver_match.view_name
+        except Resolver404:
+            return None
+        method = response.request['REQUEST_METHOD']
+        return self.budgets.get((method, route))
+
+    def check_budget(self, response, budget, log, elapsed):
+        """Fails when a request went over its budget."""
+        excesses = []
+        if len(log) > budget.queries:
+            excesses.append(f'{len(log)} queries (budget {budget.queries})')
+        if log.rows() > budget.rows:
+            excesses.append(f'{log.rows()} rows (budget {budget.rows})')
+        if self.check_time and elapsed > budget.seconds * TIME_FACTOR:
+            excesses.append(f'{elapsed:.3f} s (budget '
+                            f'{budget.seconds * TIME_FACTOR:.3f} s)')
+        if excesses:
+            raise AssertionError(
+                f'{response.request["REQUEST_METHOD"]} '
+                f'{response.request["PATH_INFO"]} '
+                f'({response.resolver_match.view_name}) went over its '
+                f'budget: {", ".join(excesses)}.\n{log.format()}'
+            )
@@ -0,0 +1,194 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core import authentication, checks
+from core.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse('user:me')
+
+
+class TokenCacheTest(TestCase):
+    """Tests the token LRU cache."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+
+    def test_evicts_least_recently_used(self):
+        """Tests that the oldest entry is evicted when full."""
+        cache = TokenCache(max_size=2)
+        cache.set('a', self.user, None)
+        cache.set('b', self.user, None)
+        cache.get('a')
+        cache.set('c', self.user, None)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_lookups_return_new_instances(self):
+        """Tests that changes to a user returned by the cache are not seen \
+            by later lookups."""
+        token = Token.objects.create(user=self.user)
+        cache = TokenCache()
+        cache.set('a', self.user, token)
+
+        user, cached_token = cache.get('a')
+        user.name = 'changed'
+
+        other_user, other_token = cache.get('a')
+        self.assertIsNot(other_user, user)
+        self.assertEqual(other_user.pk, self.user.pk)
+        self.assertEqual(other_user.name, self.user.name)
+        self.assertEqual(other_token.key, token.key)
+        self.assertIs(other_token.user, other_user)
+
+    @patch('time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Tests that entries are dropped after their time to live."""
+        monotonic.return_value = 100
+        cache = TokenCache(ttl=10)
+        cache.set('a', self.user, None)
+
+        monotonic.return_value = 109
+        self.assertIsNotNone(cache.get('a'))
+        monotonic.return_value = 110
+        self.assertIsNone(cache.get('a'))
+
+    def test_delete_user(self):
+        """Tests dropping every token of a user."""
+        cache = TokenCache()
+        cache.set('a', self.user, None)
+        cache.set('b', self.user, None)
+        cache.delete_user(self.user.pk)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+    @override_settings(CACHES={
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    })
+    def test_shared_cache_invalidation(self):
+        """Tests that deleting from another process' cache is seen."""
+        cache = TokenCache(shared_cache='shared')
+        other = TokenCache(shared_cache='shared')
+        cache.set('a', self.user, None)
+        other.delete('a')
+
+        self.assertIsNone(cache.get('a'))
+
+
+@override_settings(TOKEN_AUTH_CACHE={'ENABLED': True, 'ALLOW_LOCAL': True})
+class CachedTokenAuthenticationTest(TestCase):
+    """Tests authenticating requests with cached tokens."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123',
+            name='Test User'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Tests that the token is only looked up on the first request."""
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_rejected(self):
+        """Tests that a deleted token stops authenticating at once."""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Tests that a deactivated user stops authenticating at once."""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user_reloaded(self):
+        """Tests that a user updated through the API is reloaded."""
+        self.client.patch(ME_URL, {'name': 'new name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+
+class TokenCacheBackendTest(TestCase):
+    """Tests which token caches are refused."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    @override_settings(TOKEN_AUTH_CACHE={'ENABLED': True})
+    def test_local_cache_refused(self):
+        """Tests a cache local to the process is not used and reported."""
+        errors = checks.check_token_cache(None)
+
+        self.assertTrue(authentication.is_refused())
+        self.assertEqual([error.id for error in errors], ['core.E003'])
+        self.client.get(ME_URL)
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(
+        TOKEN_AUTH_CACHE={'ENABLED': True, 'SHARED_CACHE': 'shared'},
+        CACHES={'shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+    )
+    def test_local_shared_cache_refused(self):
+        """Tests a shared cache alias local to the process is refused."""
+        self.assertTrue(authentication.is_refused())
+
+    @override_settings(
+        TOKEN_AUTH_CACHE={'ENABLED': True, 'SHARED_CACHE': 'shared'},
+        CACHES={'shared': {
+            'BACKEND': 'django.core.cache.backends.memcached.'
+                       'PyLibMCCache',
+            'LOCATION': '127.0.0.1:11211',
+        }}
+    )
+    def test_shared_cache_enabled(self):
+        """Tests a cache shared between processes is used."""
+        self.assertTrue(authentication.is_enabled())
+        self.assertEqual(checks.check_token_cache(None), [])
+
+    @override_settings(TOKEN_AUTH_CACHE={'ALLOW_LOCAL': True})
+    def test_disabled_by_default(self):
+        """Tests tokens are looked up every time unless enabled."""
+        self.assertFalse(authentication.is_enabled())
+        self.assertEqual(checks.check_token_cache(None), [])
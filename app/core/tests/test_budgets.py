@@ -0,0 +1,156 @@
+from django.test import TestCase
+from django.urls import get_resolver, reverse
+from rest_framework import status
+
+from core import seeding
+from core.models import Ingredient, Recipe, Tag
+from core.tests.budgets import BUDGETS, DATA_SIZE, Budget, BudgetAPIClient
+
+
+NAMESPACES = ('user', 'recipe')
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class TimedBudgetAPIClient(BudgetAPIClient):
+    """Budget API client checking wall time too."""
+    check_time = True
+
+
+def detail_url(recipe_id):
+    """Returns the URL of a recipe."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class BudgetTest(TestCase):
+    """Tests the query and latency budgets of the API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seeding.seed_recipes('budget@test.com', DATA_SIZE)
+        cls.user.set_password('testpass')
+        cls.user.save()
+        cls.tag_ids = list(Tag.objects.filter(user=cls.user).order_by(
+            'id'
+        ).values_list('id', flat=True)[:3])
+        cls.ingredient_ids = list(Ingredient.objects.filter(
+            user=cls.user
+        ).order_by('id').values_list('id', flat=True)[:3])
+        cls.recipe = Recipe.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        self.client = TimedBudgetAPIClient()
+        self.client.force_authenticate(self.user)
+
+    def recipe_payload(self, title):
+        """Returns the payload of a new recipe."""
+        return {'title': title, 'time_minutes': 10, 'price': '5.00',
+                'tags': self.tag_ids, 'ingredients': self.ingredient_ids}
+
+    def test_every_route_has_budget(self):
+        """Tests that every route of the API has a budget."""
+        routes = {route for _method, route in BUDGETS}
+        resolver = get_resolver()
+        for namespace in NAMESPACES:
+            _prefix, sub_resolver = resolver.namespace_dict[namespace]
+            for name in sub_resolver.reverse_dict:
+                if isinstance(name, str):
+                    self.assertIn(f'{namespace}:{name}', routes)
+
+    def test_reads_within_budget(self):
+        """Tests reading tags, ingredients and recipes at full size."""
+        ids = ','.join(str(pk) for pk in self.tag_ids)
+        for url in (
+            reverse('recipe:api-root'),
+            reverse('recipe:tag-list'),
+            reverse('recipe:tag-list') + '?assigned_only=1',
+            reverse('recipe:ingredient-list') + '?ordering=usage',
+            RECIPES_URL,
+            f'{RECIPES_URL}?tags={ids}',
+            f'{RECIPES_URL}?tags={ids}&match=all',
+            f'{RECIPES_URL}?search=recipe',
+            reverse('recipe:recipe-export'),
+            reverse('recipe:recipe-export') + '?type=csv',
+            detail_url(self.recipe.id),
+            reverse('user:me'),
+        ):
+            with self.subTest(url=url):
+                res = self.client.get(url)
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_writes_within_budget(self):
+        """Tests creating, updating and deleting at full size."""
+        url = detail_url(self.recipe.id)
+        for method, url, payload in (
+            ('post', RECIPES_URL, self.recipe_payload('new')),
+            ('post', reverse('recipe:recipe-bulk'),
+             [self.recipe_payload(f'bulk {i}') for i in range(10)]),
+            ('put', url, self.recipe_payload('updated')),
+            ('patch', url, {'tags': self.tag_ids[:1]}),
+            ('delete', url, None),
+            ('post', reverse('recipe:tag-list'), {'name': 'new'}),
+            ('post', reverse('recipe:tag-bulk'),
+             {'names': [f'bulk {i}' for i in range(10)]}),
+            ('post', reverse('recipe:ingredient-list'), {'name': 'new'}),
+            ('post', reverse('recipe:ingredient-bulk'),
+             {'names': [f'bulk {i}' for i in range(10)]}),
+            ('put', reverse('user:me'),
+             {'email': 'budget@test.com', 'password': 'newpass',
+              'name': 'name'}),
+            ('patch', reverse('user:me'), {'name': 'new name'}),
+        ):
+            with self.subTest(method=method, url=url):
+                res = getattr(self.client, method)(url, payload,
+                                                   format='json')
+
+                self.assertLess(res.status_code, 300)
+
+    def test_token_within_budget(self):
+        """Tests creating a token for a user with many recipes."""
+        res = TimedBudgetAPIClient().post(reverse('user:token'), {
+            'email': 'budget@test.com',
+            'password': 'testpass',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_over_budget_lists_queries(self):
+        """Tests that a request over its budget fails listing its SQL."""
+        self.client.budgets = {
+            ('GET', 'recipe:recipe-list'): Budget(queries=1, rows=10,
+                                                  seconds=60),
+        }
+
+        with self.assertRaises(AssertionError) as context:
+            self.client.get(RECIPES_URL)
+
+        message = str(context.exception)
+        self.assertIn('recipe:recipe-list', message)
+        self.assertIn('queries (budget 1)', message)
+        self.assertIn('rows (budget 10)', message)
+        self.assertIn('core_recipe', message)
+        self.assertIn(f'= {self.user.id}', message)
+
+    def test_over_time_budget(self):
+        """Tests that wall time is only checked when asked for."""
+        budgets = {
+            ('GET', 'recipe:recipe-list'): Budget(queries=10, rows=1000,
+                                                  seconds=0),
+        }
+        client = BudgetAPIClient()
+        client.force_authenticate(self.user)
+        client.budgets = self.client.budgets = budgets
+
+        res = client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        with self.assertRaisesRegex(AssertionError, r' s \(budget 0\.000 s\)'):
+            self.client.get(RECIPES_URL)
+
+    def test_unbudgeted_route_not_checked(self):
+        """Tests that requests to routes without a budget pass."""
+        self.client.budgets = {}
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -1,22 +1,337 @@
+import json
+import os
+import re
+import tempfile
+from io import StringIO
+from unittest import skipIf
 from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.db.utils import OperationalError
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from core import health, usage
+from core.models import Recipe, Tag, Ingredient, CollectionVersion
 
 
 class ComandTest(TestCase):
 
     def test_wait_for_db_ready(self):
         """Tests waiting for db when db is available."""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        with patch('core.health.check_database') as cd:
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Tests waiting for db."""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        with patch('core.health.check_database') as cd:
+            cd.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 6)
+            self.assertEqual(ts.call_count, 5)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backoff(self, ts):
+        """Tests that the delays between attempts grow up to the maximum."""
+        with patch('core.health.check_database') as cd, \
+                patch('random.uniform', side_effect=lambda low, high: high):
+            cd.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', '--initial-delay=1', '--max-delay=4',
+                         stdout=StringIO())
+
+        delays = [call[0][0] for call in ts.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 4, 4])
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Tests that waiting for db fails once the timeout is reached."""
+        with patch('core.health.check_database') as cd:
+            cd.side_effect = OperationalError('refused')
+            with self.assertRaisesMessage(CommandError, 'refused'):
+                call_command('wait_for_db', '--timeout=0', stdout=StringIO())
+            self.assertEqual(cd.call_count, 1)
+        ts.assert_not_called()
+
+    def test_check_database(self):
+        """Tests probing the database with a query."""
+        with CaptureQueriesContext(connection) as queries:
+            health.check_database()
+
+        self.assertEqual(queries[0]['sql'], 'SELECT 1')
+
+    def test_explain_queries(self):
+        """Tests explaining the queries of every endpoint."""
+        user = get_user_model().objects.create_user('test@test.com', 'x')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='recipe',
+            time_minutes=1,
+            price=1.00
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='tag'))
+        out = StringIO()
+
+        call_command('explain_queries', stdout=out)
+
+        self.assertIn('recipe-list', out.getvalue())
+        self.assertIn('tag-list?assigned_only=1', out.getvalue())
+
+    def test_explain_queries_no_user(self):
+        """Tests that explaining queries requires seeded data."""
+        with self.assertRaises(CommandError):
+            call_command('explain_queries', stdout=StringIO())
+
+    def test_benchmark_serializers(self):
+        """Tests comparing the serialization paths on discarded data."""
+        out = StringIO()
+
+        call_command('benchmark_serializers', sizes=[5, 10], repeat=1,
+                     stdout=out)
+
+        self.assertIn('10 recipes', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_filters(self):
+        """Tests the subqueries return each matching recipe once."""
+        out = StringIO()
+
+        call_command('benchmark_filters', recipes=20, tags_per_recipe=4,
+                     filter_tags=2, repeat=1, stdout=out)
+
+        subquery = [line for line in out.getvalue().splitlines()
+                    if line.startswith('subquery')]
+        self.assertEqual(len(subquery), 2)
+        for line in subquery:
+            rows, recipes = re.findall(r'(\d+) (?:rows|recipes)', line)
+            self.assertEqual(rows, recipes)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_api(self):
+        """Tests benchmarking routes and writing the results as JSON."""
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+
+            call_command('benchmark_api', '--current-db', recipes=5,
+                         requests=3, warmup=0, transports=['client'],
+                         routes=['user:me', 'recipe:recipe-detail'],
+                         output=output, stdout=out)
+
+            with open(output) as file:
+                report = json.load(file)
+
+        self.assertNotIn('No scenario', out.getvalue())
+        results = {(result['method'], result['name']): result
+                   for result in report['results']}
+        self.assertEqual(set(results), {
+            ('GET', 'user:me'), ('PATCH', 'user:me'),
+            ('GET', 'recipe:recipe-detail'),
+            ('PATCH', 'recipe:recipe-detail'),
+        })
+        detail = results['GET', 'recipe:recipe-detail']
+        self.assertEqual(detail['statuses'], [200])
+        self.assertEqual(detail['requests'], 3)
+        self.assertGreater(detail['queries'], 0)
+        self.assertLessEqual(detail['latency']['p50'],
+                             detail['latency']['p99'])
+        self.assertGreater(detail['peak_memory'], 0)
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(report['options']['cached'])
+
+    def test_benchmark_api_bypasses_caches(self):
+        """Tests that the response and token caches are bypassed unless \
+            asked for, so that repeated requests run their queries."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+
+            call_command('benchmark_api', '--current-db', recipes=5,
+                         requests=3, warmup=1, transports=['client'],
+                         routes=['recipe:recipe-list'], output=output,
+                         stdout=StringIO())
+
+            with open(output) as file:
+                report = json.load(file)
+
+        result = next(result for result in report['results']
+                      if result['name'] == 'recipe:recipe-list' and
+                      result['method'] == 'GET')
+        self.assertGreater(result['queries'], 1)
+
+
+class SeedDataCommandTest(TestCase):
+
+    def _seed(self, **options):
+        """Runs the command with small sizes."""
+        sizes = {'users': 2, 'recipes': 30, 'tags': 10, 'ingredients': 10,
+                 'tags_per_recipe': 3, 'ingredients_per_recipe': 3}
+        sizes.update(options)
+        out = StringIO()
+        call_command('seed_data', stdout=out, **sizes)
+        return out.getvalue()
+
+    def _links(self):
+        """Returns the links of the seeded recipes to tags, by name."""
+        return sorted(Recipe.tags.through.objects.values_list(
+            'recipe__user__email', 'recipe__title', 'tag__name'
+        ))
+
+    def test_seed_data(self):
+        """Tests generating users with their data and counts."""
+        out = self._seed()
+
+        self.assertIn('Created 2 users, 60 recipes', out)
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertEqual(Tag.objects.count(), 20)
+        self.assertEqual(Recipe.objects.count(), 60)
+        self.assertTrue(Recipe.tags.through.objects.exists())
+        self.assertFalse(usage.drifted('tags').exists())
+        self.assertFalse(usage.drifted('ingredients').exists())
+        self.assertEqual(CollectionVersion.objects.count(), 2)
+
+    def test_seed_data_fan_out(self):
+        """Tests that recipes have as many tags as asked on average."""
+        self._seed(users=1, recipes=1000, tags=20, tags_per_recipe=3)
+
+        links = Recipe.tags.through.objects.count()
+
+        self.assertAlmostEqual(links / 1000, 3, delta=0.2)
+
+    def test_seed_data_deterministic(self):
+        """Tests that the same seed generates the same data."""
+        self._seed()
+        links = self._links()
+        get_user_model().objects.all().delete()
+
+        self._seed()
+
+        self.assertEqual(self._links(), links)
+        get_user_model().objects.all().delete()
+        self._seed(seed=1)
+        self.assertNotEqual(self._links(), links)
+
+    def test_seed_data_skewed(self):
+        """Tests that the most popular tag is linked the most."""
+        self._seed(users=1, recipes=200, skew=2)
+
+        counts = dict(Tag.objects.values_list('name', 'recipe_count'))
+        self.assertEqual(max(counts, key=counts.get), 'tag 0')
+        self.assertGreater(counts['tag 0'], counts['tag 9'] * 3)
+
+    def test_seed_data_resumes(self):
+        """Tests that existing users are skipped."""
+        self._seed(users=1)
+
+        out = self._seed(users=2)
+
+        self.assertIn('Created 1 users, 30 recipes', out)
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+
+class ImportRecipesCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _write(self, name, content):
+        """Writes an input file and returns its path."""
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def _ndjson(self, name, records):
+        """Writes records to an NDJSON file and returns its path."""
+        return self._write(
+            name,
+            ''.join(json.dumps(record) + '\n' for record in records)
+        )
+
+    def test_import_ndjson(self):
+        """Tests importing users, tags and recipes from NDJSON."""
+        existing = get_user_model().objects.create_user('old@test.com', 'x')
+        Tag.objects.create(user=existing, name='Vegan')
+        path = self._ndjson('data.ndjson', [
+            {'type': 'user', 'email': 'new@test.com', 'name': 'New'},
+            {'type': 'tag', 'user': 'old@test.com', 'name': 'Quick'},
+            {'type': 'recipe', 'user': 'old@test.com', 'title': 'Soup',
+             'time_minutes': 10, 'price': '4.50',
+             'tags': ['vegan', 'Hot'], 'ingredients': ['Leek', 'leek']},
+            {'user': 'new@test.com', 'title': 'Cake', 'time_minutes': 60,
+             'price': 8},
+            {'type': 'recipe', 'user': 'nobody@test.com', 'title': 'Lost',
+             'time_minutes': 1, 'price': 1},
+            {'type': 'recipe', 'user': 'old@test.com', 'title': 'Bad',
+             'time_minutes': 'soon', 'price': 1},
+        ])
+        out = StringIO()
+
+        call_command('import_recipes', path, batch_size=4, stdout=out,
+                     stderr=StringIO())
+
+        new = get_user_model().objects.get(email='new@test.com')
+        self.assertFalse(new.has_usable_password())
+        self.assertTrue(CollectionVersion.objects.filter(user=new).exists())
+        soup = Recipe.objects.get(title='Soup')
+        self.assertEqual(
+            sorted(soup.tags.values_list('name', flat=True)),
+            ['Hot', 'Vegan']
+        )
+        self.assertEqual(soup.ingredients.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=existing).count(), 3)
+        self.assertEqual(Recipe.objects.get(title='Cake').user, new)
+        self.assertIn('Imported 6 records', out.getvalue())
+        self.assertIn('2 errors', out.getvalue())
+
+    def test_import_csv(self):
+        """Tests importing recipes exported as CSV for a given user."""
+        user = get_user_model().objects.create_user('test@test.com', 'x')
+        path = self._write(
+            'data.csv',
+            'id,title,time_minutes,price,link,tags,ingredients\n'
+            '7,"Soup, hot",10,4.50,,Vegan;Hot,Leek\n'
+        )
+
+        call_command('import_recipes', path, user='test@test.com',
+                     stdout=StringIO())
+
+        recipe = Recipe.objects.get(user=user)
+        self.assertEqual(recipe.title, 'Soup, hot')
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', flat=True)),
+            ['Leek']
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        """Tests an import skips the records of its checkpoint."""
+        get_user_model().objects.create_user('test@test.com', 'x')
+        path = self._ndjson('data.ndjson', [
+            {'user': 'test@test.com', 'title': f'recipe {i}',
+             'time_minutes': 1, 'price': 1}
+            for i in range(5)
+        ])
+        checkpoint = self._write('checkpoint.json',
+                                 json.dumps({path: 3}))
+
+        call_command('import_recipes', path, checkpoint=checkpoint,
+                     batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list('title',
+                                                           flat=True)),
+            ['recipe 3', 'recipe 4']
+        )
+        with open(checkpoint) as file:
+            self.assertEqual(json.load(file), {path: 5})
+
+    @skipIf(connection.vendor == 'postgresql', 'COPY is supported')
+    def test_import_copy_requires_postgresql(self):
+        """Tests COPY is refused on other databases."""
+        path = self._ndjson('data.ndjson', [])
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, copy=True)
@@ -0,0 +1,136 @@
+import threading
+from unittest.mock import patch
+from django.test import SimpleTestCase
+
+from core.db import pool
+
+
+class FakeConnection:
+    """Stands for a database connection."""
+
+    def __init__(self):
+        self.closed = False
+        self.usable = True
+
+    def close(self):
+        self.closed = True
+
+
+def create_pool(**kwargs):
+    """Creates a pool of fake connections."""
+    options = {
+        'reset': lambda connection: not connection.closed,
+        'max_size': 2,
+        'timeout': 0.05,
+    }
+    options.update(kwargs)
+    return pool.ConnectionPool(
+        FakeConnection,
+        lambda connection: connection.close(),
+        **options
+    )
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def test_reuse_released_connection(self):
+        """Tests that a released connection is handed out again."""
+        connections = create_pool()
+
+        first = connections.acquire()
+        connections.release(first)
+        second = connections.acquire()
+
+        self.assertIs(first, second)
+        stats = connections.stats()
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_exhausted_pool_times_out(self):
+        """Tests that acquiring from a full pool fails after the timeout."""
+        connections = create_pool(max_size=1)
+        connections.acquire()
+
+        with self.assertRaises(pool.PoolTimeout):
+            connections.acquire()
+
+        stats = connections.stats()
+        self.assertEqual(stats['exhausted'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_wait_for_released_connection(self):
+        """Tests that acquiring from a full pool waits for a release."""
+        connections = create_pool(max_size=1, timeout=5)
+        first = connections.acquire()
+        threading.Timer(0.05, connections.release, [first]).start()
+
+        second = connections.acquire()
+
+        self.assertIs(first, second)
+        stats = connections.stats()
+        self.assertEqual(stats['exhausted'], 1)
+        self.assertEqual(stats['timeouts'], 0)
+        self.assertGreater(stats['max_checkout_time'], 0)
+
+    def test_broken_connection_discarded(self):
+        """Tests that a connection failing its reset is closed for good."""
+        connections = create_pool(max_size=1)
+        first = connections.acquire()
+        first.closed = True
+
+        connections.release(first)
+        second = connections.acquire()
+
+        self.assertIsNot(first, second)
+        self.assertEqual(connections.stats()['closed'], 1)
+
+    def test_failed_check_replaces_connection(self):
+        """Tests that an idle connection failing its check is replaced."""
+        connections = create_pool(check=lambda connection: connection.usable)
+        first = connections.acquire()
+        connections.release(first)
+        first.usable = False
+
+        second = connections.acquire()
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(connections.stats()['size'], 1)
+
+    def test_idle_connections_expire(self):
+        """Tests that connections idle for too long are closed."""
+        connections = create_pool(max_idle=10)
+        first = connections.acquire()
+        with patch('time.monotonic', return_value=0):
+            connections.release(first)
+
+        with patch('time.monotonic', return_value=20):
+            second = connections.acquire()
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    def test_old_connections_not_reused(self):
+        """Tests that connections past their lifetime are closed when \
+            released."""
+        connections = create_pool(max_lifetime=10)
+        with patch('time.monotonic', return_value=0):
+            first = connections.acquire()
+        with patch('time.monotonic', return_value=20):
+            connections.release(first)
+
+        self.assertTrue(first.closed)
+        self.assertEqual(connections.stats()['size'], 0)
+
+    def test_failed_connect_frees_slot(self):
+        """Tests that a connection that cannot be opened frees its slot."""
+        connections = pool.ConnectionPool(
+            lambda: 1 / 0, lambda connection: None, max_size=1
+        )
+
+        with self.assertRaises(ZeroDivisionError):
+            connections.acquire()
+
+        self.assertEqual(connections.stats()['size'], 0)
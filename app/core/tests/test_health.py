@@ -0,0 +1,100 @@
+import threading
+from unittest.mock import patch
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import health
+
+
+HEALTHZ_URL = reverse('core:healthz')
+READYZ_URL = reverse('core:readyz')
+
+
+class HealthAPITest(TestCase):
+    """Tests the health check endpoints."""
+
+    def setUp(self):
+        self.client = APIClient()
+        health.reset_readiness()
+        self.addCleanup(health.reset_readiness)
+
+    def test_healthz(self):
+        """Tests that liveness is reported without querying."""
+        with self.assertNumQueries(0):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'status': 'ok'})
+
+    def test_readyz(self):
+        """Tests that readiness is reported once the database answers."""
+        with self.assertNumQueries(1):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'status': 'ok'})
+
+    @patch('core.health.check_database',
+           side_effect=OperationalError('refused'))
+    def test_readyz_unavailable(self, cd):
+        """Tests that readiness fails while the database is down."""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res.data['reason'], 'refused')
+
+    @override_settings(HEALTH_CHECK={'CACHE_TIMEOUT': 60})
+    def test_readyz_cached(self):
+        """Tests that the database is probed once within the timeout."""
+        with patch('core.health.check_database') as cd:
+            self.client.get(READYZ_URL)
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(cd.call_count, 1)
+
+    @override_settings(HEALTH_CHECK={'CACHE_TIMEOUT': 0})
+    def test_readyz_not_cached_after_timeout(self):
+        """Tests that the database is probed again after the timeout."""
+        with patch('core.health.check_database') as cd:
+            cd.side_effect = [OperationalError('refused'), None]
+            self.client.get(READYZ_URL)
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(cd.call_count, 2)
+
+    @override_settings(HEALTH_CHECK={'CACHE_TIMEOUT': 0})
+    def test_readyz_probed_by_one_caller(self):
+        """Tests that while the database is probed, other callers get the \
+            previous result at once instead of probing too."""
+        started = threading.Event()
+        release = threading.Event()
+        probed = []
+
+        def slow_check(alias):
+            started.set()
+            release.wait(5)
+            raise OperationalError('refused')
+
+        with patch('core.health.check_database') as cd:
+            health.readiness()
+            cd.side_effect = slow_check
+            prober = threading.Thread(
+                target=lambda: probed.append(health.readiness())
+            )
+            prober.start()
+            started.wait(5)
+
+            result = health.readiness()
+
+            release.set()
+            prober.join(5)
+
+        self.assertEqual(result, (True, ''))
+        self.assertEqual(cd.call_count, 2)
+        self.assertEqual(probed, [(False, 'refused')])
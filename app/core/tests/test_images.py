@@ -0,0 +1,121 @@
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from PIL import Image
+from core import images
+
+
+def exif_orientation(value):
+    """Returns raw EXIF data holding only an orientation tag."""
+    return (
+        b'Exif\x00\x00II*\x00\x08\x00\x00\x00\x01\x00'
+        b'\x12\x01\x03\x00\x01\x00\x00\x00' +
+        bytes([value]) + b'\x00\x00\x00\x00\x00\x00\x00'
+    )
+
+
+class FieldFile:
+    """Minimal stand-in for the file of an image field."""
+
+    def __init__(self, name):
+        self.name = name
+        self.storage = default_storage
+
+    def __bool__(self):
+        return bool(self.name)
+
+
+class RenditionTests(TestCase):
+
+    def _store(self, size, **save_options):
+        """Stores a JPEG image of a given size and returns its file."""
+        content = BytesIO()
+        Image.new('RGB', size, 'red').save(
+            content, format='JPEG', **save_options
+        )
+        name = default_storage.save(
+            'uploads/recipe/test.jpg',
+            ContentFile(content.getvalue())
+        )
+        self.addCleanup(default_storage.delete, name)
+        self.addCleanup(images.delete_renditions, default_storage, name)
+
+        return FieldFile(name)
+
+    def test_rendition_path(self):
+        """Tests renditions are stored next to the original."""
+        path = images.rendition_path('uploads/recipe/abc.png', 'thumb')
+
+        self.assertEqual(path, 'uploads/recipe/abc_thumb.jpg')
+
+    def test_generate_renditions(self):
+        """Tests generating resized renditions of an image."""
+        image = self._store((2000, 1000))
+
+        paths = images.generate_renditions(image)
+
+        sizes = {
+            rendition: Image.open(default_storage.path(path)).size
+            for rendition, path in paths.items()
+        }
+        self.assertEqual(sizes, {
+            'large': (1200, 600),
+            'medium': (600, 300),
+            'thumb': (150, 75),
+        })
+
+    def test_renditions_upright_without_metadata(self):
+        """Tests EXIF orientation is applied and metadata stripped."""
+        image = self._store((200, 100), exif=exif_orientation(6))
+
+        paths = images.generate_renditions(image)
+
+        rendition = Image.open(default_storage.path(paths['thumb']))
+        self.assertEqual(rendition.size, (75, 150))
+        self.assertNotIn('exif', rendition.info)
+
+    def test_rendition_urls(self):
+        """Tests the URLs of the renditions of an image."""
+        urls = images.rendition_urls(FieldFile('uploads/recipe/abc.jpg'))
+
+        self.assertEqual(list(urls), ['thumb', 'medium', 'large'])
+        self.assertTrue(urls['thumb'].endswith('uploads/recipe/abc_thumb.jpg'))
+        self.assertIsNone(images.rendition_urls(FieldFile('')))
+
+
+class StripMetadataTests(TestCase):
+
+    def _strip(self, image_format, name, **save_options):
+        """Encodes an image and returns it stripped, decoded, with the \
+            name it was given."""
+        content = BytesIO()
+        Image.new('RGB', (20, 10), 'red').save(
+            content, format=image_format, **save_options
+        )
+        content.seek(0)
+        stripped = images.strip_metadata(content, name)
+        return Image.open(BytesIO(stripped.read())), stripped.name
+
+    def test_original_upright_without_metadata(self):
+        """Tests the original is re-encoded upright without its EXIF data."""
+        image, name = self._strip('JPEG', 'a.jpg', exif=exif_orientation(6))
+
+        self.assertEqual(name, 'a.jpg')
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (10, 20))
+        self.assertNotIn('exif', image.info)
+
+    def test_original_format_kept(self):
+        """Tests originals in common formats keep their format."""
+        image, name = self._strip('PNG', 'a.png')
+
+        self.assertEqual(name, 'a.png')
+        self.assertEqual(image.format, 'PNG')
+
+    def test_other_formats_stored_as_jpeg(self):
+        """Tests originals in other formats are stored as JPEG."""
+        image, name = self._strip('BMP', 'a.bmp')
+
+        self.assertEqual(name, 'a.jpg')
+        self.assertEqual(image.format, 'JPEG')
@@ -0,0 +1,263 @@
+import glob
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import checks, metrics
+from core.db import pool
+from core.models import Recipe
+
+
+METRICS_URL = reverse('core:metrics')
+TAGS_URL = reverse('recipe:tag-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RegistryTest(SimpleTestCase):
+
+    def test_render_histogram(self):
+        """Tests that histograms are rendered with cumulative buckets."""
+        registry = metrics.Registry()
+        labels = (('route', 'recipe:tag-list'), ('method', 'GET'))
+        registry.observe('http_request_duration_seconds', labels, 0.003)
+        registry.observe('http_request_duration_seconds', labels, 0.2)
+        registry.observe('http_request_duration_seconds', labels, 20)
+
+        text = metrics.render(registry.snapshot())
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        prefix = 'http_request_duration_seconds_bucket{' \
+                 'route="recipe:tag-list",method="GET",'
+        self.assertIn(prefix + 'le="0.005"} 1\n', text)
+        self.assertIn(prefix + 'le="0.25"} 2\n', text)
+        self.assertIn(prefix + 'le="+Inf"} 3\n', text)
+        self.assertIn('http_request_duration_seconds_count{'
+                      'route="recipe:tag-list",method="GET"} 3\n', text)
+
+    def test_threads_summed(self):
+        """Tests that the values recorded by each thread are summed, \
+            including those of threads that ended."""
+        registry = metrics.Registry()
+        labels = (('route', 'x'), )
+
+        def work():
+            for _ in range(100):
+                registry.inc('db_queries_total', labels)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        registry.inc('db_queries_total', labels)
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot.counters['db_queries_total', labels], 401)
+
+    def test_processes_summed(self):
+        """Tests that collecting sums the values written by each process."""
+        with tempfile.TemporaryDirectory() as directory:
+            first = metrics.Registry(directory)
+            second = metrics.Registry(directory)
+            labels = (('route', 'x'), )
+            first.inc('db_queries_total', labels, 2)
+            first.observe('http_response_size_bytes', labels, 500)
+            second.inc('db_queries_total', labels, 3)
+            second.observe('http_response_size_bytes', labels, 50)
+            second.flush()
+
+            collected = first.collect()
+
+        self.assertEqual(collected.counters['db_queries_total', labels], 5)
+        self.assertEqual(
+            collected.histograms['http_response_size_bytes', labels][:2],
+            [1, 1]
+        )
+
+    def test_flushed_periodically(self):
+        """Tests that the multiprocess file is written without requests."""
+        with tempfile.TemporaryDirectory() as directory:
+            registry = metrics.Registry(directory, flush_interval=0.01)
+            registry.inc('db_queries_total', (('route', 'x'), ), 2)
+            registry.start_flusher()
+            try:
+                for _attempt in range(100):
+                    if glob.glob(os.path.join(directory, '*.json')):
+                        break
+                    time.sleep(0.01)
+            finally:
+                registry.stop_flusher()
+
+            collected = metrics.Registry(directory).collect()
+
+        self.assertEqual(
+            collected.counters['db_queries_total', (('route', 'x'), )], 2
+        )
+
+    def test_gauges_dropped_at_exit(self):
+        """Tests that an exiting process keeps its counters in the \
+            multiprocess directory, but not its gauges."""
+        def collector():
+            shard = metrics._Shard()
+            shard.gauges['db_pool_max_connections', ()] = 3
+            return shard
+
+        with tempfile.TemporaryDirectory() as directory:
+            registry = metrics.Registry(directory, collectors=(collector, ))
+            registry.inc('db_queries_total', (), 2)
+            registry.flush()
+            running = metrics.Registry(directory).collect()
+            registry.flush(final=True)
+            exited = metrics.Registry(directory).collect()
+
+        self.assertEqual(running.gauges['db_pool_max_connections', ()], 3)
+        self.assertEqual(exited.gauges, {})
+        self.assertEqual(exited.counters['db_queries_total', ()], 2)
+
+    @override_settings(METRICS={'WORKERS': 4})
+    def test_multiprocess_dir_required_for_workers(self):
+        """Tests that several workers need a multiprocess directory."""
+        errors = checks.check_metrics(None)
+
+        self.assertEqual([error.id for error in errors], ['core.E002'])
+
+    @override_settings(METRICS={'WORKERS': 4, 'MULTIPROCESS_DIR': '/tmp'})
+    def test_multiprocess_dir_given_for_workers(self):
+        """Tests that several workers with a directory pass the check."""
+        self.assertEqual(checks.check_metrics(None), [])
+
+    def test_escape_label_values(self):
+        """Tests that label values are escaped."""
+        registry = metrics.Registry()
+        registry.inc('db_queries_total', (('route', 'a"b\\c\n'), ))
+
+        text = metrics.render(registry.snapshot())
+
+        self.assertIn('db_queries_total{route="a\\"b\\\\c\\n"} 1\n', text)
+
+
+class MetricsMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_metrics_by_route(self):
+        """Tests that requests are measured by resolved route."""
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], metrics.CONTENT_TYPE)
+        text = res.content.decode()
+        self.assertIn('http_requests_total{route="recipe:tag-list",'
+                      'method="GET",status="200"} 2\n', text)
+        self.assertIn('http_response_size_bytes_count{'
+                      'route="recipe:tag-list",method="GET"} 2\n', text)
+        snapshot = metrics.REGISTRY.snapshot()
+        labels = (('route', 'recipe:tag-list'), ('method', 'GET'))
+        self.assertGreater(snapshot.counters['db_queries_total', labels], 0)
+        self.assertGreater(
+            snapshot.counters['db_query_duration_seconds_total', labels], 0
+        )
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_pool_stats_exported(self):
+        """Tests that the stats of connection pools are served."""
+        connections = pool.ConnectionPool(object, lambda connection: None,
+                                          max_size=3, name='default:app')
+        connections.release(connections.acquire())
+        connections.acquire()
+
+        with patch.dict(pool._pools, {'key': connections}):
+            res = self.client.get(METRICS_URL,
+                                  HTTP_AUTHORIZATION='Bearer secret')
+
+        text = res.content.decode()
+        self.assertIn('# TYPE db_pool_connections gauge\n', text)
+        self.assertIn('db_pool_connections{pool="default:app",'
+                      'state="in_use"} 1\n', text)
+        self.assertIn('db_pool_connections{pool="default:app",'
+                      'state="idle"} 0\n', text)
+        self.assertIn('db_pool_max_connections{pool="default:app"} 3\n',
+                      text)
+        self.assertIn('db_pool_connections_opened_total{pool="default:app"} '
+                      '1\n', text)
+        self.assertIn('db_pool_checkouts_total{pool="default:app"} 2\n', text)
+
+    def test_metrics_forbidden_by_default(self):
+        """Tests that metrics are not served unless access is configured."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_metrics_wrong_token_forbidden(self):
+        """Tests that metrics are not served for a wrong token."""
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS={'ALLOWED_IPS': ['127.0.0.0/8']})
+    def test_metrics_allowed_network(self):
+        """Tests that metrics are served to allowed networks."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unmatched_route(self):
+        """Tests that requests to unknown paths share one route."""
+        self.client.get('/unknown/')
+
+        snapshot = metrics.REGISTRY.snapshot()
+        self.assertEqual(snapshot.counters[
+            'http_requests_total',
+            (('route', 'unmatched'), ('method', 'GET'), ('status', '404'))
+        ], 1)
+
+    def test_unknown_method_grouped(self):
+        """Tests that requests with made up methods share one label."""
+        self.client.generic('MADEUP', TAGS_URL)
+
+        snapshot = metrics.REGISTRY.snapshot()
+        self.assertEqual(snapshot.counters[
+            'http_requests_total',
+            (('route', 'recipe:tag-list'), ('method', 'other'),
+             ('status', '405'))
+        ], 1)
+
+    def test_streaming_response_measured(self):
+        """Tests that streaming responses are measured once sent."""
+        Recipe.objects.create(
+            user=self.user,
+            title='recipe',
+            time_minutes=1,
+            price=1.00
+        )
+
+        res = self.client.get(EXPORT_URL)
+        size = len(b''.join(res.streaming_content))
+
+        snapshot = metrics.REGISTRY.snapshot()
+        labels = (('route', 'recipe:recipe-export'), ('method', 'GET'))
+        self.assertEqual(
+            snapshot.histograms['http_response_size_bytes', labels][-1],
+            size
+        )
+        self.assertGreater(snapshot.counters['db_queries_total', labels], 0)
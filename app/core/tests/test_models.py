@@ -1,6 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
 from core import models
+from core.migrations._indexes import INDEXES
 from unittest.mock import patch
 
 
@@ -74,6 +76,37 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
+    def test_tag_names_unique_ignoring_case(self):
+        """Tests that a user cannot have tags differing only by case."""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='VEGAN')
+
+    def test_raw_sql_indexes_exist(self):
+        """Tests that the indexes created with raw SQL survive the \
+            migrations rebuilding their tables."""
+        with connection.cursor() as cursor:
+            for name, (table, _definition, _unique) in INDEXES.items():
+                constraints = connection.introspection.get_constraints(
+                    cursor, table
+                )
+                self.assertIn(name, constraints)
+
+    def test_get_or_create_names(self):
+        """Tests getting and creating ingredients by name."""
+        user = sample_user()
+        salt = models.Ingredient.objects.create(user=user, name='Salt')
+
+        ingredients = models.Ingredient.objects.get_or_create_names(
+            user,
+            ['sugar', 'SALT', 'Sugar']
+        )
+
+        self.assertEqual([i.name for i in ingredients], ['sugar', 'Salt'])
+        self.assertEqual(ingredients[1], salt)
+
     @patch('uuid.uuid4')
     def test_recipe_filename_uuid(self, mock_uuid):
         """Tests that image is saved at correct location."""
@@ -0,0 +1,170 @@
+import json
+import os
+import pstats
+import tempfile
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import profiling
+from core.models import Recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def profile_url(profile_id):
+    """Returns the URL of the summary of a profile."""
+    return reverse('core:profile', args=[profile_id])
+
+
+def download_url(profile_id):
+    """Returns the URL of the profiler output of a profile."""
+    return reverse('core:profile-download', args=[profile_id])
+
+
+class ProfilingTest(TestCase):
+    """Tests profiling requests on demand."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILING={
+            'ENABLED': True,
+            'DIRECTORY': directory.name,
+            'SAMPLE_INTERVAL': 0.0005,
+            'MAX_PROFILES': 2,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.staff = get_user_model().objects.create_superuser(
+            'staff@test.com',
+            'testpass'
+        )
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'testpass'
+        )
+        Recipe.objects.create(
+            user=self.staff,
+            title='recipe',
+            time_minutes=1,
+            price=1.00
+        )
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        """Authenticates the client with a token of a user."""
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_no_flag_not_profiled(self):
+        """Tests that requests without the flag are not profiled."""
+        self.authenticate(self.staff)
+
+        with patch('core.profiling.profile') as profile:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        profile.assert_not_called()
+        self.assertNotIn('X-Profile-Id', res)
+
+    def test_non_staff_not_profiled(self):
+        """Tests that the flag is ignored for users who are not staff."""
+        self.authenticate(self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='cprofile')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', res)
+
+    def test_cprofile(self):
+        """Tests profiling a request with cProfile."""
+        self.authenticate(self.staff)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='cprofile')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        profile_id = res['X-Profile-Id']
+        summary = self.client.get(profile_url(profile_id))
+        self.assertEqual(summary.status_code, status.HTTP_200_OK)
+        self.assertEqual(summary.data['mode'], 'cprofile')
+        self.assertEqual(summary.data['path'], RECIPES_URL)
+        self.assertTrue(summary.data['functions'])
+        self.assertGreater(summary.data['queries']['count'], 0)
+        self.assertIn('core_recipe', json.dumps(summary.data['queries']))
+
+        download = self.client.get(download_url(profile_id))
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        with tempfile.NamedTemporaryFile(suffix='.pstats') as file:
+            file.write(b''.join(download.streaming_content))
+            file.flush()
+            self.assertTrue(pstats.Stats(file.name).stats)
+
+    def test_sampling_profiler(self):
+        """Tests profiling a request with the sampling profiler."""
+        self.authenticate(self.staff)
+
+        res = self.client.get(RECIPES_URL, {'profile': 'sample'})
+
+        profile_id = res['X-Profile-Id']
+        download = self.client.get(download_url(profile_id))
+        speedscope = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(speedscope['profiles'][0]['type'], 'sampled')
+        self.assertEqual(len(speedscope['profiles'][0]['samples']),
+                         len(speedscope['profiles'][0]['weights']))
+
+    def test_old_profiles_deleted(self):
+        """Tests that only the newest profiles are kept."""
+        self.authenticate(self.staff)
+        profile_ids = []
+        for mtime in range(3):
+            profile_ids.append(self.client.get(
+                RECIPES_URL, HTTP_X_PROFILE='cprofile'
+            )['X-Profile-Id'])
+            path = profiling.summary_path(profile_ids[-1])
+            os.utime(path, (mtime, mtime))
+
+        self.assertIsNone(profiling.load_summary(profile_ids[0]))
+        self.assertFalse(os.path.exists(
+            profiling.artifact_path(profile_ids[0], 'cprofile')
+        ))
+        for profile_id in profile_ids[1:]:
+            self.assertIsNotNone(profiling.load_summary(profile_id))
+
+    def test_streaming_response_flagged(self):
+        """Tests that profiles of streaming responses say so."""
+        self.authenticate(self.staff)
+
+        res = self.client.get(reverse('recipe:recipe-export'),
+                              HTTP_X_PROFILE='cprofile')
+        b''.join(res.streaming_content)
+
+        summary = profiling.load_summary(res['X-Profile-Id'])
+        self.assertTrue(summary['streaming'])
+
+    def test_profiles_staff_only(self):
+        """Tests that only staff users can read profiles."""
+        self.authenticate(self.staff)
+        profile_id = self.client.get(
+            RECIPES_URL, HTTP_X_PROFILE='cprofile'
+        )['X-Profile-Id']
+        self.client = APIClient()
+        self.authenticate(self.user)
+
+        res = self.client.get(profile_url(profile_id))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_missing_profile(self):
+        """Tests that an unknown profile is not found."""
+        self.authenticate(self.staff)
+
+        res = self.client.get(download_url('0' * 32))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,115 @@
+from unittest.mock import Mock, patch
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from core import checks, response_cache
+
+
+@override_settings(RESPONSE_CACHE={
+    'ENABLED': True,
+    'ALLOW_LOCAL': True,
+    'LOCK_WAIT': 0.1,
+})
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_value_cached(self):
+        """Tests a value is computed once and then served from cache."""
+        compute = Mock(return_value={'a': 1})
+        key = response_cache.make_key(1, 'path')
+
+        response_cache.get_or_set(key, compute)
+        value = response_cache.get_or_set(key, compute)
+
+        self.assertEqual(value, {'a': 1})
+        compute.assert_called_once_with()
+
+    def test_none_not_cached(self):
+        """Tests a None value is not cached."""
+        compute = Mock(return_value=None)
+        key = response_cache.make_key(1, 'path')
+
+        response_cache.get_or_set(key, compute)
+        response_cache.get_or_set(key, compute)
+
+        self.assertEqual(compute.call_count, 2)
+
+    def test_invalidate_changes_keys(self):
+        """Tests invalidating changes the keys of a user only."""
+        key = response_cache.make_key(1, 'path')
+        other_key = response_cache.make_key(2, 'path')
+
+        response_cache.invalidate(1)
+
+        self.assertNotEqual(response_cache.make_key(1, 'path'), key)
+        self.assertEqual(response_cache.make_key(2, 'path'), other_key)
+
+    def test_waits_for_locked_key(self):
+        """Tests a caller waits for the value another caller computes."""
+        key = response_cache.make_key(1, 'path')
+        caches['default'].add(f'{key}:lock', 1)
+        compute = Mock(return_value='computed')
+
+        def cached_meanwhile(seconds):
+            caches['default'].set(key, (0, 'cached'))
+
+        with patch('core.response_cache.time.sleep', cached_meanwhile):
+            value = response_cache.get_or_set(key, compute)
+
+        self.assertEqual(value, 'cached')
+        compute.assert_not_called()
+
+    def test_computes_when_lock_not_released(self):
+        """Tests a caller stops waiting for a lock after a while."""
+        key = response_cache.make_key(1, 'path')
+        caches['default'].add(f'{key}:lock', 1)
+
+        value = response_cache.get_or_set(key, Mock(return_value='computed'))
+
+        self.assertEqual(value, 'computed')
+
+    def test_early_refresh_by_one_caller(self):
+        """Tests a value about to expire is refreshed by a single caller \
+            while others are served the current value."""
+        key = response_cache.make_key(1, 'path')
+        caches['default'].set(key, (0, 'current'))
+        caches['default'].add(f'{key}:lock', 1)
+
+        value = response_cache.get_or_set(key, Mock(return_value='new'))
+        self.assertEqual(value, 'current')
+
+        caches['default'].delete(f'{key}:lock')
+        value = response_cache.get_or_set(key, Mock(return_value='new'))
+        self.assertEqual(value, 'new')
+
+
+class ResponseCacheBackendTests(TestCase):
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True})
+    def test_local_cache_refused(self):
+        """Tests a cache local to the process is not used and reported."""
+        errors = checks.check_response_cache(None)
+
+        self.assertFalse(response_cache.is_enabled())
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(
+        RESPONSE_CACHE={'ENABLED': True},
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.'
+                       'PyLibMCCache',
+            'LOCATION': '127.0.0.1:11211',
+        }}
+    )
+    def test_shared_cache_enabled(self):
+        """Tests a cache shared between processes is used."""
+        self.assertTrue(response_cache.is_enabled())
+        self.assertEqual(checks.check_response_cache(None), [])
+
+    @override_settings(RESPONSE_CACHE={'ALLOW_LOCAL': True})
+    def test_disabled_by_default(self):
+        """Tests responses are not cached unless enabled."""
+        self.assertFalse(response_cache.is_enabled())
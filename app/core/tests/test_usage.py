@@ -0,0 +1,97 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import usage
+from core.models import Tag, Ingredient, Recipe
+
+
+class RecipeCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@test.com',
+                                                         'x')
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.other_tag = Tag.objects.create(user=self.user, name='Quick')
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title=f'recipe {i}',
+                                  time_minutes=5, price=1)
+            for i in range(3)
+        ]
+
+    def _counts(self):
+        """Returns the recipe counts of both tags."""
+        self.tag.refresh_from_db()
+        self.other_tag.refresh_from_db()
+        return self.tag.recipe_count, self.other_tag.recipe_count
+
+    def test_counts_follow_recipe_side(self):
+        """Tests adding, removing and clearing tags of a recipe."""
+        recipe = self.recipes[0]
+
+        recipe.tags.add(self.tag, self.other_tag)
+        recipe.tags.add(self.tag)
+        self.assertEqual(self._counts(), (1, 1))
+
+        recipe.tags.remove(self.tag, self.tag)
+        recipe.tags.remove(self.tag)
+        self.assertEqual(self._counts(), (0, 1))
+
+        recipe.tags.set([self.tag])
+        self.assertEqual(self._counts(), (1, 0))
+
+        recipe.tags.clear()
+        self.assertEqual(self._counts(), (0, 0))
+
+    def test_counts_follow_object_side(self):
+        """Tests adding, removing and clearing recipes of a tag."""
+        self.tag.recipe_set.add(*self.recipes)
+        self.assertEqual(self._counts(), (3, 0))
+
+        self.tag.recipe_set.remove(self.recipes[0])
+        self.assertEqual(self._counts(), (2, 0))
+
+        self.tag.recipe_set.clear()
+        self.assertEqual(self._counts(), (0, 0))
+
+    def test_counts_follow_recipe_deletion(self):
+        """Tests deleted recipes stop counting, one by one or in bulk."""
+        for recipe in self.recipes:
+            recipe.tags.add(self.tag)
+
+        self.recipes[0].delete()
+        self.assertEqual(self._counts(), (2, 0))
+
+        Recipe.objects.all().delete()
+        self.assertEqual(self._counts(), (0, 0))
+
+    def test_recount_repairs_drift(self):
+        """Tests drifted counts are found and repaired."""
+        self.recipes[0].tags.add(self.tag)
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        Tag.objects.filter(pk=self.tag.pk).update(recipe_count=7)
+        Ingredient.objects.filter(pk=ingredient.pk).update(recipe_count=-1)
+
+        self.assertEqual(usage.drifted('tags').count(), 1)
+
+        out = StringIO()
+        call_command('recount_usage', stdout=out)
+
+        self.assertIn('1 tags repaired', out.getvalue())
+        self.assertIn('1 ingredients repaired', out.getvalue())
+        self.assertEqual(self._counts(), (1, 0))
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 0)
+
+    def test_recount_dry_run(self):
+        """Tests a dry run leaves drifted counts alone."""
+        Tag.objects.filter(pk=self.tag.pk).update(recipe_count=7)
+
+        out = StringIO()
+        call_command('recount_usage', '--dry-run', user='test@test.com',
+                     stdout=out)
+
+        self.assertIn('1 tags drifted', out.getvalue())
+        self.assertEqual(self._counts(), (7, 0))
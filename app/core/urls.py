@@ -0,0 +1,15 @@
+from django.urls import path, re_path
+from core import views
+
+
+app_name = 'core'
+
+urlpatterns = [
+    path('healthz', views.HealthView.as_view(), name='healthz'),
+    path('readyz', views.ReadinessView.as_view(), name='readyz'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    re_path(r'^api/profiles/(?P<profile_id>[0-9a-f]{32})/$',
+            views.ProfileView.as_view(), name='profile'),
+    re_path(r'^api/profiles/(?P<profile_id>[0-9a-f]{32})/download/$',
+            views.ProfileDownloadView.as_view(), name='profile-download')
+]
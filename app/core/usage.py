@@ -0,0 +1,87 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Tag, Ingredient, Recipe
+
+
+# Models counting the recipes using them, by recipe relation.
+COUNTED_MODELS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def _through(relation):
+    """Returns the through model of a recipe relation, and the name of its \
+        column referring to the counted objects."""
+    field = Recipe._meta.get_field(relation)
+    return field.remote_field.through, field.m2m_reverse_name()
+
+
+def adjust(relation, deltas):
+    """Adds to the recipe counts of objects, given a mapping of object ids \
+        to the change of their count.
+
+    Counts are changed in place with one UPDATE per distinct change, so that
+    concurrent adjustments add up instead of overwriting one another.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+
+    model = COUNTED_MODELS[relation]
+    for delta, ids in by_delta.items():
+        model.objects.filter(id__in=ids).update(
+            recipe_count=F('recipe_count') + delta
+        )
+
+
+def links(relation, recipe_ids=None, object_ids=None):
+    """Returns how many of the given links between recipes and objects \
+        exist, by object id."""
+    through, column = _through(relation)
+    rows = through.objects.all()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    if object_ids is not None:
+        rows = rows.filter(**{f'{column}__in': object_ids})
+    return Counter(dict(
+        rows.order_by().values(column).annotate(
+            links=Count('*')
+        ).values_list(column, 'links')
+    ))
+
+
+def actual_count(relation):
+    """Returns an expression counting the links of each object in the \
+        through table of a recipe relation."""
+    through, column = _through(relation)
+    return Coalesce(Subquery(
+        through.objects.filter(**{column: OuterRef('pk')}).order_by().values(
+            column
+        ).annotate(links=Count('*')).values('links'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def drifted(relation, queryset=None):
+    """Returns the objects whose recipe count does not match their links \
+        in the through table."""
+    if queryset is None:
+        queryset = COUNTED_MODELS[relation].objects.all()
+    return queryset.annotate(
+        actual=actual_count(relation)
+    ).exclude(recipe_count=F('actual'))
+
+
+def recount(relation, queryset=None, batch_size=1000):
+    """Repairs the recipe counts that drifted from the links in the \
+        through table, a batch of objects per statement. Returns the number \
+        of objects repaired."""
+    ids = list(drifted(relation, queryset).values_list('id', flat=True))
+    model = COUNTED_MODELS[relation]
+    for start in range(0, len(ids), batch_size):
+        model.objects.filter(id__in=ids[start:start + batch_size]).update(
+            recipe_count=actual_count(relation)
+        )
+    return len(ids)
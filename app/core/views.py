@@ -0,0 +1,73 @@
+import os
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
+from django.views import View
+from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from core import health, metrics, profiling
+from core.authentication import CachedTokenAuthentication
+
+
+class HealthView(APIView):
+    """Reports that the process is up, without touching the database."""
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        return Response({'status': 'ok'})
+
+
+class ReadinessView(APIView):
+    """Reports whether the database can serve requests, answering 503 \
+        until it can."""
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        ready, reason = health.readiness()
+        if not ready:
+            return Response({'status': 'unavailable', 'reason': reason},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'status': 'ok'})
+
+
+class MetricsView(View):
+    """Exposes the request metrics of every process in the Prometheus \
+        text format, to scrapers bearing the metrics token or coming from \
+        an allowed address."""
+
+    def get(self, request):
+        if not metrics.is_authorized(request):
+            return HttpResponseForbidden()
+        return HttpResponse(
+            metrics.render(metrics.REGISTRY.collect()),
+            content_type=metrics.CONTENT_TYPE
+        )
+
+
+class ProfileView(APIView):
+    """Shows the summary of a stored request profile to staff users."""
+    authentication_classes = [CachedTokenAuthentication, ]
+    permission_classes = [permissions.IsAdminUser, ]
+
+    def get_summary(self, profile_id):
+        """Returns the summary of a profile, raising 404 when missing."""
+        summary = profiling.load_summary(profile_id)
+        if summary is None:
+            raise NotFound()
+        return summary
+
+    def get(self, request, profile_id):
+        return Response(self.get_summary(profile_id))
+
+
+class ProfileDownloadView(ProfileView):
+    """Downloads the profiler output of a stored request profile, to open \
+        with pstats or speedscope."""
+
+    def get(self, request, profile_id):
+        mode = self.get_summary(profile_id)['mode']
+        path = profiling.artifact_path(profile_id, mode)
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=os.path.basename(path))
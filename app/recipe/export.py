@@ -0,0 +1,95 @@
+import csv
+import json
+from collections import defaultdict
+
+from core.models import Recipe
+
+
+EXPORT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+EXPORT_FIELDS = ('id', 'title', 'time_minutes', 'price', 'link', 'tags',
+                 'ingredients')
+
+# Separates the tag and ingredient names within a CSV cell.
+CSV_NAME_SEPARATOR = ';'
+
+
+def _names_by_recipe(relation, recipe_ids):
+    """Returns the related names of each recipe, sorted, in one query."""
+    field = Recipe._meta.get_field(relation)
+    lookup = f'{field.m2m_reverse_field_name()}__name'
+    rows = field.remote_field.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by(lookup).values_list('recipe_id', lookup)
+
+    names = defaultdict(list)
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+    return names
+
+
+def iter_recipes(user, batch_size=1000):
+    """Yields every recipe of a user as a dict, with the names of its tags \
+        and ingredients, by ascending id.
+
+    Recipes are read in batches that resume after the last id seen, so
+    memory use and the cost of each query do not grow with the account.
+    """
+    last_id = 0
+    while True:
+        recipes = list(Recipe.objects.filter(
+            user=user,
+            id__gt=last_id
+        ).order_by('id').values(
+            'id', 'title', 'time_minutes', 'price', 'link'
+        )[:batch_size])
+        if not recipes:
+            return
+
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        tags = _names_by_recipe('tags', recipe_ids)
+        ingredients = _names_by_recipe('ingredients', recipe_ids)
+
+        for recipe in recipes:
+            recipe['price'] = str(recipe['price'])
+            recipe['tags'] = tags.get(recipe['id'], [])
+            recipe['ingredients'] = ingredients.get(recipe['id'], [])
+            yield recipe
+
+        last_id = recipe_ids[-1]
+
+
+def ndjson_lines(recipes):
+    """Yields recipes as lines of JSON."""
+    for recipe in recipes:
+        yield json.dumps(recipe, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """File-like object returning what is written, for the CSV writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(recipes):
+    """Yields recipes as CSV lines, after a header line."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for recipe in recipes:
+        recipe['tags'] = CSV_NAME_SEPARATOR.join(recipe['tags'])
+        recipe['ingredients'] = CSV_NAME_SEPARATOR.join(
+            recipe['ingredients']
+        )
+        yield writer.writerow([recipe[field] for field in EXPORT_FIELDS])
+
+
+def export_lines(user, export_type, batch_size=1000):
+    """Yields the lines of an export of a user's recipes."""
+    recipes = iter_recipes(user, batch_size)
+    if export_type == 'csv':
+        return csv_lines(recipes)
+    return ndjson_lines(recipes)
@@ -0,0 +1,180 @@
+import hashlib
+import math
+import time
+from django.utils.http import urlencode
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from core import response_cache
+from core.models import CollectionVersion
+
+
+def normalize_text(value):
+    """Normalizes a free text parameter."""
+    return ' '.join(value.split())
+
+
+def normalize_flag(value):
+    """Normalizes a 0/1 parameter."""
+    return int(bool(int(value)))
+
+
+def normalize_ids(value):
+    """Normalizes a comma separated list of ids, ignoring order and \
+        repetitions."""
+    return ','.join(str(pk) for pk in sorted({int(pk)
+                                              for pk in value.split(',')}))
+
+
+def normalize_fields(value):
+    """Normalizes a comma separated list of field names, ignoring order \
+        and repetitions."""
+    return ','.join(sorted({name.strip() for name in value.split(',')}))
+
+
+class SparseFieldsetMixin:
+    """Lets clients read a subset of the fields of a resource, named in the \
+        `fields` query param. The names are passed to the serializer, and \
+        to the queryset, through the serializer context."""
+    fields_query_param = 'fields'
+
+    def get_requested_fields(self):
+        """Returns the names of the fields requested, or None for all."""
+        if self.request is None or self.request.method != 'GET':
+            return None
+        value = self.request.query_params.get(self.fields_query_param)
+        if value is None:
+            return None
+
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names.difference(self.get_serializer_class().Meta.fields)
+        if unknown or not names:
+            raise ValidationError({self.fields_query_param: [
+                _('Unknown fields: {fields}.').format(
+                    fields=', '.join(sorted(unknown))
+                ) if unknown else _('No fields given.')
+            ]})
+
+        return frozenset(names)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields = self.get_requested_fields()
+        if fields is not None:
+            context['fields'] = fields
+        return context
+
+
+class ConditionalGetMixin:
+    """Answers list requests with 304 Not Modified when the client copy is \
+        current, before any object is loaded. Other actions can do the same \
+        through `conditional`.
+
+    Responses carry an ETag derived from the user's versions of the
+    collections named in `version_collections`. HTTP dates only have whole
+    seconds, so a Last-Modified date, rounded up, is only sent once the
+    second of the last change has passed: until then a later change in the
+    same second could not be told apart, and only the ETag is used.
+    """
+    version_collections = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def get_etag(self, request, version):
+        """Returns the entity tag of the response to a request."""
+        key = [
+            str(request.user.pk),
+            request.path,
+            urlencode(sorted(request.query_params.lists()), doseq=True),
+        ] + [
+            str(getattr(version, collection))
+            for collection in self.version_collections
+        ]
+        digest = hashlib.md5('\n'.join(key).encode('utf-8')).hexdigest()
+        return quote_etag(digest)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        """Runs the handler unless the client copy is still current."""
+        version = CollectionVersion.objects.for_user(request.user)
+        etag = self.get_etag(request, version)
+        last_modified = math.ceil(version.updated_at.timestamp())
+        if last_modified > time.time():
+            last_modified = None
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+
+        return response
+
+
+class CachedListMixin:
+    """Serves list responses from a per-user cache, which is invalidated \
+        whenever any collection of the user changes.
+
+    Only the query params named in `cache_query_params` take part in the
+    cache key, each normalized by its function so that equivalent requests
+    share an entry.
+    """
+    cache_query_params = {}
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        """Returns the cache key of the response to a request, or None \
+            when it should not be cached."""
+        params = []
+        for name, normalize in sorted(self.cache_query_params.items()):
+            # An empty value is kept, as it may be invalid where a missing
+            # one is not.
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            try:
+                params.append(f'{name}={normalize(value)}')
+            except ValueError:
+                return None
+
+        # Pagination links are absolute, so the host is part of the key.
+        return response_cache.make_key(
+            request.user.pk,
+            request.get_host(),
+            request.path,
+            *params
+        )
+
+    def cached(self, handler, request, *args, **kwargs):
+        """Runs the handler unless its response is already cached."""
+        if not response_cache.is_enabled():
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        responses = []
+
+        def render():
+            response = handler(request, *args, **kwargs)
+            responses.append(response)
+            if response.status_code != 200:
+                return None
+            return response.data
+
+        data = response_cache.get_or_set(key, render)
+        if responses:
+            return responses[-1]
+        return Response(data)
@@ -0,0 +1,175 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import AutoField, CharField, FloatField, \
+    IntegerField, Q, TextField
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginates by seeking past the last row of the previous page.
+
+    Pages are addressed by an opaque cursor holding the ordering values of
+    the last row sent, so every page is a single indexed range scan: no
+    OFFSET and no COUNT(*) are ever issued. The ordering must end with a
+    unique field for the cursor to identify a single row.
+    """
+    ordering = ('-id', )
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Returns the page of objects following the requested cursor."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            self.check_position(queryset, position)
+            queryset = queryset.filter(self._seek_filter(position))
+
+        # Fetching one extra row tells whether a next page exists.
+        rows = list(queryset[:self.page_size + 1])
+        page = rows[:self.page_size]
+        self.next_position = None
+        if len(rows) > self.page_size:
+            self.next_position = self._position(page[-1])
+
+        return page
+
+    def get_paginated_response(self, data):
+        """Wraps a page of data with the link to the next page."""
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_ordering(self, view):
+        """Returns the ordering to paginate by. Views may order a request \
+            differently through a `get_pagination_ordering` method."""
+        get_pagination_ordering = getattr(
+            view, 'get_pagination_ordering', None
+        )
+        if get_pagination_ordering is not None:
+            ordering = get_pagination_ordering()
+            if ordering is not None:
+                return ordering
+
+        return self.ordering
+
+    def get_page_size(self, request):
+        """Returns the page size requested by the client, up to the limit."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        """Returns the URL for the next page, if there is one."""
+        if self.next_position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def encode_cursor(self, position):
+        """Encodes the ordering values of a row as an opaque cursor."""
+        data = json.dumps(position, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, request):
+        """Decodes the cursor given on the request into ordering values."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            position = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+            )
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def check_position(self, queryset, position):
+        """Checks that each value of a decoded cursor has the type of its \
+            ordering field, as a tampered cursor could otherwise make the \
+            seek filter fail or compare values of different types."""
+        for (name, _desc), value in zip(self._fields(), position):
+            if not isinstance(value, self._value_types(queryset, name)) or \
+                    isinstance(value, bool):
+                raise NotFound(self.invalid_cursor_message)
+
+    def _value_types(self, queryset, name):
+        """Returns the JSON types a cursor value of a field may have."""
+        field = queryset.query.annotations.get(name)
+        if field is not None:
+            field = field.output_field
+        else:
+            field = queryset.model._meta.get_field(name)
+
+        if isinstance(field, (AutoField, IntegerField)):
+            return int
+        if isinstance(field, FloatField):
+            return (int, float)
+        if isinstance(field, (CharField, TextField)):
+            return str
+        return (int, float, str)
+
+    def _fields(self):
+        """Yields the field name and whether it is descending."""
+        for field in self.ordering:
+            yield field.lstrip('-'), field.startswith('-')
+
+    def _position(self, obj):
+        """Returns the ordering values of an object, or of a row of \
+            values."""
+        if isinstance(obj, dict):
+            return [obj[name] for name, _desc in self._fields()]
+        return [getattr(obj, name) for name, _desc in self._fields()]
+
+    def _seek_filter(self, position):
+        """Builds the row comparison `(a, b) > (x, y)` in ordering terms."""
+        seek = Q()
+        equal = {}
+        for (name, desc), value in zip(self._fields(), position):
+            lookup = f'{name}__lt' if desc else f'{name}__gt'
+            seek |= Q(**equal, **{lookup: value})
+            equal[name] = value
+
+        return seek
+
+
+class RecipePagination(KeysetPagination):
+    """Paginates recipes from the newest to the oldest."""
+    ordering = ('-id', )
+
+
+class RecipeAttributePagination(KeysetPagination):
+    """Paginates tags and ingredients by name, in descending order."""
+    ordering = ('-name', '-id')
@@ -1,26 +1,109 @@
+from collections import Counter, OrderedDict
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from core import images, search, usage
+from core.models import Tag, Ingredient, Recipe, CollectionVersion
 
 
-class TagSerializer(serializers.ModelSerializer):
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Serializes the URLs of the renditions of a recipe image."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'image'
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        urls = images.rendition_urls(value)
+        if urls is None:
+            return None
+
+        request = self.context.get('request')
+        if request is not None:
+            for rendition, url in urls.items():
+                urls[rendition] = request.build_absolute_uri(url)
+
+        return urls
+
+
+class SparseFieldsMixin:
+    """Keeps only the fields named in the `fields` entry of the context, \
+        when serializing at the top level."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if requested is None or parent is not None:
+            return fields
+
+        return OrderedDict(
+            (name, field) for name, field in fields.items()
+            if name in requested
+        )
+
+
+class RecipeAttributeSerializer(SparseFieldsMixin,
+                                serializers.ModelSerializer):
+    """Base serializer for user owned recipe attributes. The number of \
+        recipes using each object is only included when the context asks \
+        for counts."""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('with_counts'):
+            fields.pop('recipe_count', None)
+        return fields
+
+    def validate_name(self, value):
+        """Rejects names the user already has, regardless of case."""
+        request = self.context.get('request')
+        if request is None:
+            return value
+
+        existing = self.Meta.model.objects.filter_names(request.user, [value])
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError(
+                _('An item with this name already exists.')
+            )
+
+        return value
+
+
+class RecipeAttributeNamesSerializer(serializers.Serializer):
+    """Serializer for the names of recipe attributes to get or create."""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
+class TagSerializer(RecipeAttributeSerializer):
     """Serializer for tag objects."""
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'recipe_count')
         read_only_fields = ('id', )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttributeSerializer):
     """Serializer for ingredient objects."""
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'recipe_count')
         read_only_fields = ('id', )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializes a recipe."""
     ingredients = serializers.PrimaryKeyRelatedField(
         many=True,
@@ -42,12 +125,344 @@ class RecipeDetailSerializer(RecipeSerializer):
     """Serializes a recipe detail."""
     ingredients = IngredientSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
+    image_renditions = ImageRenditionsField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('image_status',
+                                                 'image_renditions')
+        read_only_fields = ('id', 'image_status')
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
-    """Serializer for uploading image to recipe."""
+    """Serializer for the image of a recipe and its processing status."""
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_only_fields = ('id', )
+        fields = ('id', 'image', 'image_status', 'image_renditions')
+        read_only_fields = fields
+
+
+class RecipeImageUploadSerializer(serializers.Serializer):
+    """Serializer for uploading image to recipe. The image is only decoded \
+        and validated once processed in the background."""
+    image = serializers.FileField()
+
+
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """Validates and writes many recipes at once, with a fixed number of \
+        queries however many recipes are given."""
+    max_length = 10000
+    batch_size = 1000
+
+    def to_internal_value(self, data):
+        """Validates every item, reporting errors by position."""
+        if not isinstance(data, list) or not data:
+            return super().to_internal_value(data)
+
+        if len(data) > self.max_length:
+            raise serializers.ValidationError({
+                'non_field_errors': [
+                    _('Ensure there are at most {max_length} items.').format(
+                        max_length=self.max_length
+                    )
+                ]
+            })
+
+        items = []
+        errors = []
+        for item in data:
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+
+        for item_errors, ownership_errors in zip(
+            errors,
+            self._ownership_errors(items)
+        ):
+            item_errors.update(ownership_errors)
+
+        # A recipe updated twice would be listed twice, with the last
+        # values winning.
+        seen = set()
+        for item, item_errors in zip(items, errors):
+            if item is None or 'id' not in item:
+                continue
+            if item['id'] in seen:
+                item_errors.setdefault('id', []).append(
+                    _('Recipe given more than once.')
+                )
+            seen.add(item['id'])
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+    def _ownership_errors(self, items):
+        """Returns the errors of items referring to objects the user does \
+            not own, checking every item with one query per model."""
+        user = self.context['request'].user
+        owned = {
+            'id': self._owned_ids(Recipe, user, items, 'id'),
+            'tags': self._owned_ids(Tag, user, items, 'tags'),
+            'ingredients': self._owned_ids(Ingredient, user, items,
+                                           'ingredients'),
+        }
+
+        errors = []
+        for item in items:
+            item_errors = {}
+            if item is None:
+                errors.append(item_errors)
+                continue
+            if 'id' in item and item['id'] not in owned['id']:
+                item_errors['id'] = [_('Recipe not found.')]
+            for field in ('tags', 'ingredients'):
+                invalid = [pk for pk in item[field]
+                           if pk not in owned[field]]
+                if invalid:
+                    item_errors[field] = [
+                        _('Invalid pk "{pk_value}" - object does not '
+                          'exist.').format(pk_value=pk)
+                        for pk in invalid
+                    ]
+            errors.append(item_errors)
+
+        return errors
+
+    def _owned_ids(self, model, user, items, field):
+        """Returns which of the ids referred to by the items belong to the \
+            user."""
+        ids = set()
+        for item in filter(None, items):
+            value = item.get(field, [])
+            ids.update(value if isinstance(value, list) else [value])
+        if not ids:
+            return set()
+
+        return set(model.objects.filter(
+            user=user,
+            id__in=ids
+        ).values_list('id', flat=True))
+
+    def create(self, validated_data):
+        """Creates and updates the recipes in a single transaction, \
+            returning their ids in the order given."""
+        with transaction.atomic():
+            new = [item for item in validated_data if 'id' not in item]
+            existing = [item for item in validated_data if 'id' in item]
+
+            created = self._create_recipes(new)
+            self._update_recipes(existing)
+            self._set_relations(new, created, existing)
+
+            recipe_ids = [recipe.id for recipe in created] + \
+                [item['id'] for item in existing]
+            search.update_search_vectors(recipe_ids)
+            CollectionVersion.objects.bump(
+                self.context['request'].user.pk,
+                'recipes'
+            )
+
+        created = iter(created)
+        return [
+            item['id'] if 'id' in item else next(created).id
+            for item in validated_data
+        ]
+
+    def _fields(self, item):
+        """Returns the model field values of an item."""
+        return {
+            key: value for key, value in item.items()
+            if key not in ('id', 'tags', 'ingredients')
+        }
+
+    def _create_recipes(self, items):
+        """Inserts new recipes in batches."""
+        recipes = [Recipe(**self._fields(item)) for item in items]
+        if connection.features.can_return_ids_from_bulk_insert:
+            return Recipe.objects.bulk_create(
+                recipes,
+                batch_size=self.batch_size
+            )
+
+        # Backends that cannot return the inserted ids need a save each.
+        for recipe in recipes:
+            recipe.save()
+        return recipes
+
+    def _update_recipes(self, items):
+        """Updates existing recipes, one statement per recipe as no bulk \
+            update is available."""
+        now = timezone.now()
+        for item in items:
+            Recipe.objects.filter(pk=item['id']).update(
+                updated_at=now,
+                **self._fields(item)
+            )
+
+    def _set_relations(self, new, created, existing):
+        """Replaces the tags and ingredients of the recipes."""
+        pairs = [(recipe.id, item) for recipe, item in zip(created, new)] + \
+            [(item['id'], item) for item in existing]
+        updated_ids = [item['id'] for item in existing]
+
+        for field, column in (('tags', 'tag_id'),
+                              ('ingredients', 'ingredient_id')):
+            through = getattr(Recipe, field).through
+            # Bulk writes send no m2m signals, so the recipe counts of the
+            # objects are adjusted here for the links replaced.
+            deltas = Counter()
+            if updated_ids:
+                deltas.subtract(usage.links(field, updated_ids))
+                through.objects.filter(recipe_id__in=updated_ids).delete()
+            rows = [
+                through(recipe_id=recipe_id, **{column: pk})
+                for recipe_id, item in pairs
+                for pk in dict.fromkeys(item[field])
+            ]
+            deltas.update(getattr(row, column) for row in rows)
+            through.objects.bulk_create(rows, batch_size=self.batch_size)
+            usage.adjust(field, deltas)
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializes a recipe to be created, or updated when an id is given, \
+        as part of a bulk request. Tags and ingredients default to none on \
+        creation, but are required on updates, as they are replaced."""
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
+                  'price', 'link')
+        list_serializer_class = RecipeBulkListSerializer
+
+    def validate(self, attrs):
+        """Requires the relations of recipes updated."""
+        errors = {}
+        for field in ('tags', 'ingredients'):
+            if field in attrs:
+                continue
+            if 'id' in attrs:
+                errors[field] = [self.fields[field].error_messages['required']]
+            else:
+                attrs[field] = []
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return attrs
+
+
+class RecipeValuesSerializer:
+    """Read-only counterpart of a recipe serializer, producing the same \
+        output from values() rows instead of model instances.
+
+    Scalar fields are read from the row and rendered by the fields of the
+    wrapped serializer, while related objects are read from the through
+    tables with a single values_list() query per relation.
+    """
+
+    def __init__(self, serializer_class, instance=None, many=False,
+                 context=None):
+        self.fields = serializer_class(context=context or {}).fields
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def value_fields(cls, serializer_class, context=None):
+        """Returns the names of the model fields to select for the output \
+            of a serializer."""
+        names = ['id']
+        fields = serializer_class(context=context or {}).fields
+        for field in fields.values():
+            if not cls._is_relation(field) and field.source not in names:
+                names.append(field.source)
+        return names
+
+    @staticmethod
+    def _is_relation(field):
+        """Returns whether a field serializes many related objects."""
+        return isinstance(field, (serializers.ManyRelatedField,
+                                  serializers.ListSerializer))
+
+    @property
+    def data(self):
+        if not self.many:
+            return self.to_representation([self.instance])[0]
+        return self.to_representation(list(self.instance))
+
+    def to_representation(self, rows):
+        """Renders rows of recipe values."""
+        recipe_ids = [row['id'] for row in rows]
+        related = {
+            name: self._related(name, field, recipe_ids)
+            for name, field in self.fields.items()
+            if self._is_relation(field)
+        }
+
+        output = []
+        for row in rows:
+            item = OrderedDict()
+            for name, field in self.fields.items():
+                if name in related:
+                    item[name] = related[name].get(row['id'], [])
+                    continue
+                value = row[field.source]
+                if isinstance(field, ImageRenditionsField):
+                    value = Recipe._meta.get_field('image').attr_class(
+                        None,
+                        Recipe._meta.get_field('image'),
+                        value
+                    )
+                elif value is None:
+                    item[name] = None
+                    continue
+                item[name] = field.to_representation(value)
+            output.append(item)
+
+        return output
+
+    def _related(self, name, field, recipe_ids):
+        """Returns the representations of the objects related to each \
+            recipe by a relation, ordered by id."""
+        model_field = Recipe._meta.get_field(field.source)
+        related_name = model_field.m2m_reverse_field_name()
+        through = model_field.remote_field.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(f'{related_name}_id')
+
+        representations = {}
+        if isinstance(field, serializers.ListSerializer):
+            child_fields = field.child.fields
+            rows = through.values_list('recipe_id', *(
+                f'{related_name}__{child.source}'
+                for child in child_fields.values()
+            ))
+            for recipe_id, *values in rows:
+                representations.setdefault(recipe_id, []).append(
+                    OrderedDict(
+                        (child_name, None if value is None
+                         else child.to_representation(value))
+                        for (child_name, child), value
+                        in zip(child_fields.items(), values)
+                    )
+                )
+        else:
+            rows = through.values_list('recipe_id', f'{related_name}_id')
+            for recipe_id, pk in rows:
+                representations.setdefault(recipe_id, []).append(pk)
+
+        return representations
@@ -2,18 +2,19 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
 from rest_framework import status
-from rest_framework.test import APIClient
+from core.tests.budgets import BudgetAPIClient
 from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk')
 
 
 class PublicIngredientAPITest(TestCase):
     """Tests public available ingredients APIs."""
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
 
     def test_login_required(self):
         """Tests login is required to access the endpoint."""
@@ -26,7 +27,7 @@ class PrivateIngredientAPITest(TestCase):
     """Tests private ingredients APIs."""
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
         self.user = get_user_model().objects.create_user(
             'test@test.com',
             'Test123'
@@ -45,7 +46,7 @@ class PrivateIngredientAPITest(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Tests listing ingredients for authenticated user only."""
@@ -61,8 +62,8 @@ class PrivateIngredientAPITest(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successful(self):
         """Tests creating a new ingredient."""
@@ -106,8 +107,8 @@ class PrivateIngredientAPITest(TestCase):
         serializer1 = IngredientSerializer(ingredient1)
         serializer2 = IngredientSerializer(ingredient2)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_retrieve_ingredients_assigned_unique(self):
         """Tests retrieving one instance of ingredient when its assigned to \
@@ -137,4 +138,20 @@ class PrivateIngredientAPITest(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_bulk_get_or_create_ingredients(self):
+        """Tests resolving ingredient names, creating the missing ones."""
+        existing = Ingredient.objects.create(user=self.user, name='salt')
+        payload = {'names': ['Salt', 'pepper']}
+
+        with self.assertNumQueries(3):
+            res = self.client.post(
+                INGREDIENTS_BULK_URL,
+                payload,
+                format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['id'], existing.id)
+        self.assertEqual(res.data[1]['name'], 'pepper')
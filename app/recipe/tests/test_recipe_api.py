@@ -1,17 +1,35 @@
+import csv
+import json
 import tempfile
 import os
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
 
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework.test import APIClient
-from core.models import Recipe, Tag, Ingredient
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from rest_framework.renderers import JSONRenderer
+from core.tests.budgets import BudgetAPIClient
+from core import image_processing
+from core.images import delete_renditions, generate_renditions, \
+                        rendition_path
+from core.models import CollectionVersion, Recipe, Tag, Ingredient
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, \
+                               RecipeValuesSerializer
+from recipe import export
+from recipe.pagination import RecipePagination
 
 
 RECIPE_URLS = reverse('recipe:recipe-list')
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+RECIPE_EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def image_upload_url(recipe_id):
@@ -50,7 +68,7 @@ class PublicRecipeAPITest(TestCase):
     """Tests unauthenticated recipe APIs."""
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
 
     def test_authentication_required(self):
         """Tests that authentication is required."""
@@ -63,7 +81,7 @@ class PrivateRecipeAPITest(TestCase):
     """Tests authenticated recipe APIs."""
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
         self.user = get_user_model().objects.create_user(
             'test@test.com',
             'Test123'
@@ -81,7 +99,7 @@ class PrivateRecipeAPITest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """Tests retrieving recipes for user."""
@@ -98,8 +116,8 @@ class PrivateRecipeAPITest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Tests viewing a recipe detail."""
@@ -215,10 +233,11 @@ class PrivateRecipeAPITest(TestCase):
         self.assertEqual(tags.count(), 0)
 
 
+@override_settings(RECIPE_IMAGE_PROCESSING={'MODE': 'sync'})
 class ImageUploadTest(TestCase):
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
         self.user = get_user_model().objects.create_user(
             'test@test.com',
             'testpwd'
@@ -227,7 +246,10 @@ class ImageUploadTest(TestCase):
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
-        self.recipe.image.delete()
+        image = self.recipe.image
+        if image:
+            delete_renditions(image.storage, image.name)
+        image.delete()
 
     def test_upload_image_successful(self):
         """Tests uploading a image to a recipe."""
@@ -241,9 +263,17 @@ class ImageUploadTest(TestCase):
             res = self.client.post(url, {'image': ntf}, format='multipart')
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(
+            set(res.data['image_renditions']),
+            {'thumb', 'medium', 'large'}
+        )
+        for rendition in res.data['image_renditions']:
+            path = rendition_path(self.recipe.image.path, rendition)
+            self.assertTrue(os.path.exists(path))
 
     def test_upload_image_bad_request(self):
         """Tests uploading an invalid image."""
@@ -252,6 +282,137 @@ class ImageUploadTest(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_upload_image_invalid_content(self):
+        """Tests that a file that is not an image fails processing."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(b'notimage')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(self.recipe.image)
+        self.assertEqual(self.recipe.image_staging, '')
+
+    @override_settings(RECIPE_IMAGE_PROCESSING={'MODE': 'command'})
+    def test_upload_image_processed_by_command(self):
+        """Tests images staged for the worker command."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.recipe.refresh_from_db()
+        staged = self.recipe.image_staging
+        self.assertTrue(default_storage.exists(staged))
+
+        call_command(
+            'process_images', '--once', '--workers', '1', stdout=StringIO()
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertFalse(default_storage.exists(staged))
+
+    @override_settings(RECIPE_IMAGE_PROCESSING={'MODE': 'command',
+                                                'CLAIM_TIMEOUT': 60})
+    def test_abandoned_processing_picked_up_again(self):
+        """Tests images claimed by a worker that died are processed again \
+            once the claim is stale, and not before."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+        claimed = Recipe.objects.filter(pk=self.recipe.pk)
+        claimed.update(image_status=Recipe.IMAGE_PROCESSING,
+                       image_claimed_at=timezone.now())
+
+        call_command(
+            'process_images', '--once', '--workers', '1', stdout=StringIO()
+        )
+        self.assertEqual(claimed.get().image_status,
+                         Recipe.IMAGE_PROCESSING)
+
+        claimed.update(
+            image_claimed_at=timezone.now() - timedelta(seconds=61)
+        )
+        call_command(
+            'process_images', '--once', '--workers', '1', stdout=StringIO()
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertIsNone(self.recipe.image_claimed_at)
+
+    def test_replaced_image_deleted(self):
+        """Tests that uploading another image deletes the one replaced \
+            with its renditions."""
+        url = image_upload_url(self.recipe.id)
+        paths = []
+        for _ in range(2):
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+                Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+                ntf.seek(0)
+                self.client.post(url, {'image': ntf}, format='multipart')
+            self.recipe.refresh_from_db()
+            paths.append(self.recipe.image.path)
+
+        self.assertNotEqual(paths[0], paths[1])
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(rendition_path(paths[0], 'thumb')))
+        self.assertTrue(os.path.exists(paths[1]))
+
+    @override_settings(RECIPE_IMAGE_PROCESSING={'MODE': 'command'})
+    def test_upload_during_processing_supersedes(self):
+        """Tests that an image uploaded while the previous one is being \
+            processed wins, and the superseded one is not kept."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+        self.recipe.refresh_from_db()
+        first_staged = self.recipe.image_staging
+        stored = []
+
+        def stage_another(image):
+            """Generates renditions, then stages a second upload before \
+                processing finishes."""
+            stored.append(image.path)
+            generate_renditions(image)
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+                Image.new('RGB', (20, 20)).save(ntf, format='JPEG')
+                ntf.seek(0)
+                image_processing.stage_image(
+                    Recipe.objects.get(pk=self.recipe.pk), ntf
+                )
+
+        with patch('core.images.generate_renditions',
+                   side_effect=stage_another):
+            image_processing.process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        second_staged = self.recipe.image_staging
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PENDING)
+        self.assertFalse(self.recipe.image)
+        self.assertFalse(os.path.exists(stored[0]))
+        self.assertFalse(os.path.exists(rendition_path(stored[0], 'thumb')))
+        self.assertFalse(default_storage.exists(first_staged))
+        self.assertTrue(default_storage.exists(second_staged))
+
+        image_processing.process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(Image.open(self.recipe.image.path).size, (20, 20))
+        self.assertFalse(default_storage.exists(second_staged))
+
     def test_filter_recipe_filter_recipe_by_tag(self):
         """Tests returning recipes with specific tags."""
         recipe1 = sample_recipe(user=self.user, title='title 1')
@@ -271,9 +432,9 @@ class ImageUploadTest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Tests returning recipes with specific ingredients."""
@@ -294,6 +455,728 @@ class ImageUploadTest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+    def _tagged_recipes(self):
+        """Creates recipes with one and with two of two tags."""
+        tag1 = sample_tag(user=self.user, name='tag 1')
+        tag2 = sample_tag(user=self.user, name='tag 2')
+        both = sample_recipe(user=self.user, title='both')
+        both.tags.add(tag1, tag2)
+        one = sample_recipe(user=self.user, title='one')
+        one.tags.add(tag1)
+        sample_recipe(user=self.user, title='none')
+
+        return f'{tag1.id},{tag2.id}'
+
+    def test_filter_any_returns_each_recipe_once(self):
+        """Tests recipes matching several tags are listed once."""
+        tags = self._tagged_recipes()
+
+        res = self.client.get(RECIPE_URLS, {'tags': tags})
+
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data['results']],
+            ['one', 'both']
+        )
+
+    def test_filter_all(self):
+        """Tests returning recipes having every given tag."""
+        tags = self._tagged_recipes()
+
+        res = self.client.get(RECIPE_URLS, {'tags': tags, 'match': 'all'})
+
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data['results']],
+            ['both']
+        )
+
+    def test_filter_all_ignores_repeated_ids(self):
+        """Tests repeating an id does not require it twice."""
+        tag = sample_tag(user=self.user)
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.get(
+            RECIPE_URLS,
+            {'tags': f'{tag.id},{tag.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_filter_invalid(self):
+        """Tests invalid filters are rejected."""
+        res = self.client.get(RECIPE_URLS, {'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URLS, {'tags': 'a,b'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeQueryCountTest(TestCase):
+    """Tests that recipe endpoints run a fixed number of queries."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """Creates recipes with one tag and one ingredient each."""
+        tag, _ = Tag.objects.get_or_create(user=self.user, name='tag')
+        ingredient, _ = Ingredient.objects.get_or_create(
+            user=self.user,
+            name='ingredient'
+        )
+        recipes = []
+        for i in range(count):
+            recipe = sample_recipe(user=self.user, title=f'recipe {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+            recipes.append(recipe)
+
+        return recipes
+
+    def test_list_query_count_is_fixed(self):
+        """Tests listing recipes does not issue queries per recipe."""
+        self._create_recipes(2)
+        with self.assertNumQueries(4):
+            self.client.get(RECIPE_URLS)
+
+        self._create_recipes(10)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URLS)
+
+        self.assertEqual(len(res.data['results']), 12)
+
+    def test_retrieve_query_count_is_fixed(self):
+        """Tests retrieving a recipe loads nested objects in bulk."""
+        recipe = self._create_recipes(1)[0]
+        recipe.tags.add(sample_tag(user=self.user, name='other tag'))
+        recipe.ingredients.add(
+            sample_ingredient(user=self.user, name='other ingredient')
+        )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(generate_recipe_detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 2)
+
+
+class RecipePaginationTest(TestCase):
+    """Tests paginating the recipe list."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_paginate_recipes_with_cursor(self):
+        """Tests walking through every recipe page by page."""
+        recipes = [
+            sample_recipe(user=self.user, title=f'recipe {i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPE_URLS, {'page_size': 2})
+        ids = [item['id'] for item in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [item['id'] for item in res.data['results']]
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_page_size_limited(self):
+        """Tests the page size requested is capped by the server."""
+        sample_recipe(user=self.user)
+        sample_recipe(user=self.user)
+
+        with patch.object(RecipePagination, 'max_page_size', 1):
+            res = self.client.get(RECIPE_URLS, {'page_size': 100})
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_invalid_cursor(self):
+        """Tests that an invalid cursor returns not found."""
+        res = self.client.get(RECIPE_URLS, {'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_value_types_checked(self):
+        """Tests that cursors with values of the wrong type, or null, \
+            return not found."""
+        sample_recipe(user=self.user)
+        pagination = RecipePagination()
+        for params in (
+            {'cursor': ['x']},
+            {'cursor': [{}]},
+            {'cursor': [[1]]},
+            {'cursor': [None]},
+            {'cursor': [True]},
+            {'cursor': [1.5]},
+            {'cursor': ['x', 1], 'search': 'sample'},
+        ):
+            with self.subTest(params=params):
+                params['cursor'] = pagination.encode_cursor(params['cursor'])
+
+                res = self.client.get(RECIPE_URLS, params)
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeSearchTest(TestCase):
+    """Tests searching recipes."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _search(self, terms, **params):
+        """Returns the ids of the recipes matching the search terms."""
+        res = self.client.get(RECIPE_URLS, {'search': terms, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_search_title_tags_and_ingredients(self):
+        """Tests searching recipes by title, tag and ingredient names."""
+        by_title = sample_recipe(user=self.user, title='Lemon pie')
+        by_tag = sample_recipe(user=self.user, title='Cake')
+        by_tag.tags.add(sample_tag(user=self.user, name='lemon'))
+        by_ingredient = sample_recipe(user=self.user, title='Tea')
+        by_ingredient.ingredients.add(
+            sample_ingredient(user=self.user, name='Lemon')
+        )
+        sample_recipe(user=self.user, title='Brownie')
+
+        ids = self._search('lemon')
+
+        self.assertCountEqual(
+            ids,
+            [by_title.id, by_tag.id, by_ingredient.id]
+        )
+
+    def test_search_results_unique(self):
+        """Tests a recipe matching many ways is returned once."""
+        recipe = sample_recipe(user=self.user, title='Lemon pie')
+        recipe.tags.add(sample_tag(user=self.user, name='lemon'))
+        recipe.ingredients.add(sample_ingredient(user=self.user, name='lemon'))
+
+        self.assertEqual(self._search('lemon'), [recipe.id])
+
+    def test_search_paginated(self):
+        """Tests paging through search results."""
+        recipes = [
+            sample_recipe(user=self.user, title=f'lemon {i}')
+            for i in range(3)
+        ]
+
+        res = self.client.get(RECIPE_URLS, {'search': 'lemon', 'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertCountEqual(ids, [recipe.id for recipe in recipes])
+
+
+class RecipeBulkAPITest(TestCase):
+    """Tests creating and updating recipes in bulk."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_recipes(self):
+        """Tests creating many recipes with tags and ingredients."""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        payload = [
+            {
+                'title': f'recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id]
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data],
+            ['recipe 0', 'recipe 1', 'recipe 2']
+        )
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_update_recipes(self):
+        """Tests updating recipes given with their id."""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+        new_tag = sample_tag(user=self.user, name='new tag')
+        payload = [
+            {
+                'id': recipe.id,
+                'title': 'updated title',
+                'time_minutes': 5,
+                'price': '2.00',
+                'tags': [new_tag.id],
+                'ingredients': []
+            },
+            {'title': 'new recipe', 'time_minutes': 1, 'price': '1.00'},
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'updated title')
+        self.assertEqual(list(recipe.tags.all()), [new_tag])
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'sample tag': 0, 'new tag': 1}
+        )
+        self.assertEqual(res.data[0]['id'], recipe.id)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_bulk_reports_errors_by_item(self):
+        """Tests that invalid items are reported and nothing is written."""
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'Test123'
+        )
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {'title': 'valid', 'time_minutes': 1, 'price': '1.00'},
+            {'time_minutes': 1, 'price': '1.00'},
+            {
+                'title': 'tagged',
+                'time_minutes': 1,
+                'price': '1.00',
+                'tags': [other_tag.id]
+            },
+        ]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertIn('tags', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_requires_relations(self):
+        """Tests that updates without tags or ingredients are rejected, \
+            leaving the recipe untouched."""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+        payload = [{'id': recipe.id, 'title': 'updated', 'time_minutes': 5,
+                    'price': '2.00'}]
+
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(res.data[0]), {'tags', 'ingredients'})
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_bulk_duplicate_ids_rejected(self):
+        """Tests that a recipe given twice is rejected."""
+        recipe = sample_recipe(user=self.user)
+        item = {'id': recipe.id, 'title': 'updated', 'time_minutes': 5,
+                'price': '2.00', 'tags': [], 'ingredients': []}
+
+        res = self.client.post(RECIPE_BULK_URL, [item, item], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'sample recipe')
+
+    def test_bulk_validation_query_count_is_fixed(self):
+        """Tests that items are validated with a query per model."""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        payload = [
+            {
+                'title': f'recipe {i}',
+                'time_minutes': 1,
+                'price': '1.00',
+                'tags': [tag.id, tag.id + 1],
+                'ingredients': [ingredient.id]
+            }
+            for i in range(20)
+        ]
+
+        with self.assertNumQueries(2):
+            res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data), 20)
+
+
+class RecipeConditionalGetTest(TestCase):
+    """Tests answering conditional recipe requests."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        """Tests a current ETag is answered without loading recipes."""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPE_URLS)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URLS, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_modified_since(self):
+        """Tests Last-Modified is honoured when no ETag is sent."""
+        CollectionVersion.objects.filter(user=self.user).update(
+            updated_at=timezone.now() - timedelta(seconds=5)
+        )
+        res = self.client.get(RECIPE_URLS)
+
+        res = self.client.get(
+            RECIPE_URLS,
+            HTTP_IF_MODIFIED_SINCE=res['Last-Modified']
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_change_in_same_second_not_hidden(self):
+        """Tests a change in the second of the last read is not answered \
+            as unmodified by date."""
+        sample_recipe(user=self.user)
+        changed_at = datetime(2020, 1, 1, 0, 0, 0, 500000,
+                              tzinfo=timezone.utc)
+        CollectionVersion.objects.filter(user=self.user).update(
+            updated_at=changed_at
+        )
+
+        with patch('recipe.mixins.time.time',
+                   return_value=changed_at.timestamp() + 0.2):
+            res = self.client.get(
+                RECIPE_URLS,
+                HTTP_IF_MODIFIED_SINCE=http_date(changed_at.timestamp())
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Last-Modified', res)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_etag_changes_with_recipes(self):
+        """Tests changes to recipes, their tags or query params change \
+            the ETag."""
+        recipe = sample_recipe(user=self.user)
+        etags = [self.client.get(RECIPE_URLS)['ETag']]
+
+        recipe.tags.add(sample_tag(user=self.user))
+        etags.append(self.client.get(RECIPE_URLS)['ETag'])
+        recipe.delete()
+        etags.append(self.client.get(RECIPE_URLS)['ETag'])
+        etags.append(self.client.get(RECIPE_URLS, {'tags': '1'})['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_etag_is_per_user(self):
+        """Tests an ETag of one user does not match for another."""
+        etag = self.client.get(RECIPE_URLS)['ETag']
+        other = get_user_model().objects.create_user(
+            'other@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPE_URLS, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_not_modified(self):
+        """Tests a current recipe detail is answered with 304."""
+        recipe = sample_recipe(user=self.user)
+        url = generate_recipe_detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': True, 'ALLOW_LOCAL': True})
+class RecipeResponseCacheTest(TestCase):
+    """Tests caching recipe list responses."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Tests repeated lists do not load recipes again."""
+        sample_recipe(user=self.user)
+        self.client.get(RECIPE_URLS)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URLS)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_empty_param_not_served_from_cache(self):
+        """Tests an empty param does not share the entry of a request \
+            without it."""
+        sample_recipe(user=self.user)
+        self.client.get(RECIPE_URLS)
+
+        res = self.client.get(RECIPE_URLS, {'fields': ''})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_equivalent_params_share_entry(self):
+        """Tests params differing only in order share a cache entry."""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='tag 1')
+        tag2 = sample_tag(user=self.user, name='tag 2')
+        recipe.tags.add(tag1)
+        self.client.get(RECIPE_URLS, {'tags': f'{tag1.id},{tag2.id}'})
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                RECIPE_URLS,
+                {'tags': f'{tag2.id},{tag1.id}'}
+            )
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_cache_invalidated_on_change(self):
+        """Tests changes to recipes and their tags are listed at once."""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(RECIPE_URLS)
+
+        recipe.tags.add(sample_tag(user=self.user))
+        res = self.client.get(RECIPE_URLS)
+        self.assertEqual(len(res.data['results'][0]['tags']), 1)
+
+        sample_recipe(user=self.user, title='other')
+        res = self.client.get(RECIPE_URLS)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_cache_invalidated_on_bulk_create(self):
+        """Tests recipes created in bulk are listed at once."""
+        self.client.get(RECIPE_URLS)
+
+        self.client.post(
+            RECIPE_BULK_URL,
+            [{'title': 'bulk', 'time_minutes': 1, 'price': '1.00'}],
+            format='json'
+        )
+        res = self.client.get(RECIPE_URLS)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+
+class RecipeExportTest(TestCase):
+    """Tests streaming exports of recipes."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **params):
+        """Returns the response and content of an export."""
+        res = self.client.get(RECIPE_EXPORT_URL, params)
+        content = b''.join(res.streaming_content).decode('utf-8')
+        return res, content
+
+    def test_export_ndjson(self):
+        """Tests exporting recipes with the names of their relations."""
+        recipe = sample_recipe(user=self.user, title='Soup')
+        recipe.tags.add(sample_tag(user=self.user, name='Vegan'),
+                        sample_tag(user=self.user, name='Hot'))
+        recipe.ingredients.add(sample_ingredient(user=self.user, name='Leek'))
+        sample_recipe(user=self.user, title='Plain')
+        other = get_user_model().objects.create_user('o@test.com', 'Test123')
+        sample_recipe(user=other, title='Hidden')
+
+        res, content = self._export()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Soup', 'Plain'])
+        self.assertEqual(rows[0]['tags'], ['Hot', 'Vegan'])
+        self.assertEqual(rows[0]['ingredients'], ['Leek'])
+        self.assertEqual(rows[0]['price'], '5.00')
+        self.assertEqual(rows[1]['tags'], [])
+
+    def test_export_csv(self):
+        """Tests exporting recipes as CSV."""
+        recipe = sample_recipe(user=self.user, title='Soup, hot')
+        recipe.tags.add(sample_tag(user=self.user, name='Vegan'),
+                        sample_tag(user=self.user, name='Hot'))
+
+        res, content = self._export(type='csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:2], ['id', 'title'])
+        self.assertEqual(rows[1][1], 'Soup, hot')
+        self.assertEqual(rows[1][5], 'Hot;Vegan')
+
+    def test_export_queries_per_batch(self):
+        """Tests recipes are read in batches of fixed query count."""
+        for i in range(5):
+            sample_recipe(user=self.user, title=f'recipe {i}')
+        lines = export.export_lines(self.user, 'ndjson', batch_size=2)
+
+        # Three queries for each of the 3 batches, then one finding no more.
+        with self.assertNumQueries(10):
+            self.assertEqual(len(list(lines)), 5)
+
+    def test_export_invalid_type(self):
+        """Tests an unknown export type is rejected."""
+        res = self.client.get(RECIPE_EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeValuesSerializerTest(TestCase):
+    """Tests serializing recipes from values rows."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.recipe = sample_recipe(user=self.user, price='7.5',
+                                    link='https://example.com')
+        self.recipe.tags.add(sample_tag(user=self.user, name='b'),
+                             sample_tag(user=self.user, name='a'))
+        self.recipe.ingredients.add(sample_ingredient(user=self.user))
+        sample_recipe(user=self.user, title='bare')
+
+    def _render(self, serializer_class, values):
+        """Renders every recipe of the user as JSON."""
+        queryset = Recipe.objects.filter(user=self.user).order_by('id')
+        if values:
+            serializer = RecipeValuesSerializer(
+                serializer_class,
+                queryset.values(
+                    *RecipeValuesSerializer.value_fields(serializer_class)
+                ),
+                many=True
+            )
+        else:
+            serializer = serializer_class(queryset, many=True)
+        return JSONRenderer().render(serializer.data)
+
+    def test_same_output_as_list_serializer(self):
+        """Tests the output matches the recipe serializer byte for byte."""
+        self.assertEqual(
+            self._render(RecipeSerializer, values=True),
+            self._render(RecipeSerializer, values=False)
+        )
+
+    def test_same_output_as_detail_serializer(self):
+        """Tests the output matches the detail serializer byte for byte."""
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image='uploads/recipe/test.jpg',
+            image_status=Recipe.IMAGE_READY
+        )
+
+        self.assertEqual(
+            self._render(RecipeDetailSerializer, values=True),
+            self._render(RecipeDetailSerializer, values=False)
+        )
+
+
+class RecipeSparseFieldsetTest(TestCase):
+    """Tests requesting a subset of the recipe fields."""
+
+    def setUp(self):
+        self.client = BudgetAPIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@test.com',
+            'Test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+        self.recipe.tags.add(sample_tag(user=self.user))
+        self.recipe.ingredients.add(sample_ingredient(user=self.user))
+
+    def test_list_fields(self):
+        """Tests listing only some fields skips the omitted relations."""
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPE_URLS, {'fields': 'title,id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'id': self.recipe.id, 'title': self.recipe.title}
+        ])
+
+    def test_list_relation_field(self):
+        """Tests listing a relation alone."""
+        res = self.client.get(RECIPE_URLS, {'fields': 'tags'})
+
+        self.assertEqual(res.data['results'], [
+            {'tags': [self.recipe.tags.get().id]}
+        ])
+
+    def test_retrieve_fields(self):
+        """Tests nested objects keep their fields when the recipe is \
+            trimmed."""
+        res = self.client.get(
+            generate_recipe_detail_url(self.recipe.id),
+            {'fields': 'ingredients,price'}
+        )
+
+        self.assertEqual(res.data, {
+            'ingredients': [{'id': self.recipe.ingredients.get().id,
+                             'name': 'sample ingredient'}],
+            'price': '5.00',
+        })
+
+    def test_unknown_field(self):
+        """Tests unknown fields are rejected."""
+        res = self.client.get(RECIPE_URLS, {'fields': 'title,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
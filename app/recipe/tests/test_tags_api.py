@@ -2,19 +2,21 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
 from rest_framework import status
-from rest_framework.test import APIClient
+from core.tests.budgets import BudgetAPIClient
 from core.models import Tag, Recipe
+from recipe.pagination import RecipeAttributePagination
 from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
 
 
 class PublicTagsAPITest(TestCase):
     """Tests the public available tag APIs."""
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
 
     def test_login_required(self):
         """Tests tjat login is required for listing tags."""
@@ -31,7 +33,7 @@ class PrivateTagsAPITest(TestCase):
             'test@test.com',
             'Test123'
         )
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
         self.client.force_authenticate(self.user)
 
     def test_retrieve_tags(self):
@@ -45,7 +47,7 @@ class PrivateTagsAPITest(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Tests that tags listed is limited to authenticated user."""
@@ -60,8 +62,8 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], 'top')
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], 'top')
 
     def test_create_tag_succesful(self):
         """Tests creating a new tag."""
@@ -99,8 +101,8 @@ class PrivateTagsAPITest(TestCase):
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_retrieve_tags_assigned_unique(self):
         """Tests retrieving one instance of tag when its assigned to \
@@ -124,4 +126,156 @@ class PrivateTagsAPITest(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_paginate_tags_by_name(self):
+        """Tests paging through tags by name."""
+        Tag.objects.create(user=self.user, name='b')
+        Tag.objects.create(user=self.user, name='a')
+        Tag.objects.create(user=self.user, name='d')
+        Tag.objects.create(user=self.user, name='c')
+
+        res = self.client.get(TAGS_URL, {'page_size': 1})
+        names = [tag['name'] for tag in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            names += [tag['name'] for tag in res.data['results']]
+
+        self.assertEqual(names, ['d', 'c', 'b', 'a'])
+
+    def test_tampered_cursor_not_found(self):
+        """Tests that a cursor with values of the wrong type returns not \
+            found."""
+        Tag.objects.create(user=self.user, name='tag')
+        cursor = RecipeAttributePagination().encode_cursor([{'a': 1}, 1])
+
+        res = self.client.get(TAGS_URL, {'cursor': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_duplicate_tag_invalid(self):
+        """Tests that a tag differing only by case cannot be created."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_get_or_create_tags(self):
+        """Tests resolving tag names, creating the missing ones."""
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        user2 = get_user_model().objects.create_user(
+            'other@test.com',
+            'Test321'
+        )
+        Tag.objects.create(user=user2, name='Dessert')
+        payload = {'names': ['Dessert', 'vegan', 'Quick', 'dessert']}
+
+        res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data],
+            ['Dessert', 'Vegan', 'Quick']
+        )
+        self.assertEqual(res.data[1]['id'], existing.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_get_or_create_tags_invalid(self):
+        """Tests that names must be given."""
+        res = self.client.post(TAGS_BULK_URL, {'names': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_assigned_only_cache_invalidated(self):
+        """Tests a cached list of assigned tags follows new assignments."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        recipe = Recipe.objects.create(
+            title='Salad',
+            time_minutes=5,
+            price=3.00,
+            user=self.user
+        )
+        recipe.tags.add(tag)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_list_tag_fields(self):
+        """Tests listing only the names of tags."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.data['results'], [{'name': 'Vegan'}])
+
+    def test_list_tags_with_counts(self):
+        """Tests listing tags with the number of recipes using them, in \
+            a single query."""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        Tag.objects.create(user=self.user, name='Unused')
+        for title in ('Salad', 'Soup'):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=3.00,
+                user=self.user
+            )
+            recipe.tags.add(vegan)
+        recipe.tags.add(quick)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                TAGS_URL,
+                {'with_counts': 1, 'assigned_only': 1}
+            )
+
+        self.assertEqual(res.data['results'], [
+            {'id': vegan.id, 'name': 'Vegan', 'recipe_count': 2},
+            {'id': quick.id, 'name': 'Quick', 'recipe_count': 1},
+        ])
+
+    def test_list_tags_without_counts(self):
+        """Tests counts are left out unless asked for."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('recipe_count', res.data['results'][0])
+
+    def test_list_tag_counts_by_fields(self):
+        """Tests requesting the count field includes counts."""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'fields': 'id,recipe_count'})
+
+        self.assertEqual(res.data['results'], [
+            {'id': vegan.id, 'recipe_count': 0},
+        ])
+
+    def test_list_tags_by_usage(self):
+        """Tests ordering tags from the most to the least used."""
+        rare = Tag.objects.create(user=self.user, name='Rare')
+        common = Tag.objects.create(user=self.user, name='Common')
+        for title in ('Salad', 'Soup'):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=3.00,
+                user=self.user
+            )
+            recipe.tags.add(common)
+        recipe.tags.add(rare)
+        Tag.objects.create(user=self.user, name='Unused')
+
+        res = self.client.get(TAGS_URL, {'ordering': 'usage', 'page_size': 1})
+        self.assertEqual(res.data['results'][0]['id'], common.id)
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(res.data['results'][0]['id'], rare.id)
+
+        res = self.client.get(TAGS_URL, {'ordering': 'popular'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
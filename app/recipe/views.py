@@ -1,77 +1,253 @@
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from django.db.models import Count, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from core import image_processing, search
+from core.authentication import CachedTokenAuthentication
 from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+from recipe import export, serializers
+from recipe.mixins import ConditionalGetMixin, CachedListMixin, \
+                          SparseFieldsetMixin, normalize_fields, \
+                          normalize_flag, normalize_ids, normalize_text
+from recipe.pagination import RecipePagination, RecipeAttributePagination
 
 
-class BaseRecipeAttributeViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttributeViewSet(ConditionalGetMixin,
+                                 CachedListMixin,
+                                 SparseFieldsetMixin,
+                                 viewsets.GenericViewSet,
                                  mixins.ListModelMixin,
                                  mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes."""
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeAttributePagination
+    orderings = {
+        'name': ('-name', '-id'),
+        'usage': ('-recipe_count', '-id'),
+    }
+    cache_query_params = {
+        'assigned_only': normalize_flag,
+        'with_counts': normalize_flag,
+        'ordering': str,
+        'fields': normalize_fields,
+        'cursor': str,
+        'page_size': int,
+    }
+
+    def _flag(self, param):
+        """Returns whether a 0/1 query param is set."""
+        try:
+            return bool(int(self.request.query_params.get(param, 0)))
+        except ValueError:
+            raise ValidationError({param: [_('Expected 0 or 1.')]})
 
     def get_queryset(self):
         """Returns objects for the current authenticated user only."""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
+        assigned_only = self._flag('assigned_only')
 
         queryset = self.queryset
 
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # Read from the recipe counts, by the same index as the
+            # ordering by usage.
+            queryset = queryset.filter(recipe_count__gt=0)
 
+        # Serializers read nothing but these fields, which also include
+        # every field the pagination may order by.
         return queryset.filter(
             user=self.request.user
-            ).order_by('-name').distinct()
+            ).only('id', 'name', 'recipe_count').order_by('-name')
+
+    def get_pagination_ordering(self):
+        """Orders the objects by name, or from the most to the least used \
+            with `ordering=usage`."""
+        ordering = self.request.query_params.get('ordering', 'name')
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': [
+                _('Must be one of: {orderings}.').format(
+                    orderings=', '.join(self.orderings)
+                )
+            ]})
+        return self.orderings[ordering]
+
+    def get_serializer_context(self):
+        """Includes recipe counts with `with_counts=1`, or when they are \
+            named in the sparse fieldset."""
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method == 'GET':
+            context['with_counts'] = self._flag('with_counts') or \
+                'recipe_count' in context.get('fields', ())
+        return context
 
     def perform_create(self, serializer):
         """Creates a new object"""
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Returns the objects with the given names, creating the missing \
+            ones."""
+        names = serializers.RecipeAttributeNamesSerializer(data=request.data)
+        if not names.is_valid():
+            return Response(
+                names.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        objects = self.queryset.model.objects.get_or_create_names(
+            self.request.user,
+            names.validated_data['names']
+        )
+        serializer = self.get_serializer(objects, many=True)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class TagViewSet(BaseRecipeAttributeViewSet):
     """Manages tags in the database."""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    version_collections = ('tags', 'recipes')
 
 
 class IngredientViewSet(BaseRecipeAttributeViewSet):
     """Manages ingredients in the database."""
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    version_collections = ('ingredients', 'recipes')
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, CachedListMixin,
+                    SparseFieldsetMixin, viewsets.ModelViewSet):
     """Manages recipe in the database."""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipePagination
+    version_collections = ('recipes', 'tags', 'ingredients')
+    # Actions served from values() rows rather than model instances.
+    values_actions = ('list', 'retrieve')
+    MATCH_ANY = 'any'
+    MATCH_ALL = 'all'
+    cache_query_params = {
+        'tags': normalize_ids,
+        'ingredients': normalize_ids,
+        'match': str,
+        'search': normalize_text,
+        'fields': normalize_fields,
+        'cursor': str,
+        'page_size': int,
+    }
 
-    def _params_to_ints(self, qs):
+    def _params_to_ints(self, qs, param):
         """Converts a list o string ids into a list of integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return [int(str_id) for str_id in qs.split(',')]
+        except ValueError:
+            raise ValidationError({param: [_('Expected a list of ids.')]})
+
+    def _filter_related(self, queryset, relation, ids, match):
+        """Keeps the recipes related to any, or all, of the given objects.
+
+        The relation is matched in a subquery on the through table rather
+        than by joining it, so that each recipe is returned once without
+        a DISTINCT over whole rows.
+        """
+        field = Recipe._meta.get_field(relation)
+        column = field.m2m_reverse_name()
+        ids = set(ids)
+        matching = field.remote_field.through.objects.filter(
+            **{f'{column}__in': ids}
+        ).values('recipe_id')
+
+        if match == self.MATCH_ALL:
+            # Through rows are unique per recipe and object, so a recipe
+            # has them all when it has as many rows as distinct ids.
+            matching = matching.annotate(
+                matched=Count(column)
+            ).filter(matched=len(ids)).values('recipe_id')
+
+        return queryset.filter(id__in=matching)
 
     def get_queryset(self):
         """Retrieves recipes for authenticated user."""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        terms = self.request.query_params.get('search')
+        match = self.request.query_params.get('match', self.MATCH_ANY)
         queryset = self.queryset
 
+        if match not in (self.MATCH_ANY, self.MATCH_ALL):
+            raise ValidationError({'match': [
+                _('Must be "{any}" or "{all}".').format(
+                    any=self.MATCH_ANY, all=self.MATCH_ALL
+                )
+            ]})
+
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            tag_ids = self._params_to_ints(tags, 'tags')
+            queryset = self._filter_related(queryset, 'tags', tag_ids, match)
 
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            ingredient_ids = self._params_to_ints(ingredients, 'ingredients')
+            queryset = self._filter_related(queryset, 'ingredients',
+                                            ingredient_ids, match)
+
+        if terms:
+            queryset = search.search_recipes(queryset, terms)
+
+        return self._optimize_queryset(
+            queryset.filter(user=self.request.user)
+        )
+
+    def _optimize_queryset(self, queryset):
+        """Loads related objects needed by the current action up front, \
+            keeping the number of queries fixed regardless of the number \
+            of recipes."""
+        if self.action == 'upload_image':
+            return queryset.only('id', 'user', 'image', 'image_status',
+                                 'image_staging')
+
+        if self.action in self.values_actions:
+            # Related objects are read by the values serializer instead,
+            # and only for the fields requested.
+            return queryset.values(
+                *serializers.RecipeValuesSerializer.value_fields(
+                    self.get_serializer_class(),
+                    self.get_serializer_context()
+                ),
+                *queryset.query.annotations
+            )
+
+        return queryset.prefetch_related(
+            Prefetch('ingredients',
+                     queryset=Ingredient.objects.only('id').order_by('id')),
+            Prefetch('tags', queryset=Tag.objects.only('id').order_by('id'))
+        )
+
+    def get_pagination_ordering(self):
+        """Orders search results by relevance."""
+        if self.request.query_params.get('search'):
+            return ('-rank', '-id')
+        return None
+
+    def get_serializer(self, *args, **kwargs):
+        """Returns the values serializer for actions reading values rows."""
+        if self.action not in self.values_actions:
+            return super().get_serializer(*args, **kwargs)
 
-        return queryset.filter(user=self.request.user)
+        kwargs['context'] = self.get_serializer_context()
+        return serializers.RecipeValuesSerializer(
+            self.get_serializer_class(),
+            *args,
+            **kwargs
+        )
 
     def get_serializer_class(self):
         """Returns appropriate serializer class"""
@@ -79,29 +255,84 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
         return serializers.RecipeSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieves a recipe, unless the client copy is current."""
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Creates a new recipe on the database."""
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Creates recipes, or updates those given with an id, in bulk. \
+            Nothing is written unless every recipe is valid."""
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recipe_ids = serializer.save(user=self.request.user)
+        recipes = self._optimize_queryset(
+            Recipe.objects.filter(id__in=recipe_ids)
+        ).in_bulk()
+        data = serializers.RecipeSerializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids],
+            many=True
+        ).data
+
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Streams every recipe of the user, with the names of its tags \
+            and ingredients, as NDJSON or, with `type=csv`, as CSV."""
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in export.EXPORT_TYPES:
+            return Response(
+                {'type': [_('Must be one of: {types}.').format(
+                    types=', '.join(export.EXPORT_TYPES)
+                )]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            export.export_lines(request.user, export_type),
+            content_type=export.EXPORT_TYPES[export_type]
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{export_type}"'
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Uploads an image to the recipe"""
+        """Accepts an image for the recipe, to be processed in the \
+            background. Its progress shows in the recipe image status."""
         recipe = self.get_object()
-        serializer = self.get_serializer(
-            recipe,
-            data=request.data
-        )
+        upload = serializers.RecipeImageUploadSerializer(data=request.data)
 
-        if serializer.is_valid():
-            serializer.save()
+        if upload.is_valid():
+            image_processing.stage_image(
+                recipe,
+                upload.validated_data['image']
+            )
+            image_processing.enqueue(recipe.id)
+            recipe.refresh_from_db(
+                fields=['image', 'image_status', 'image_staging']
+            )
+            serializer = self.get_serializer(recipe)
             return Response(
                 serializer.data,
-                status=status.HTTP_200_OK
+                status=status.HTTP_202_ACCEPTED
             )
 
         return Response(
-            serializer.errors,
+            upload.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
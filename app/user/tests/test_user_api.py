@@ -1,8 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from rest_framework.test import APIClient
 from rest_framework import status
+from core.tests.budgets import BudgetAPIClient
 
 
 CREATE_USER_URL = reverse('user:create')
@@ -18,7 +18,7 @@ class PublicUserAPITest(TestCase):
     """Tests the public users' API."""
 
     def setUp(self):
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
 
     def test_create_valid_user_success(self):
         """Tests creating user with valid payload is successful."""
@@ -124,7 +124,7 @@ class PrivateUserAPITest(TestCase):
             password='Test123',
             name='Test User'
         )
-        self.client = APIClient()
+        self.client = BudgetAPIClient()
         self.client.force_authenticate(user=self.user)
 
     def test_retrieve_profile_success(self):